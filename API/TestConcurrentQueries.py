@@ -0,0 +1,69 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import contextlib
+import io
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+from lark import Lark
+from ParserSQL.parser import *
+from API.services import *
+
+
+class TestConcurrentQueries(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)  # Schema/ es relativo al directorio actual
+        os.makedirs("Schema")
+        self.parser = Lark(sql_grammar, start='start', parser='lalr', transformer=SQLTransformer())
+
+    def tearDown(self):
+        tables.clear()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def parse(self, sql):
+        return [line[0] if isinstance(line, list) else line for line in self.parser.parse(sql)]
+
+    def query(self, sql):
+        with contextlib.redirect_stdout(io.StringIO()):
+            for parsed in self.parse(sql):
+                result = execute_parsed_query(parsed)
+        return result
+
+    def test_inserts_on_two_tables(self):
+        names = ("a", "b")
+        for name in names:
+            self.query(f"create table {name} (id int primary key index bptree, v int);")
+        # el parser no se comparte entre hilos: las consultas se parsean antes
+        inserts = {name: [q for i in range(400) for q in self.parse(f"insert into {name} (id, v) values ({i}, {i * 2});")]
+                   for name in names}
+        errors = []
+
+        def insert(name):
+            try:
+                for parsed in inserts[name]:
+                    execute_parsed_query(parsed)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=insert, args=(name,)) for name in names]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        for name in names:
+            result = self.query(f"select * from {name};")
+            self.assertEqual(sorted(row[0] for row in result["data"]), list(range(400)))
+            result = self.query(f"select * from {name} where id between 100 and 109;")
+            self.assertEqual(sorted(tuple(row) for row in result["data"]),
+                             [(i, i * 2) for i in range(100, 110)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,15 +6,19 @@ import csv
 import time
 import datetime
 import shutil
+from copy import deepcopy
 from fastapi import HTTPException
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
 from Utils.Format_Meta import *
 from Utils.file_format import *
+from Utils.Registro import *
 from Heap_struct.Heap import *
+from Utils.buffer_pool import buffer_pool
+from Utils.compaction import Compactor
 
 from Hash_struct.Hash import Hash
-from BPtree_struct.Indice_BPTree_file import BPTree as Bptree
+from BPtree_struct.Indice_BPTree_file import BPTree as Bptree, DEFAULT_PAGE_SIZE
 from Sequential_Struct.Indice_Sequential_file import Sequential
 from RTree_struct.RTreeFile_Final import RTreeFile as Rtree
 from Isam_struct.Indice_Isam_file import ISAM as Isam
@@ -23,9 +27,23 @@ from Text_processing_modules.collection_indexing_module import TextCollectionInd
 from Text_processing_modules.natural_language_query_module import NLQueryModule as QueryAid
 
 M = 1000
+COMPACT_SUFFIX = ".compact"  # archivos que se escriben al compactar una tabla, antes del reemplazo
+# Índices que al eliminar quitan la entrada exacta del registro: si la tabla solo tiene
+# estos, el heap puede reutilizar los huecos. seq, isam y brin eliminan por clave y se
+# quedan con entradas de registros eliminados; spimi guarda sus propias posiciones
+SLOT_REUSE_INDEXES = (None, "hash", "bptree", "rtree")
 
 
-def to_struct(type):
+def remove_file(path):
+    '''
+    Borra un archivo descartando antes sus páginas del buffer pool
+    y su descriptor de heap (si es una tabla)
+    '''
+    buffer_pool.discard(path)
+    Heap.discard(path)
+    os.remove(path)
+
+def to_struct(type, dictionary_file: str = None):
     varchar_match = re.match(r"varchar\[(\d+)\]", type)
 
     if type == "int":
@@ -48,6 +66,9 @@ def to_struct(type):
         return "255s"
     if type == "text":
         return "512s"
+    if type == "category":
+        # varchar de pocos valores distintos: se guarda como código con diccionario lateral
+        return DictColumn(dictionary_file)
     elif varchar_match:
         size = varchar_match.group(1)  # Extraemos el tamaño entre los corchetes
         return f"{size}s"
@@ -111,7 +132,7 @@ def cast(value, type):
         return int(value)
     elif type == "d" or type == "f":
         return float(value)
-    elif type[-1] == "s":
+    elif type[-1] == "s" or isinstance(type, DictColumn):
         if value == 1:
             return "\U0010FFFF" * 256
         elif value == -1:
@@ -121,11 +142,240 @@ def cast(value, type):
         print("ERROR: tipo no soportado")
         return None
 
+def bptree_page_size(column, params):
+    '''
+    Tamaño de página para un bptree sobre la columna: las llaves varchar sin orden
+    explícito usan páginas compactas de DEFAULT_PAGE_SIZE bytes (None = formato fijo)
+    '''
+    if params or column["type"] == "category" or to_struct(column["type"])[-1] != "s":
+        return None
+    return DEFAULT_PAGE_SIZE
+
+def open_index(format, nombre_tabla, key, index, params, page_size=None, suffix=""):
+    '''
+    Abre (o crea) el índice `index` sobre la columna `key` de la tabla.
+    Con `suffix` se usan los archivos del índice y de la tabla con ese sufijo (al compactar).
+    Retorna None si la columna no tiene un índice de este tipo
+    '''
+    if index == "hash":
+        return Hash(format,
+                    key,
+                    index_filename(nombre_tabla, key, "buckets") + suffix,
+                    index_filename(nombre_tabla, key, "index") + suffix,
+                    table_filename(nombre_tabla) + suffix, *params)
+    elif index == "seq":
+        return Sequential(format,
+                          key,
+                          index_filename(nombre_tabla, key, "index") + suffix,
+                          table_filename(nombre_tabla) + suffix, *params)
+    elif index == "bptree":
+        return Bptree(format,
+                      key,
+                      index_filename(nombre_tabla, key, "index") + suffix,
+                      table_filename(nombre_tabla) + suffix,
+                      *params, page_size=page_size)
+    elif index == "isam":
+        return Isam(format,
+                    key,
+                    index_filename(nombre_tabla, key, "index") + suffix,
+                    table_filename(nombre_tabla) + suffix)
+    elif index == "brin":
+        return Brin(format,
+                    key,
+                    index_filename(nombre_tabla, key, "index") + suffix,
+                    index_filename(nombre_tabla, key, "page") + suffix,
+                    table_filename(nombre_tabla) + suffix,
+                    *params)
+    return None
+
+def index_files(nombre_tabla, key, index):
+    '''
+    Archivos en disco del índice `index` sobre la columna `key`
+    '''
+    files = [index_filename(nombre_tabla, key, "index")]
+    if index == "hash":
+        files.append(index_filename(nombre_tabla, key, "buckets"))
+    if index == "brin":
+        files.append(index_filename(nombre_tabla, key, "page"))
+    return files
+
+def table_files(nombre_tabla):
+    '''
+    Archivos en disco de la tabla: el heap y los de sus índices (solo el heap si la tabla no existe)
+    '''
+    files = [table_filename(nombre_tabla)]
+    data = get_catalog().get(nombre_tabla)
+    if data is None:
+        return files
+    for key, column in data["columns"].items():
+        if column["index"] in ("hash", "seq", "bptree", "isam", "brin"):
+            files.extend(index_files(nombre_tabla, key, column["index"]))
+    rtree_keys = data.get("indexes", {}).get("rtree")
+    if rtree_keys is not None:
+        files.append(index_filename(nombre_tabla, *rtree_keys, "index"))
+    return files
+
+def flush_table(nombre_tabla):
+    '''
+    Persiste el encabezado del heap y las páginas de índice de una sola tabla.
+    Se llama con el lock de la tabla tomado
+    '''
+    for path in table_files(nombre_tabla):
+        Heap.flush_file(path)
+        buffer_pool.flush(path)
+
+class TableCache:
+    '''
+    Catálogo en memoria de una tabla: metadata ya parseada, formato struct
+    y los objetos de heap e índices abiertos, para no recrearlos en cada consulta.
+    Se descarta cuando cambia la versión de la tabla en el catálogo, con DDL o al reconstruir la tabla.
+    '''
+    def __init__(self, nombre_tabla):
+        self.nombre_tabla = nombre_tabla
+        self.version = catalog_version(nombre_tabla)
+        self.data = select_meta(nombre_tabla)
+        self.format = {}
+        for key in self.data["columns"].keys():
+            self.format[key] = to_struct(self.data["columns"][key]["type"], dictionary_filename(nombre_tabla, key))
+        self.reuse_slots = all(column["index"] in SLOT_REUSE_INDEXES
+                               for column in self.data["columns"].values())
+        self.heap = Heap(self.format,
+                         self.data["key"],
+                         table_filename(nombre_tabla),
+                         reuse_slots=self.reuse_slots)
+        self.heaps = {self.data["key"]: self.heap}  # heaps por columna llave (para recorridos)
+        self.indexes = {}                           # columna -> índice abierto
+        self.rtrees = {}                            # tupla de columnas -> rtree abierto
+
+    def column_heap(self, key):
+        if key not in self.heaps:
+            self.heaps[key] = Heap(self.format, key, table_filename(self.nombre_tabla))
+        return self.heaps[key]
+
+    def index(self, key):
+        if key not in self.indexes:
+            column = self.data["columns"][key]
+            self.indexes[key] = open_index(self.format, self.nombre_tabla, key,
+                                           column["index"], column.get("params", []),
+                                           column.get("page_size"))
+        return self.indexes[key]
+
+    def rtree(self, keys=None):
+        '''
+        Rtree sobre `keys` (por defecto, el índice rtree registrado en la metadata, o None si no hay)
+        '''
+        if keys is None:
+            keys = self.data.get("indexes", {}).get("rtree")
+            if keys is None:
+                return None
+        if tuple(keys) not in self.rtrees:
+            self.rtrees[tuple(keys)] = Rtree(self.format,
+                                             self.data["key"],
+                                             keys,
+                                             table_filename(self.nombre_tabla),
+                                             index_filename(self.nombre_tabla, *keys, "index"))
+        return self.rtrees[tuple(keys)]
+
+tables = {}  # nombre de tabla -> TableCache
+
+def get_table(nombre_tabla):
+    table = tables.get(nombre_tabla)
+    if table is None or table.version != catalog_version(nombre_tabla):
+        tables[nombre_tabla] = TableCache(nombre_tabla)
+    return tables[nombre_tabla]
+
+def invalidate_table(nombre_tabla):
+    tables.pop(nombre_tabla, None)
+
+def compact_table(nombre_tabla):
+    '''
+    Compacta la tabla en el hilo de fondo (con el lock de la tabla tomado): reescribe el heap
+    sin los registros eliminados y lleva cada índice a las posiciones nuevas en archivos
+    COMPACT_SUFFIX, que al final reemplazan a los originales con os.replace.
+    '''
+    if get_catalog().get(nombre_tabla) is None:
+        return  # la tabla se eliminó mientras esperaba
+    table = get_table(nombre_tabla)
+    data = table.data
+    if any(column["index"] == "spimi" for column in data["columns"].values()):
+        return  # las posiciones también están guardadas en la colección de texto
+
+    heap_file = table_filename(nombre_tabla)
+    table.heap.flush()
+    remap = table.heap.compact(heap_file + COMPACT_SUFFIX)
+    new_heap = Heap(table.format, data["key"], heap_file + COMPACT_SUFFIX)
+    replaced = [heap_file]
+
+    for key, column in data["columns"].items():
+        index = column["index"]
+        if index not in ("hash", "seq", "bptree", "isam", "brin"):
+            continue
+        files = index_files(nombre_tabla, key, index)
+        for path in files:
+            buffer_pool.discard(path + COMPACT_SUFFIX)
+            if os.path.exists(path + COMPACT_SUFFIX):
+                os.remove(path + COMPACT_SUFFIX)  # restos de una compactación interrumpida
+        if index == "bptree":
+            # las claves salen ordenadas de las hojas: solo cambian las posiciones
+            table.index(key).remap_positions(remap, files[0] + COMPACT_SUFFIX)
+        elif index == "hash":
+            table.index(key).remap_positions(remap,
+                                             index_filename(nombre_tabla, key, "buckets") + COMPACT_SUFFIX,
+                                             index_filename(nombre_tabla, key, "index") + COMPACT_SUFFIX)
+        else:
+            # seq, isam y brin guardan las posiciones mezcladas con su propio orden: se
+            # reconstruyen sobre el heap nuevo (isam se construye solo al crearse)
+            rebuilt = open_index(table.format, nombre_tabla, key, index, column.get("params", []),
+                                 column.get("page_size"), suffix=COMPACT_SUFFIX)
+            if index != "isam":
+                for pos in range(new_heap._read_header()):
+                    rebuilt.add(pos_new_record=pos)
+        replaced.extend(files)
+
+    rtree_keys = data.get("indexes", {}).get("rtree")
+    if rtree_keys is not None:
+        rtree_file = index_filename(nombre_tabla, *rtree_keys, "index")
+        buffer_pool.discard(rtree_file + COMPACT_SUFFIX)
+        if os.path.exists(rtree_file + COMPACT_SUFFIX):
+            os.remove(rtree_file + COMPACT_SUFFIX)
+        rtree = Rtree(table.format, data["key"], rtree_keys, heap_file + COMPACT_SUFFIX, rtree_file + COMPACT_SUFFIX)
+        for pos, record in enumerate(new_heap._select_all()):
+            rtree.insert(record, pos)
+        replaced.append(rtree_file)
+
+    # reemplazo: primero todo lo nuevo en disco, luego se renombra archivo por archivo
+    new_heap.flush()
+    for path in replaced:
+        buffer_pool.flush(path + COMPACT_SUFFIX)
+    for path in replaced:
+        for name in (path, path + COMPACT_SUFFIX):
+            buffer_pool.discard(name)
+            Heap.discard(name)
+        os.replace(path + COMPACT_SUFFIX, path)
+    invalidate_table(nombre_tabla)
+
+compactor = Compactor(compact_table)
+
 def execute_parsed_query(query):
     '''
     funcion principal del service.
     Recibe un query parseado y ejecuta la accion correspondiente
     '''
+    nombre_tabla = query.get("table")
+    # el lock de la tabla evita ver una compactación a medio reemplazar
+    with compactor.lock(nombre_tabla):
+        try:
+            return run_parsed_query(query)
+        finally:
+            # las páginas de índice y el encabezado del heap de la tabla se persisten al
+            # terminar cada consulta, todavía con el lock: otras tablas no se tocan
+            if nombre_tabla is None:
+                Heap.flush_all()
+                buffer_pool.flush()
+            else:
+                flush_table(nombre_tabla)
+
+def run_parsed_query(query):
     if query["action"] == "create_table":
         return create_table(query)
     elif query["action"] == "insert":
@@ -157,7 +407,16 @@ def create_table(query):
     else:
         if query["data"]["columns"][pk]["index"] is None:
             query["data"]["columns"][pk]["index"] = "bptree"
-            query["data"]["columns"][pk]["params"] = [100]
+            if bptree_page_size(query["data"]["columns"][pk], []) is None:
+                query["data"]["columns"][pk]["params"] = [100]
+
+    for key, column in query["data"]["columns"].items():
+        if column["type"] == "category":
+            if column["index"] is not None:
+                raise HTTPException(404, f"Column {key} is dictionary encoded and cannot be indexed.")
+            # un diccionario viejo de una tabla con el mismo nombre no debe reutilizarse
+            if os.path.exists(dictionary_filename(query["name"], key)):
+                os.remove(dictionary_filename(query["name"], key))
 
     os.makedirs(os.path.dirname(table_filename(query["name"])), exist_ok=True)
     with open(table_filename(query["name"]), "w") as f:
@@ -167,7 +426,7 @@ def create_table(query):
     cols = query["data"]["columns"]
     
     for key in cols.keys():
-        format[key] = to_struct(cols[key]["type"])
+        format[key] = to_struct(cols[key]["type"], dictionary_filename(query["name"], key))
 
     # crear spimi si tiene atributo texto e indices
     for key in cols.keys():
@@ -209,11 +468,12 @@ def create_table(query):
                              table_filename(query["name"]), *params)
 
         elif index == "bptree":
+            cols[key]["page_size"] = bptree_page_size(cols[key], params)
             bptree = Bptree(format,
                         key,
                         index_filename(query["name"], key, "index"),
                         table_filename(query["name"]),
-                        *params)
+                        *params, page_size=cols[key]["page_size"])
         elif index == "brin":
             brin = Brin(format,
                         key,
@@ -226,6 +486,7 @@ def create_table(query):
 
     print(json.dumps(query["data"], indent=4))
     create_meta(query["data"], query["name"])
+    invalidate_table(query["name"])
     end = time.time_ns()
     t_ms = end - start
 
@@ -246,15 +507,12 @@ def create_table(query):
 def insert(query):
     start = time.time_ns()
     nombre_tabla = query["table"]
-    data = select_meta(nombre_tabla)
-    format = {}
-    for key in data["columns"].keys():
-        format[key] = to_struct(data["columns"][key]["type"])
+    table = get_table(nombre_tabla)
+    data = table.data
+    format = table.format
 
     # insertar en tabla
-    heap = Heap(format,
-                data["key"],
-                table_filename(nombre_tabla))
+    heap = table.heap
 
     if len(format) != query["values"][1]:
         i = 0
@@ -273,57 +531,14 @@ def insert(query):
     # insertar en cada indice si existe
     for key in data["columns"].keys():
         index = data["columns"][key]["index"]
-        params = data["columns"][key].get("params", [])
-        if index == None:
-            pass
-        elif index == "hash":
-            hash = Hash(format,
-                        key,
-                        index_filename(nombre_tabla, key, "buckets"),
-                        index_filename(nombre_tabla, key, "index"),
-                        table_filename(nombre_tabla), *params)
-            hash.insert(query["values"][1], position)
-
-        elif index == "seq":
-            seq = Sequential(format,
-                             key,
-                             index_filename(nombre_tabla, key, "index"),
-                             table_filename(nombre_tabla), *params)
-
-            seq.add(pos_new_record=position)
-
-        elif index == "bptree":
-            bptree = Bptree(format,
-                        key,
-                        index_filename(nombre_tabla, key, "index"),
-                        table_filename(nombre_tabla),
-                        *params)
-            bptree.add(pos_new_record=position)
-
-        elif index == "isam":
-            isam = Isam(format,
-                        key,
-                        index_filename(nombre_tabla, key, "index"),
-                        table_filename(nombre_tabla))
-            isam.add(pos_new_record=position)
-
-        elif index == "brin":
-            brin = Brin(format,
-                        key,
-                        index_filename(nombre_tabla, key, "index"),
-                        index_filename(nombre_tabla, key, "page"),
-                        table_filename(nombre_tabla),
-                        *params)
-            brin.add(pos_new_record=position)
+        if index == "hash":
+            table.index(key).insert(query["values"][1], position)
+        elif index in ("seq", "bptree", "isam", "brin"):
+            table.index(key).add(pos_new_record=position)
 
     # indice compuesto en rtree, añadir en el indice
-    rtree_keys = data.get("indexes", {}).get("rtree")
-    if rtree_keys is not None:
-        rtree = Rtree(format,
-                      data["key"],
-                      rtree_keys,
-                      table_filename(nombre_tabla),
-                      index_filename(nombre_tabla, *rtree_keys, "index"))
+    rtree = table.rtree()
+    if rtree is not None:
         rtree.insert(query["values"][1], position)
     end = time.time_ns()
     t_ms = end - start
@@ -360,15 +575,17 @@ def insert(query):
 def create_index(query):
     start = time.time_ns()
     nombre_tabla = query["table"]
-    data = select_meta(nombre_tabla)
+    data = deepcopy(select_meta(nombre_tabla))  # se modifica y se guarda con create_meta
     format = {}
 
     for key in data["columns"].keys():
-        format[key] = to_struct(data["columns"][key]["type"])
+        format[key] = to_struct(data["columns"][key]["type"], dictionary_filename(nombre_tabla, key))
 
     print(query["attr"])
     for key in query["attr"]:
         print(data["columns"][key]["index"])
+        if data["columns"][key]["type"] == "category":
+            raise HTTPException(status_code=404, detail=f"Column {key} is dictionary encoded and cannot be indexed.")
         if data["columns"][key]["index"] is None:
             data["columns"][key]["index"] = query["index"]
         else:
@@ -422,11 +639,12 @@ def create_index(query):
                     table_filename(nombre_tabla))
 
     elif index == "bptree":
+        data["columns"][key]["page_size"] = bptree_page_size(data["columns"][key], query["params"])
         bptree = Bptree(format,
                     keys[0],
                     index_filename(nombre_tabla, keys[0], "index"),
                     table_filename(nombre_tabla),
-                    *query["params"])
+                    *query["params"], page_size=data["columns"][key]["page_size"])
         
     elif index == "brin":
         brin = Brin(format,
@@ -443,15 +661,15 @@ def create_index(query):
     positions = heap.get_all()
 
     # añadir los registros ya en la tabla al indice creado
+    if bptree is not None:
+        bptree.bulk_load(positions)
+    if hash is not None:
+        hash.bulk_build(positions)
     for record, pos in zip(records, positions):
-        if hash is not None:
-            hash.insert(record, pos)
-        elif seq is not None:
+        if seq is not None:
             seq.add(pos_new_record=pos)
         elif rtree is not None:
             rtree.insert(record, pos)
-        elif bptree is not None:
-            bptree.add(pos_new_record=pos)
         elif brin is not None:
             brin.add(pos_new_record=pos)
 
@@ -459,6 +677,7 @@ def create_index(query):
     t_ms = end - start
     
     create_meta(data, nombre_tabla)
+    invalidate_table(nombre_tabla)
 
     return {
         "message": f"CREATED INDEX {index} ON TABLE {nombre_tabla} in {t_ms/1e6} ms"
@@ -468,19 +687,14 @@ def aux_select(query):
     print(json.dumps(query, indent=2))
     lista_ordenada = None
     nombre_tabla = query["table"]
-    data = select_meta(nombre_tabla)
-    format = {}
-    for key in data["columns"].keys():
-        format[key] = to_struct(data["columns"][key]["type"])
+    table = get_table(nombre_tabla)
+    data = table.data
+    format = table.format
 
     print("FORMAT",format)
 
     if query["eval"] is None:
-        heap = Heap(format,
-                    data["key"],
-                    table_filename(query["table"]))
-
-        return set(heap.get_all())
+        return set(table.heap.get_all())
 
     expr = str(query["eval"])
     tokens = re.findall(r'\(|\)|\d+|and|or|not', expr)
@@ -499,11 +713,7 @@ def aux_select(query):
         key = cond["field"]
 
         if isinstance(key, list):
-            rtree = Rtree(format,
-                          data["key"],
-                          key,
-                          table_filename(nombre_tabla),
-                          index_filename(nombre_tabla, *key, "index"))
+            rtree = table.rtree(key)
 
             if cond["range_search"] == True:
                 start = cond["range_start"]
@@ -548,7 +758,6 @@ def aux_select(query):
 
         else:
             index = data["columns"][key]["index"]
-            params = data["columns"][key].get("params", [])
             left = None
             right = None
             val = None
@@ -558,65 +767,31 @@ def aux_select(query):
             else:
                 val = cast(cond["value"], format[key])
 
-            if index == None:
+            if index == None or (index == "hash" and cond["range_search"]):
+                # un hash no guarda orden: los rangos sobre columnas hash también se evalúan
+                # recorriendo la columna en el heap en vez de leer todos los buckets y registros
                 print("Entered heap")
-                heap = Heap(format,
-                            cond["field"],
-                            table_filename(nombre_tabla))
+                heap = table.column_heap(cond["field"])
 
                 if cond["range_search"]:
-                    if cond["op"] != ">" and cond["op"] != "<" and cond["op"] != "!=":
-                        print("entered ==")
-                        sets.append(set(heap.search(left, right)))
+                    # el predicado se evalúa en un solo recorrido del heap
+                    if cond["op"] == ">":
+                        sets.append(set(heap.scan(">", left)))
+                    elif cond["op"] == "<":
+                        sets.append(set(heap.scan("<", right)))
+                    elif cond["op"] == "!=":
+                        sets.append(set(heap.scan("!=", cast(cond["value"], format[key]))))
                     else:
-                        print("entered other")
-                        valid = set(heap.search(left, right))
-                        if cond["op"] == ">":
-                            invalid = set(heap.search(left,left))
-                        elif cond["op"] == "<":
-                            invalid = set(heap.search(right,right))
-                        else:
-                            curr = cast(cond["value"], format[key])
-                            print([curr, cond["value"]])
-                            invalid = set(heap.search(curr,curr))
-
-                        sets.append(valid - invalid)
+                        sets.append(set(heap.scan("between", left, right)))
                 else:
-                    sets.append(set(heap.search(val, val)))
+                    sets.append(set(heap.scan("==", val)))
 
             elif index == "hash":
-                hash = Hash(format,
-                            key,
-                            index_filename(nombre_tabla, key, "buckets"),
-                            index_filename(nombre_tabla, key, "index"),
-                            table_filename(nombre_tabla), *params)
-            
-
-                if cond["range_search"]:
-                    if cond["op"] != ">" and cond["op"] != "<" and cond["op"] != "!=":
-                        sets.append(set(hash.range_search(left, right)))
-                    else:
-                        valid = set(hash.range_search(left, right))
-                        if cond["op"] == ">":
-                            invalid = set(hash.search(left))
-                        elif cond["op"] == "<":
-                            invalid = set(hash.search(right))
-                        else:
-                            curr = cast(cond["value"], format[key])
-                            invalid = set(hash.search(curr))
-
-                        sets.append(valid - invalid)
-
-
-                else:
-                    sets.append(set(hash.search(val)))
+                hash = table.index(key)
+                sets.append(set(hash.search(val)))
 
             elif index == "bptree":
-                bptree = Bptree(format,
-                            key,
-                            index_filename(nombre_tabla, key, "index"),
-                            table_filename(nombre_tabla),
-                            *params)
+                bptree = table.index(key)
 
                 if cond["range_search"]:
                     if cond["op"] != ">" and cond["op"] != "<" and cond["op"] != "!=":
@@ -636,10 +811,7 @@ def aux_select(query):
                     sets.append(set(bptree.search(val)))
 
             elif index == "seq":
-                seq = Sequential(format,
-                                 key,
-                                 index_filename(nombre_tabla, key, "index"),
-                                 table_filename(nombre_tabla), *params)
+                seq = table.index(key)
 
                 if cond["range_search"]:
                     if cond["op"] != ">" and cond["op"] != "<" and cond["op"] != "!=":
@@ -658,10 +830,7 @@ def aux_select(query):
                 else:
                     sets.append(set(seq.search(val)))
             elif index == "isam":
-                isam = Isam(format,
-                            key,
-                            index_filename(nombre_tabla, key, "index"),
-                            table_filename(nombre_tabla))
+                isam = table.index(key)
                 if cond["range_search"]:
                     if cond["op"] != ">" and cond["op"] != "<" and cond["op"] != "!=":
                         sets.append(set(isam.search_range(left, right)))
@@ -681,13 +850,7 @@ def aux_select(query):
                     sets.append(set(isam.search(val)))
             
             elif index == "brin":
-                brin = Brin(format,
-                            key,
-                            index_filename(nombre_tabla, key, "index"),
-                            index_filename(nombre_tabla, key, "page"),
-                            table_filename(nombre_tabla),
-                            *params)
-                
+                brin = table.index(key)
                 if cond["range_search"]:
                     if cond["op"] != ">" and cond["op"] != "<" and cond["op"] != "!=":
                         sets.append(set(brin.search_range(left, right)))
@@ -714,10 +877,7 @@ def aux_select(query):
     # Evaluar la expresión booleana
     universe = None
     if calc_universe:
-        heap = Heap(format,
-                    data["key"],
-                    table_filename(query["table"]))
-        universe = set(heap.get_all())
+        universe = set(table.heap.get_all())
     print("before evaluate")
     print(tree, sets, universe)
 
@@ -733,32 +893,74 @@ def aux_select(query):
 
     return result_list
 
+def bptree_cursor(table, query):
+    '''
+    Si el select filtra con una única condición sobre una columna con índice bptree,
+    retorna (columna, cursor) que recorre las hojas del árbol a medida que se piden filas.
+    Retorna None si la consulta no cumple esas condiciones
+    '''
+    if query["eval"] is None or len(query["conditions"]) != 1:
+        return None
+    if "not" in re.findall(r'and|or|not', str(query["eval"])):
+        return None
+    cond = next(iter(query["conditions"].values()))
+    key = cond.get("field")
+    if not isinstance(key, str) or "range_search" not in cond or cond["op"] == "!=":
+        return None
+    if table.data["columns"][key]["index"] != "bptree":
+        return None
+
+    format = table.format
+    if cond["range_search"]:
+        left = cast(cond["range_start"], format[key])
+        right = cast(cond["range_end"], format[key])
+    else:
+        left = right = cast(cond["value"], format[key])
+
+    return key, table.index(key).cursor(left, right,
+                                        left_open=cond["op"] == ">",
+                                        right_open=cond["op"] == "<")
+
 def select(query):
     #cronometrar
     start = time.time_ns()
 
-    data = select_meta(query["table"])
+    table = get_table(query["table"])
+    data = table.data
 
     print("DATA", data)
 
-    format = {}
-    for key in data["columns"].keys():
-        format[key] = to_struct(data["columns"][key]["type"])
+    format = table.format
 
     if not query["attr"] == "*":
         for col in query["attr"]:
             if col not in format:
                 raise HTTPException(status_code=404, detail=f"Column {col} does not exist in table {query['table']}")
 
-    ans_list = aux_select(query)
-
-    result = []
-    for i in ans_list:
-        heap = Heap(format,
-                    data["key"],
-                    table_filename(query["table"]))
-        if not heap.is_deleted(i):
-            result.append(heap.read(i))
+    limit = query.get("limit")
+    heap = table.heap
+    projected = False
+    scan = bptree_cursor(table, query)
+    if scan is not None:
+        key, cursor = scan
+        if query["attr"] != "*" and all(col == key for col in query["attr"]):
+            # solo se pide la columna indexada: las claves salen de las hojas, sin leer el heap
+            result = [[k] * len(query["attr"]) for k, _ in cursor.fetch(limit)]
+            projected = True
+        else:
+            positions = (pos for _, pos in cursor)
+    else:
+        positions = aux_select(query)
+
+    if not projected:
+        # se leen registros solo hasta completar el LIMIT
+        result = []
+        for i in positions:
+            if limit is not None and len(result) >= limit:
+                break
+            registro = heap.read(i)
+            if registro is not None:
+                result.append(registro)
 
     column_indices = {name: i for i, name in enumerate(list(data["columns"].keys()))}
 
@@ -766,8 +968,9 @@ def select(query):
         columns_names = list(data["columns"].keys())
     else:
         columns_names = query["attr"]
-        indices = [column_indices[x] for x in columns_names]
-        result = [[r[i] for i in indices] for r in result]
+        if not projected:
+            indices = [column_indices[x] for x in columns_names]
+            result = [[r[i] for i in indices] for r in result]
 
     columns_types = [data["columns"][col]["type"] for col in columns_names]
 
@@ -786,14 +989,11 @@ def select(query):
 def copy(query):
     # print(json.dumps(query, indent=4))
     start = time.time_ns()
-    format = {}
-    
     nombre_tabla = query["table"]
 
-    data = select_meta(nombre_tabla)
-
-    for key in data["columns"].keys():
-        format[key] = to_struct(data["columns"][key]["type"])
+    table = get_table(nombre_tabla)
+    data = table.data
+    format = table.format
     
     hash = []
     seq = []
@@ -805,44 +1005,21 @@ def copy(query):
     spimi = None
     positions = []
 
-    for key in data["columns"].keys():
-        format[key] = to_struct(data["columns"][key]["type"])
-
     for key in data["columns"].keys():
         index = data["columns"][key]["index"]
-        params = data["columns"][key].get("params", [])
 
         if index == None:
             pass
         elif index == "hash":
-            hash.append(Hash(format,
-                        key,
-                        index_filename(nombre_tabla, key, "buckets"),
-                        index_filename(nombre_tabla, key, "index"),
-                        table_filename(nombre_tabla), *params))
+            hash.append(table.index(key))
         elif index == "seq":
-            seq.append(Sequential(format,
-                        key,
-                        index_filename(nombre_tabla, key, "index"),
-                        table_filename(nombre_tabla), *params))
+            seq.append(table.index(key))
         elif index == "bptree":
-            bptree.append(Bptree(format,
-                        key,
-                        index_filename(nombre_tabla, key, "index"),
-                        table_filename(nombre_tabla),
-                        *params))
+            bptree.append(table.index(key))
         elif index == "isam":
-            isam.append(Isam(format,
-                             key,
-                             index_filename(nombre_tabla, key, "index"),
-                             table_filename(nombre_tabla)))
+            isam.append(table.index(key))
         elif index == "brin":
-            brin.append(Brin(format,
-                            key,
-                            index_filename(nombre_tabla, key, "index"),
-                            index_filename(nombre_tabla, key, "page"),
-                            table_filename(nombre_tabla),
-                            *params))
+            brin.append(table.index(key))
         elif index == "spimi":
             spimi = TextIndexer(
                 csv_file_path=query["from"],
@@ -856,17 +1033,9 @@ def copy(query):
             )
             positions = spimi.process()
     
-    rtree_keys = data.get("indexes", {}).get("rtree")
-    if rtree_keys is not None:
-        rtree = Rtree(format, 
-                    data["key"],
-                    rtree_keys, 
-                    table_filename(nombre_tabla),  
-                    index_filename(nombre_tabla, *rtree_keys, "index"))
+    rtree = table.rtree()
 
-    heap = Heap(format,
-                data["key"],
-                table_filename(nombre_tabla))
+    heap = table.heap
 
 
     with open(query["from"], mode='r', newline='', encoding='utf-8') as f:
@@ -874,13 +1043,14 @@ def copy(query):
         next(reader)
 
         if spimi is None:
-            for row in reader:
-                # insertar en el principal y en todos los índices
-                pos = heap.insert(row)
-                for h in hash:
-                    h.insert(row, pos)
-                for bp in bptree:
-                    bp.add(pos_new_record=pos)
+            rows = list(reader)
+            # insertar en el principal en bloque y luego en todos los índices
+            inserted = heap.insert_many(rows)
+            for bp in bptree:
+                bp.bulk_load(inserted)
+            for h in hash:
+                h.bulk_build(inserted)
+            for row, pos in zip(rows, inserted):
                 for s in seq:
                     s.add(pos_new_record=pos)
                 for i in isam:
@@ -917,170 +1087,39 @@ def delete(query):
     ans_set = aux_select(query)
 
     nombre_tabla = query["table"]
-    data = select_meta(nombre_tabla)
+    table = get_table(nombre_tabla)
+    data = table.data
 
+    heap = table.heap
+
+    # hash y bptree se actualizan entrada por entrada. seq, isam y brin solo eliminan
+    # por clave (todas las repeticiones a la vez), así que sus entradas quedan y se
+    # descartan al leer el registro eliminado, como en cualquier búsqueda
     hash = []
-    seq = []
-    rtree = None
     bptree = []
-    isam = []
-    brin = []
-
-    format = {}
-
-    for key in data["columns"].keys():
-        format[key] = to_struct(data["columns"][key]["type"])
-
-    heap = Heap(format,
-                data["key"],
-                table_filename(nombre_tabla))
-
     for key in data["columns"].keys():
         index = data["columns"][key]["index"]
-        params = data["columns"][key].get("params", [])
-        if index == None:
-            pass
-        elif index == "hash":
-            hash.append(Hash(format,
-                        key,
-                        index_filename(nombre_tabla, key, "buckets"),
-                        index_filename(nombre_tabla, key, "index"),
-                        table_filename(nombre_tabla), *params))
-        elif index == "seq":
-            seq.append(Sequential(format,
-                        key,
-                        index_filename(nombre_tabla, key, "index"),
-                        table_filename(nombre_tabla), *params))
+        if index == "hash":
+            hash.append(table.index(key))
         elif index == "bptree":
-            if len(params) != 0:
-                bptree.append(Bptree(format,
-                            key,
-                            index_filename(nombre_tabla, key, "index"),
-                            table_filename(nombre_tabla),
-                            *params))
-            else:
-                raise HTTPException(status_code=404, detail="Not enough parameters.")
-        elif index == "isam":
-            isam.append(Isam(format,
-                             key,
-                             index_filename(nombre_tabla, key, "index"),
-                             table_filename(nombre_tabla)))
-        elif index == "brin":
-            brin.append(Brin(format,
-                            key,
-                            index_filename(nombre_tabla, key, "index"),
-                            index_filename(nombre_tabla, key, "page"),
-                            table_filename(nombre_tabla),
-                            *params))
+            bptree.append(table.index(key))
 
-    rtree_keys = data.get("indexes", {}).get("rtree")
-    if rtree_keys is not None:
-        rtree = Rtree(format,
-                    data["key"],
-                    rtree_keys,
-                    table_filename(nombre_tabla),
-                    index_filename(nombre_tabla, *rtree_keys, "index"))
-
-    rebuild = False
+    rtree = table.rtree()
 
     for pos in ans_set:
-        if heap.mark_deleted(pos):
-            rebuild = True
-        # for h in hash:
-        #     h.delete(pos)
-        # not implemented in b tree
-        # for s in seq:
-        #     s.eliminar(pos)
+        record = heap.read(pos)
+        if record is None or not heap.mark_deleted(pos):
+            continue
+        for h in hash:
+            h.delete(h.RT.get_key(record), pos)
+        for bp in bptree:
+            bp.delete(bp.RT.get_key(record), pos)
         if rtree is not None:
             rtree.delete(pos)
 
-    if rebuild:
-        hash = []
-        seq = []
-        rtree = None
-        bptree = []
-        isam = []
-        brin = []
+    # si quedaron muchos eliminados, la tabla se compacta en segundo plano
+    compactor.notify(nombre_tabla, heap._read_header(), heap._read_deleted())
 
-        # eliminar indices en la tabla
-        for key in data["columns"].keys():
-            index = data["columns"][key]["index"]
-            if index == "hash":
-                os.remove(index_filename(nombre_tabla, key, "buckets"))
-            if index == "brin":
-                os.remove(index_filename(nombre_tabla, key, "page"))
-            if index is not None and index != "rtree":
-                index_file = index_filename(nombre_tabla,
-                                        key,
-                                        "index")
-                os.remove(index_file)
-
-            # remake index files
-            if index == None:
-                pass
-            elif index == "hash":
-                hash.append(Hash(format,
-                            key,
-                            index_filename(nombre_tabla, key, "buckets"),
-                            index_filename(nombre_tabla, key, "index"),
-                            table_filename(nombre_tabla), *params))
-            elif index == "seq":
-                seq.append(Sequential(format,
-                            key,
-                            index_filename(nombre_tabla, key, "index"),
-                            table_filename(nombre_tabla), *params))
-            elif index == "bptree":
-                bptree.append(Bptree(format,
-                            key,
-                            index_filename(nombre_tabla, key, "index"),
-                            table_filename(nombre_tabla),
-                            *params))
-            elif index == "isam":
-                isam.append(Isam(format,
-                                 key,
-                                 index_filename(nombre_tabla, key, "index"),
-                                 table_filename(nombre_tabla)))
-            elif index == "brin":
-                brin.append(Brin(format,
-                            key,
-                            index_filename(nombre_tabla, key, "index"),
-                            index_filename(nombre_tabla, key, "page"),
-                            table_filename(nombre_tabla),
-                            *params))
-
-        rtree_keys = data.get("indexes", {}).get("rtree")
-        if rtree_keys is not None:
-            os.remove(index_filename(nombre_tabla, *rtree_keys, "index"))
-
-        rtree_keys = data.get("indexes", {}).get("rtree")
-        if rtree_keys is not None:
-            rtree = Rtree(format,
-                        data["key"],
-                        rtree_keys,
-                        table_filename(nombre_tabla),
-                        index_filename(nombre_tabla, *rtree_keys, "index"))
-
-        records = heap._select_all()
-
-        os.remove(table_filename(nombre_tabla)) # borro la tabla
-
-        heap = Heap(format,
-                data["key"],
-                table_filename(nombre_tabla))
-
-        for r in records:
-            pos = heap.insert(r)
-            for h in hash:
-                h.insert(r, pos)
-            for bp in bptree:
-                bp.add(pos_new_record=pos)
-            for s in seq:
-                s.add(pos_new_record=pos)
-            for br in brin:
-                br.add(pos_new_record=pos)
-            if rtree is not None:
-                rtree.insert(r, pos)
-    
     end = time.time_ns()
     t_ms = end - start
 
@@ -1091,6 +1130,7 @@ def delete(query):
 def drop_index(query):
     start = time.time_ns()
     nombre_tabla = query["table"]
+    invalidate_table(nombre_tabla)
 
     if query["index"] == "rtree":
 
@@ -1101,7 +1141,7 @@ def drop_index(query):
 
         rtree_keys = data.get("indexes", {}).get("rtree")
         if rtree_keys is not None:
-            os.remove(index_filename(nombre_tabla, *rtree_keys, "index"))
+            remove_file(index_filename(nombre_tabla, *rtree_keys, "index"))
         end = time.time_ns()
         t_ms = end - start
 
@@ -1115,7 +1155,7 @@ def drop_index(query):
 
     # eliminar indice en metadata
 
-    data = select_meta(nombre_tabla)
+    data = deepcopy(select_meta(nombre_tabla))
     
     for key in query["attr"]:
         data["columns"][str(key)]["index"] = None
@@ -1123,11 +1163,11 @@ def drop_index(query):
     create_meta(data, nombre_tabla)
 
     try:
-        os.remove(index_file)
+        remove_file(index_file)
         if query["index"] == "hash":
-            os.remove(index_filename(nombre_tabla, *query["attr"], "buckets"))
+            remove_file(index_filename(nombre_tabla, *query["attr"], "buckets"))
         if query["index"] == "brin":
-            os.remove(index_filename(nombre_tabla, *query["attr"], "page"))
+            remove_file(index_filename(nombre_tabla, *query["attr"], "page"))
 
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
@@ -1142,6 +1182,7 @@ def drop_index(query):
 def drop_table(query):
     start = time.time_ns()
     nombre_tabla = query["table"]
+    invalidate_table(nombre_tabla)
     data = select_meta(nombre_tabla)
 
     print(json.dumps(data, indent=4))
@@ -1156,25 +1197,30 @@ def drop_table(query):
     for key in data["columns"].keys():
         index = data["columns"][key]["index"]
         if index == "hash":
-            os.remove(index_filename(nombre_tabla, key, "buckets"))
+            remove_file(index_filename(nombre_tabla, key, "buckets"))
         if index == "brin":
-            os.remove(index_filename(nombre_tabla, key, "page"))
+            remove_file(index_filename(nombre_tabla, key, "page"))
         if index is not None and index != "rtree" and index != "spimi":
             print("hola")
             index_file = index_filename(nombre_tabla,
                                     key,
                                     "index")
-            os.remove(index_file)
+            remove_file(index_file)
 
     rtree_keys = data.get("indexes", {}).get("rtree")
     if rtree_keys is not None:
-        os.remove(index_filename(nombre_tabla, *rtree_keys, "index"))
+        remove_file(index_filename(nombre_tabla, *rtree_keys, "index"))
+
+    # eliminar diccionarios de columnas codificadas
+    for key in data["columns"].keys():
+        if data["columns"][key]["type"] == "category" and os.path.exists(dictionary_filename(nombre_tabla, key)):
+            os.remove(dictionary_filename(nombre_tabla, key))
 
     # eliminar entrada en metadata
     delete_meta(nombre_tabla)
 
     try:
-        os.remove(data_file)
+        remove_file(data_file)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
 
@@ -3,12 +3,22 @@ import sys
 import os
 import math
 from collections import deque
+from itertools import islice
 sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
 from Utils.Registro import *
+from Utils.buffer_pool import buffer_pool
+from Utils.scratch import scratch_space
+from Utils.external_sort import ExternalSort
 from Heap_struct.Heap import Heap
 
 TAM_ENCABEZAD_DAT = 4  # Tamaño del encabezado en bytes (cantidad de registros)
 TAM_ENCABEZAD_IND = 8  # Tamaño del encabezado en bytes (cantidad de registros y puntero al root)
+DEFAULT_PAGE_SIZE = 4096  # Tamaño de página sugerido para índices con llave varchar
+
+# Página compacta (llaves varchar): hoja, cantidad de claves, padre, siguiente hoja y largo del prefijo común
+COMPACT_HEADER = struct.Struct('=?iiiH')
+COMPACT_FATHER_OFFSET = 5
+COMPACT_NEXT_OFFSET = 9
 
 
 
@@ -19,6 +29,26 @@ def get_index_format(M, format_key): # Se hizo con la finalidad que al variar M,
     format = f'b{(M-1) * format_key}{M * "i"}ii'
     return format
 
+def get_fanout_for_page_size(page_size, format_key):
+    """
+    Mayor M tal que una página de formato fijo quepa en `page_size` bytes.
+    """
+    M = 2
+    while struct.calcsize(get_index_format(M + 1, format_key)) <= page_size:
+        M += 1
+    if M < 3:
+        raise ValueError(f"Una página de {page_size} bytes no alcanza para claves '{format_key}'")
+    return M
+
+def compact_page_size(key_bytes, leaf):
+    """
+    Bytes que ocupa una página compacta con las claves (ordenadas, ya codificadas) dadas.
+    """
+    children = len(key_bytes) if leaf else len(key_bytes) + 1
+    prefix = len(os.path.commonprefix([key_bytes[0], key_bytes[-1]])) if key_bytes else 0
+    return (COMPACT_HEADER.size + prefix + 4 * children
+            + sum(2 + len(k) - prefix for k in key_bytes))
+
 class BPTree:
     """
     Clase que representa un árbol B+.
@@ -27,7 +57,8 @@ class BPTree:
                  name_index_file = 'BPTree_struct/index_file.bin', 
                  name_data_file = 'BPTree_struct/data_file.bin',
                  max_num_child = 100,
-                 force_create = False):
+                 force_create = False,
+                 page_size = None):
         
         self.index_file = name_index_file
         self.data_file = name_data_file
@@ -35,8 +66,19 @@ class BPTree:
         self.RT = RegistroType(table_format, name_key)               # Formato de los datos
 
         self.format_key = table_format[name_key]                     # Formato de la clave (KEY)
+        # Con page_size el orden sale del tamaño de página y no de max_num_child. Si la llave
+        # es varchar se usan páginas compactas: prefijo común + sufijos de largo variable
+        self.page_size = page_size
+        self.compact = page_size is not None and self.format_key[-1] == 's'
+        if self.compact:
+            width = int(self.format_key[:-1])
+            if COMPACT_HEADER.size + 4 * (4 + 2 + width) + 4 > page_size:
+                raise ValueError(f"Una página de {page_size} bytes no alcanza para claves '{self.format_key}'")
+            max_num_child = (page_size - COMPACT_HEADER.size) // 6 + 2  # cota: claves vacías
+        elif page_size is not None:
+            max_num_child = get_fanout_for_page_size(page_size, self.format_key)
         self.indexp_format = get_index_format(max_num_child, self.format_key)    # Formato de la pagina (NODO)
-        self.tam_indexp = struct.calcsize(self.indexp_format)        # Tamaño de la página de índice
+        self.tam_indexp = page_size if self.compact else struct.calcsize(self.indexp_format)  # Tamaño de la página de índice
         self._initialize_files()                                     # Inicializa los archivos de índice y datos
         self.M = max_num_child  # Orden del árbol B+
         self.tam_registro = self.RT.size                             # Tamaño del registro
@@ -49,6 +91,7 @@ class BPTree:
         """
         os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
         if not os.path.exists(self.index_file):
+            buffer_pool.discard(self.index_file)
             with open(self.index_file, 'wb') as f:
                 f.write(struct.pack('ii', 0, -2)) # Inicializa el encabezado del archivo de índice (0 datos, -2 indica que recien inicia)
         os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
@@ -100,19 +143,16 @@ class BPTree:
         """
         Lee el encabezado del archivo de índice.
         """
-        with open(self.index_file, 'rb') as f:
-            data = f.read(TAM_ENCABEZAD_IND)
-            if len(data) != TAM_ENCABEZAD_IND:
-                raise ValueError("Tamaño incorrecto al leer encabezado de índice")
-            return struct.unpack('ii', data)  # (cantidad de registros, puntero al root)
+        data = buffer_pool.read(self.index_file, 0, TAM_ENCABEZAD_IND)
+        if len(data) != TAM_ENCABEZAD_IND:
+            raise ValueError("Tamaño incorrecto al leer encabezado de índice")
+        return struct.unpack('ii', data)  # (cantidad de registros, puntero al root)
         
     def _write_header_index(self, num_pages, root_position):
         """
         Escribe el encabezado del archivo de índice.
         """
-        with open(self.index_file, 'r+b') as f:
-            f.seek(0)  # Mueve el puntero al inicio del archivo
-            f.write(struct.pack('ii', num_pages, root_position))  # Escribe el encabezado (cantidad de registros, puntero al root)
+        buffer_pool.write(self.index_file, 0, struct.pack('ii', num_pages, root_position))  # Escribe el encabezado (cantidad de registros, puntero al root)
             
     def _read_header_data(self):
         """
@@ -139,22 +179,37 @@ class BPTree:
         Lee una página de índice del archivo.
         """
 
-        with open(self.index_file, 'rb') as f:
-            offset = TAM_ENCABEZAD_IND + page_number * self.tam_indexp
-            f.seek(offset)
-            data = f.read(self.tam_indexp)
-            if len(data) != self.tam_indexp:
-                raise ValueError("Tamaño incorrecto al leer página de índice")
-            return IndexPage.from_bytes(data, self.M, self.format_key, self.indexp_format)    
+        offset = TAM_ENCABEZAD_IND + page_number * self.tam_indexp
+        data = buffer_pool.read(self.index_file, offset, self.tam_indexp)
+        if len(data) != self.tam_indexp:
+            raise ValueError("Tamaño incorrecto al leer página de índice")
+        return self._page_from_bytes(data)
                           
     def _write_index_page(self, page_number, page):
         """
         Escribe una página de índice al final del archivo.
         """
-        with open(self.index_file, 'r+b') as f:
-            offset = TAM_ENCABEZAD_IND + page_number * self.tam_indexp
-            f.seek(offset)
-            f.write(page.to_bytes(self.format_key, self.indexp_format))  # Escribe la página en la posición especificada
+        offset = TAM_ENCABEZAD_IND + page_number * self.tam_indexp
+        buffer_pool.write(self.index_file, offset, self._page_to_bytes(page))  # Escribe la página en la posición especificada
+
+    def _page_to_bytes(self, page):
+        if self.compact:
+            return page.to_compact_bytes(self.page_size)
+        return page.to_bytes(self.format_key, self.indexp_format)
+
+    def _page_from_bytes(self, data):
+        if self.compact:
+            return IndexPage.from_compact_bytes(data, self.M)
+        return IndexPage.from_bytes(data, self.M, self.format_key, self.indexp_format)
+
+    def _field_offsets(self):
+        """
+        Offsets del puntero al padre y del puntero a la siguiente hoja dentro de una página.
+        """
+        if self.compact:
+            return COMPACT_FATHER_OFFSET, COMPACT_NEXT_OFFSET
+        father = struct.calcsize(f'b{(self.M-1) * self.format_key}{self.M * "i"}')
+        return father, father - 4
 
     def _add_index_page(self, page):
         """
@@ -213,7 +268,7 @@ class BPTree:
         """
         root = self._read_header_index()[1]  # posición de la raíz
         pos_node = root
-        if pos_node == -2:
+        if pos_node < 0:
             return -1 # El árbol está vacío
         else:
             temp = self._read_index_page(pos_node)
@@ -224,7 +279,7 @@ class BPTree:
             return pos_node # Retorna un posicion de la hoja en donde deberia estar el registro
     
     def search_aux(self, pos_node ,key_min):
-        if pos_node == -2:
+        if pos_node < 0:
             return -1
         else:
             temp = self._read_index_page(pos_node)
@@ -234,69 +289,79 @@ class BPTree:
                 temp = self._read_index_page(pos_children)
             return temp # Retorna un posicion de la hoja en donde deberia estar el registro
 
-    def search(self, key):
+    def _leaf_entries(self, key1, key2):
         """
-        Busca un registro en el árbol B+.
+        Genera los pares (clave, posición) de las hojas con key1 <= clave <= key2,
+        comparando solo las claves guardadas en las hojas (sin leer el heap).
+        Se detiene en la primera clave mayor que key2.
         """
         root = self._read_header_index()[1]  # posición de la raíz
-        temp = self.search_aux(root, key)
-        inicio =True
-        results = []
+        temp = self.search_aux(root, key1)
         if temp == -1:
-            return results
-        else:
-            while True:
-                if inicio:
-                    start = temp.find_index(key) # Busca el indice de la clave minima mas cercana a la clave dada por biseccion
-                else:
-                    start = 0
-                for i in range(start,temp.key_count):
-                    if key < temp.keys[i]:
-                        break
-                    if temp.keys[i] == key:
-                        record_temp = self.HEAP.read(temp.childrens[i])
-                        if record_temp is not None:
-                            results.append(temp.childrens[i])
-                if temp.childrens[-1] != -1:
-                    inicio = False
-                    pos_children = temp.childrens[-1]
-                    temp = self._read_index_page(pos_children)
-                else:
-                    break
-            return results
+            return
+        start = temp.find_index(key1) # Busca el indice de la clave minima mas cercana a la clave dada por biseccion
+        while True:
+            for i in range(start, temp.key_count):
+                if key2 < temp.keys[i]:
+                    return
+                if temp.keys[i] >= key1:
+                    yield temp.keys[i], temp.childrens[i]
+            if temp.childrens[-1] == -1:
+                return
+            temp = self._read_index_page(temp.childrens[-1])
+            start = 0
+
+    def iter_range(self, key1, key2, check_heap: bool = True,
+                   left_open: bool = False, right_open: bool = False, batch_size: int = 256):
+        """
+        Generador de pares (clave, posición) con key1 <= clave <= key2 (o < si el extremo es abierto).
+        Sigue los punteros entre hojas a medida que se consume, así que la memoria usada
+        no depende del tamaño del rango. Con check_heap se descartan los eliminados
+        revisando su byte de eliminado por lotes de `batch_size` entradas.
+        """
+        entries = self._leaf_entries(key1, key2)
+        if left_open or right_open:
+            entries = ((key, pos) for key, pos in entries
+                       if not (left_open and key == key1) and not (right_open and key == key2))
+        if not check_heap:
+            yield from entries
+            return
+        while True:
+            batch = list(islice(entries, batch_size))
+            if not batch:
+                return
+            live = set(self.HEAP.live_positions([pos for _, pos in batch]))
+            for key, pos in batch:
+                if pos in live:
+                    yield key, pos
+
+    def cursor(self, key1, key2, **kwargs):
+        """
+        Cursor sobre iter_range para leer el rango por páginas (p. ej. con LIMIT).
+        """
+        return RangeCursor(self.iter_range(key1, key2, **kwargs))
+
+    def index_scan(self, key1, key2, check_heap: bool = True):
+        """
+        Escaneo solo de índice: retorna los pares (clave, posición) con key1 <= clave <= key2.
+        Con check_heap se descartan los registros eliminados mirando solo su byte de
+        eliminado en el heap; sin él, la respuesta sale únicamente de las hojas.
+        """
+        return list(self.iter_range(key1, key2, check_heap))
+
+    def search(self, key):
+        """
+        Busca un registro en el árbol B+.
+        """
+        return [pos for _, pos in self.index_scan(key, key)]
 
     def search_range(self, key1, key2):
         """
         Busca un rango de registros en el árbol B+.
         """
-        root = self._read_header_index()[1]  # posición de la raíz
-        temp = self.search_aux(root, key1)
-        results = []
-        inicio =True
-        if temp == -1:
-            return results
-        else:
-            while True:
-                if inicio:
-                    start = temp.find_index(key1) # Busca el indice de la clave minima mas cercana a la clave dada por biseccion
-                else:
-                    start = 0
-                for i in range(start,temp.key_count):
-                    if key2 < temp.keys[i]:
-                        break
-                    if temp.keys[i] >= key1 and temp.keys[i] <= key2:
-                        record_temp = self.HEAP.read(temp.childrens[i])
-                        if record_temp is not None:
-                            results.append(temp.childrens[i])
-                if temp.childrens[-1] != -1:
-                    inicio = False
-                    pos_children = temp.childrens[-1]
-                    temp = self._read_index_page(pos_children)
-                else:
-                    break
-            return results # Regresa la lista de registros encontrados
-    
+        return [pos for _, pos in self.index_scan(key1, key2)] # Regresa la lista de registros encontrados
     
+
     ## INSERCION ##
 
     def find_index(self, page, key):
@@ -323,11 +388,13 @@ class BPTree:
         page.key_count += 1
         return page
     
-    def key_insert_internal(self, page , key , pos_children ):
+    def key_insert_internal(self, page , key , pos_children, index=None):
         """
-        Inserta un key en la página.
+        Inserta un key en la página. Con index, el nuevo hijo queda justo a la derecha
+        del hijo index (el que se dividió), aunque haya claves repetidas.
         """
-        index = self.find_index(page, key)
+        if index is None:
+            index = self.find_index(page, key)
         # Desplaza las claves a la derecha para hacer espacio
         for i in range(page.key_count, index, -1):
             page.keys[i] = page.keys[i - 1]
@@ -337,14 +404,56 @@ class BPTree:
         page.key_count += 1
         return page
 
+    def _has_room(self, page, key):
+        """
+        Indica si la clave cabe en la página sin dividirla.
+        """
+        if not self.compact:
+            return page.key_count < self.M - 1
+        keys = sorted(page.keys[:page.key_count] + [key])
+        return compact_page_size([k.encode('utf-8') for k in keys], page.leaf) <= self.page_size
+
+    def _split_index(self, keys, leaf):
+        """
+        Cantidad de claves que se quedan en la página izquierda al dividir.
+        En páginas compactas se reparte por bytes y no por cantidad de claves.
+        """
+        n = len(keys)
+        if not self.compact:
+            return n // 2
+        key_bytes = [k.encode('utf-8') for k in keys]
+        prefix = len(os.path.commonprefix([key_bytes[0], key_bytes[-1]]))
+        sizes = [6 + len(k) - prefix for k in key_bytes]
+        half = sum(sizes) / 2
+        acc = 0
+        mid = 1
+        for i, size in enumerate(sizes):
+            acc += size
+            if acc >= half:
+                mid = i + 1
+                break
+        return max(1, min(mid, n - 1 if leaf else n - 2))
+
+    def _separator(self, left_max, right_min):
+        """
+        Clave que separa dos hojas. En páginas compactas es el prefijo más corto
+        de right_min que sigue siendo mayor que left_max (truncamiento de sufijo).
+        """
+        if not self.compact or left_max == right_min:
+            return right_min
+        for i in range(1, len(right_min) + 1):
+            if right_min[:i] > left_max:
+                return right_min[:i]
+        return right_min
+
     def split_leaf(self, pos_page , key, pos_record):
         """
         Divide una page_leaf llena en dos páginas.
         """
         page = self._read_index_page(pos_page)
         index = self.find_index(page, key)
-        temp_keys = page.keys[:self.M-1].copy()  # Copia las claves
-        temp_childrens = page.childrens[:self.M-1].copy()
+        temp_keys = page.keys[:page.key_count].copy()  # Copia las claves
+        temp_childrens = page.childrens[:page.key_count].copy()
         # Desplaza las claves y punteros a la derecha para hacer espacio
         temp_keys.insert(index, key)  # Inserta la nueva clave
         temp_childrens.insert(index, pos_record)  # Inserta el puntero al registro
@@ -352,25 +461,23 @@ class BPTree:
         header = self._read_header_index()
         pos_new_page = header[0]  # posición de la nueva página
         new_page = IndexPage(leaf=page.leaf, M = self.M)  # Crea una nueva página de índic
-        # Asigna las claves y punteros a la nueva página
-        mid_index = (self.M - 1) // 2
-        is_even = False
-        if self.M % 2 == 0:
-            is_even = True
+        # Claves que se quedan en la página original
+        total = len(temp_keys)
+        mid = self._split_index(temp_keys, leaf=True)
         pos_next_page = page.childrens[-1]  # Puntero al siguiente nodo
         # Reinicializa la página original
         page.keys = [None] * (self.M-1)
         page.childrens = [-1] * self.M
         # Actualiza la página original
-        page.keys[:mid_index+is_even] = temp_keys[:mid_index+is_even]
-        page.childrens[:mid_index+is_even] = temp_childrens[:mid_index+is_even]
-        page.key_count = mid_index+is_even 
+        page.keys[:mid] = temp_keys[:mid]
+        page.childrens[:mid] = temp_childrens[:mid]
+        page.key_count = mid
         # Asigna las claves y punteros a la nueva página
-        new_page.keys[:mid_index+1] = temp_keys[mid_index+is_even:]
-        new_page.childrens[:mid_index+1] = temp_childrens[mid_index+is_even:]
-        new_page.key_count = mid_index +1
+        new_page.keys[:total-mid] = temp_keys[mid:]
+        new_page.childrens[:total-mid] = temp_childrens[mid:]
+        new_page.key_count = total - mid
         new_page.father = page.father  # Asigna el padre
-        up = temp_keys[mid_index + is_even]
+        up = self._separator(temp_keys[mid-1], temp_keys[mid])
         # Actualiza el puntero al siguiente nodo
         new_page.childrens[self.M-1] = pos_next_page
         page.childrens[self.M-1] = pos_new_page 
@@ -379,14 +486,15 @@ class BPTree:
         self._add_index_page(new_page)
         return up, pos_new_page  # Devuelve la clave que se sube al padre
     
-    def split_parent(self, pos_page , key, pos_record):
+    def split_parent(self, pos_page , key, pos_record, index=None):
         """
         Divide una página llena en dos páginas.
         """
         page = self._read_index_page(pos_page)
-        index = self.find_index(page, key)
-        temp_keys = page.keys[:self.M-1].copy()  # Copia las claves
-        temp_childrens = page.childrens[:self.M].copy()
+        if index is None:
+            index = self.find_index(page, key)
+        temp_keys = page.keys[:page.key_count].copy()  # Copia las claves
+        temp_childrens = page.childrens[:page.key_count+1].copy()
         # Desplaza las claves y punteros a la derecha para hacer espacio
         temp_keys.insert(index, key)  # Inserta la nueva clave
         temp_childrens.insert(index+1, pos_record)  # Inserta el puntero al registro
@@ -394,25 +502,22 @@ class BPTree:
         header = self._read_header_index()
         pos_new_page = header[0]  # posición de la nueva página
         new_page = IndexPage(leaf=page.leaf,  M = self.M)  # Crea una nueva página de índic
-        # Asigna las claves y punteros a la nueva página
-        mid_index = (self.M - 1) // 2
-        is_even = False
-        if self.M % 2 == 0:
-            is_even = True
-        pos_next_page = page.childrens[-1]  # Puntero al siguiente nodo
+        # Claves que se quedan en la página original (la siguiente sube al padre)
+        total = len(temp_keys)
+        mid = self._split_index(temp_keys, leaf=False)
         # Reinicializa la página original
         page.keys = [None] * (self.M-1)
         page.childrens = [-1] * self.M
         # Actualiza la página original
-        page.keys[:mid_index+is_even] = temp_keys[:mid_index+is_even]
-        page.childrens[:mid_index+is_even+1] = temp_childrens[:mid_index+is_even+1]
-        page.key_count = mid_index+is_even 
+        page.keys[:mid] = temp_keys[:mid]
+        page.childrens[:mid+1] = temp_childrens[:mid+1]
+        page.key_count = mid
         # Asigna las claves y punteros a la nueva página
-        new_page.keys[:mid_index] = temp_keys[mid_index+1+is_even:]
-        new_page.childrens[:mid_index+1] = temp_childrens[mid_index+1+is_even:]
-        new_page.key_count = mid_index 
+        new_page.keys[:total-mid-1] = temp_keys[mid+1:]
+        new_page.childrens[:total-mid] = temp_childrens[mid+1:]
+        new_page.key_count = total - mid - 1
         new_page.father = page.father  # Asigna el padre
-        up = temp_keys[mid_index+is_even]
+        up = temp_keys[mid]
         # Actualizar padres de los nodos hijos
         for i in range(page.key_count+1):
             if page.childrens[i] != -1:
@@ -470,7 +575,7 @@ class BPTree:
         ### CASO 2.1: La raíz no está llena ###
         leaf_page = self._read_index_page(pos_leaf) # Lee la página
         
-        if leaf_page.key_count < self.M - 1 : # Si la página tiene espacio
+        if self._has_room(leaf_page, key): # Si la página tiene espacio
             # Inserta la clave y el puntero al registro
             new_leaf_page = self.key_insert_left(leaf_page, key, pos_new_record)
             self._write_index_page(pos_leaf, new_leaf_page)
@@ -507,18 +612,413 @@ class BPTree:
                     break
                 else:
                     parent_page = self._read_index_page(parent_pos)
+                    # La nueva página va junto a la que se dividió (con claves repetidas
+                    # la posición no se puede deducir de key_up)
+                    index = parent_page.childrens[:parent_page.key_count + 1].index(current_pos)
                     # Si el padre no está lleno, se inserta la clave
-                    if parent_page.key_count < self.M - 1:
-                        new_parent_page = self.key_insert_internal(parent_page, key_up, pos_new_index)
+                    if self._has_room(parent_page, key_up):
+                        new_parent_page = self.key_insert_internal(parent_page, key_up, pos_new_index, index)
                         self._write_index_page(parent_pos, new_parent_page)
                         break
                     # Si el padre está lleno, se divide
                     else:
-                        key_up, pos_new_index = self.split_parent(parent_pos, key_up, pos_new_index)
+                        key_up, pos_new_index = self.split_parent(parent_pos, key_up, pos_new_index, index)
                         current_pos = parent_pos
                         current_page = self._read_index_page(current_pos)
                         parent_pos = current_page.father
 
+    ## ELIMINACION ##
+
+    def delete(self, key, pos):
+        """
+        Elimina la entrada (key, pos) del árbol B+.
+        El underflow es perezoso: solo se rebalancea una página cuando queda casi vacía,
+        primero pidiendo prestado a un hermano y si no se puede fusionándola con él.
+        Las páginas liberadas por una fusión no se reutilizan.
+        Retorna True si la entrada estaba en el árbol.
+        """
+        root = self._read_header_index()[1]
+        if root < 0:
+            return False
+        # Desciende a la hoja más a la izquierda que puede tener la clave
+        pos_node = root
+        page = self._read_index_page(pos_node)
+        while not page.leaf:
+            pos_node = page.childrens[page.find_index(key)]
+            page = self._read_index_page(pos_node)
+        # Recorre las hojas con la clave hasta encontrar la posición
+        while True:
+            for i in range(page.find_index(key), page.key_count):
+                if key < page.keys[i]:
+                    return False
+                if page.childrens[i] == pos:
+                    keys, children = self._entries(page)
+                    del keys[i], children[i]
+                    self._set_entries(page, keys, children)
+                    self._write_index_page(pos_node, page)
+                    self._rebalance(pos_node, page)
+                    return True
+            if page.childrens[-1] == -1:
+                return False
+            pos_node = page.childrens[-1]
+            page = self._read_index_page(pos_node)
+
+    def _entries(self, page):
+        """
+        Copia de las claves e hijos usados de una página.
+        """
+        children = page.key_count if page.leaf else page.key_count + 1
+        return page.keys[:page.key_count], page.childrens[:children]
+
+    def _set_entries(self, page, keys, children):
+        """
+        Reemplaza las claves e hijos de la página (conserva el puntero a la siguiente hoja).
+        """
+        next_leaf = page.childrens[self.M - 1]
+        page.keys = keys + [None] * (self.M - 1 - len(keys))
+        page.childrens = children + [-1] * (self.M - len(children))
+        if page.leaf:
+            page.childrens[self.M - 1] = next_leaf
+        page.key_count = len(keys)
+
+    def _fits(self, page):
+        """
+        Indica si la página cabe en disco con sus claves actuales.
+        """
+        if page.key_count > self.M - 1:
+            return False
+        if not self.compact:
+            return True
+        keys = [k.encode('utf-8') for k in page.keys[:page.key_count]]
+        return compact_page_size(keys, page.leaf) <= self.page_size
+
+    def _underflow(self, page):
+        """
+        Una página está en underflow cuando le queda menos de un cuarto de su capacidad
+        (o está vacía), así una eliminación casi nunca llega a rebalancear.
+        """
+        if page.key_count == 0:
+            return True
+        if self.compact:
+            keys = [k.encode('utf-8') for k in page.keys[:page.key_count]]
+            return compact_page_size(keys, page.leaf) < self.page_size // 4
+        return page.key_count < (self.M - 1) // 4
+
+    def _set_father(self, pos_children, father):
+        child = self._read_index_page(pos_children)
+        child.father = father
+        self._write_index_page(pos_children, child)
+
+    def _rebalance(self, pos_node, page):
+        """
+        Corrige el underflow de la página subiendo por el árbol mientras las fusiones
+        dejen al padre en underflow.
+        """
+        while True:
+            if page.father == -1:
+                # La raíz puede quedar casi vacía; solo se reduce la altura o se vacía el árbol
+                if page.key_count == 0:
+                    if page.leaf:
+                        self._update_root(-1)
+                    else:
+                        self._set_father(page.childrens[0], -1)
+                        self._update_root(page.childrens[0])
+                return
+            if not self._underflow(page):
+                return
+            pos_parent = page.father
+            parent = self._read_index_page(pos_parent)
+            i = parent.childrens[:parent.key_count + 1].index(pos_node)
+            if i > 0 and self._borrow(parent, pos_parent, i - 1, from_left=True):
+                return
+            if i < parent.key_count and self._borrow(parent, pos_parent, i, from_left=False):
+                return
+            if not ((i > 0 and self._merge(parent, pos_parent, i - 1))
+                    or (i < parent.key_count and self._merge(parent, pos_parent, i))):
+                return  # no cabe en ningún hermano: se deja la página con pocas claves
+            pos_node, page = pos_parent, parent
+
+    def _borrow(self, parent, pos_parent, i, from_left):
+        """
+        Pasa una entrada entre los hijos i e i+1 del padre: del izquierdo al derecho
+        si from_left, o del derecho al izquierdo. Retorna False si el hermano que presta
+        quedaría en underflow o alguna página no cabe.
+        """
+        pos_left, pos_right = parent.childrens[i], parent.childrens[i + 1]
+        left = self._read_index_page(pos_left)
+        right = self._read_index_page(pos_right)
+        left_keys, left_children = self._entries(left)
+        right_keys, right_children = self._entries(right)
+        if not (left_keys if from_left else right_keys):
+            return False
+        separator = parent.keys[i]
+        if left.leaf:
+            if from_left:
+                right_keys.insert(0, left_keys.pop())
+                right_children.insert(0, left_children.pop())
+            else:
+                left_keys.append(right_keys.pop(0))
+                left_children.append(right_children.pop(0))
+            if not left_keys or not right_keys:
+                return False
+            separator = self._separator(left_keys[-1], right_keys[0])
+        elif from_left:
+            # Rotación por el padre: la clave del padre baja y la última del hermano sube
+            right_keys.insert(0, separator)
+            right_children.insert(0, left_children.pop())
+            separator = left_keys.pop()
+            moved = right_children[0]
+        else:
+            left_keys.append(separator)
+            left_children.append(right_children.pop(0))
+            separator = right_keys.pop(0)
+            moved = left_children[-1]
+
+        old_separator = parent.keys[i]
+        self._set_entries(left, left_keys, left_children)
+        self._set_entries(right, right_keys, right_children)
+        parent.keys[i] = separator
+        lender = left if from_left else right
+        if self._underflow(lender) or not all(self._fits(p) for p in (left, right, parent)):
+            parent.keys[i] = old_separator
+            return False
+        self._write_index_page(pos_left, left)
+        self._write_index_page(pos_right, right)
+        self._write_index_page(pos_parent, parent)
+        if not left.leaf:
+            self._set_father(moved, pos_right if from_left else pos_left)
+        return True
+
+    def _merge(self, parent, pos_parent, i):
+        """
+        Fusiona el hijo i+1 del padre dentro del hijo i y quita su separador del padre.
+        Retorna False si la página fusionada no cabe.
+        """
+        pos_left, pos_right = parent.childrens[i], parent.childrens[i + 1]
+        left = self._read_index_page(pos_left)
+        right = self._read_index_page(pos_right)
+        left_keys, left_children = self._entries(left)
+        right_keys, right_children = self._entries(right)
+        if left.leaf:
+            left_keys += right_keys
+            left.childrens[self.M - 1] = right.childrens[self.M - 1]  # salta la hoja fusionada
+        else:
+            left_keys += [parent.keys[i]] + right_keys
+        left_children += right_children
+        if len(left_keys) > self.M - 1:
+            return False
+        self._set_entries(left, left_keys, left_children)
+        if not self._fits(left):
+            return False
+
+        parent_keys, parent_children = self._entries(parent)
+        del parent_keys[i], parent_children[i + 1]
+        self._set_entries(parent, parent_keys, parent_children)
+        self._write_index_page(pos_left, left)
+        self._write_index_page(pos_parent, parent)
+        if not left.leaf:
+            for child in right_children:
+                self._set_father(child, pos_left)
+        return True
+
+    ## CARGA MASIVA ##
+
+    def bulk_load(self, positions=None, fill_factor: float = 1.0, max_keys_in_memory: int = None):
+        """
+        Construye el árbol de abajo hacia arriba a partir de los registros del heap
+        (todos los no eliminados, o solo `positions`).
+
+        Los pares (llave, posición) se ordenan con el merge sort externo compartido
+        (Utils/external_sort.py; `max_keys_in_memory` None usa su presupuesto de memoria) y se escriben
+        secuencialmente: primero las hojas llenas al `fill_factor` y luego cada nivel interno.
+        Si el árbol ya tiene datos, los registros se insertan uno por uno con `add`.
+        """
+        if self._read_header_index()[1] not in (-1, -2):
+            for pos in (self.HEAP.get_all() if positions is None else positions):
+                self.add(pos_new_record=pos)
+            return
+
+        sorter = ExternalSort(self.RT, max_records=max_keys_in_memory, workers=scratch_space.sort_workers)
+        with scratch_space.session(self.index_file) as scratch:
+            pairs, total = sorter.sort(self.HEAP.iter_keys(positions), scratch)
+            if total > 0:
+                self._write_bottom_up(pairs, total, fill_factor)
+
+    def remap_positions(self, remap, name_index_file):
+        """
+        Escribe en name_index_file un árbol con las mismas claves y cada posición p
+        cambiada por remap[p]; las entradas con remap -1 se descartan. Se usa al compactar
+        el heap: las claves salen de las hojas, ya ordenadas, sin leer ningún registro.
+        """
+        pairs = []
+        root = self._read_header_index()[1]
+        if root >= 0:
+            page = self._read_index_page(root)
+            while not page.leaf:
+                page = self._read_index_page(page.childrens[0])  # hoja más a la izquierda
+            while True:
+                for i in range(page.key_count):
+                    pos = page.childrens[i]
+                    if pos < len(remap) and remap[pos] != -1:
+                        pairs.append((page.keys[i], remap[pos]))
+                if page.childrens[-1] == -1:
+                    break
+                page = self._read_index_page(page.childrens[-1])
+
+        buffer_pool.discard(name_index_file)
+        if os.path.exists(name_index_file):
+            os.remove(name_index_file)
+        tree = BPTree(self.RT.dict_format, self.RT.key, name_index_file, self.data_file,
+                      max_num_child=self.M, page_size=self.page_size)
+        if pairs:
+            tree._write_bottom_up(iter(pairs), len(pairs), 1.0)
+        return tree
+
+    @staticmethod
+    def _split_evenly(total, groups):
+        """
+        Reparte `total` elementos en `groups` grupos de tamaños que difieren a lo más en uno.
+        """
+        size, extra = divmod(total, groups)
+        return [size + 1 if i < extra else size for i in range(groups)]
+
+    def _leaf_groups(self, pairs, total, fill_factor):
+        """
+        Agrupa los pares ordenados en hojas: por cantidad de claves en páginas fijas
+        (repartidas en partes iguales) y por bytes en páginas compactas.
+        """
+        if not self.compact:
+            capacity = max(1, min(self.M - 1, int((self.M - 1) * fill_factor)))
+            for size in self._split_evenly(total, math.ceil(total / capacity)):
+                yield tuple(zip(*islice(pairs, size)))
+            return
+
+        budget = max(int(self.page_size * fill_factor), COMPACT_HEADER.size + 6)
+        keys, positions = [], []
+        first = None
+        suffixes = 0  # suma de los largos de las claves de la hoja actual
+        for key, pos in pairs:
+            encoded = key.encode('utf-8')
+            if keys:
+                # con claves ordenadas, el prefijo común es el de la primera y la última
+                prefix = len(os.path.commonprefix([first, encoded]))
+                n = len(keys) + 1
+                size = COMPACT_HEADER.size + prefix + 6 * n + suffixes + len(encoded) - n * prefix
+                if size > budget:
+                    yield keys, positions
+                    keys, positions = [], []
+            if not keys:
+                first, suffixes = encoded, 0
+            keys.append(key)
+            positions.append(pos)
+            suffixes += len(encoded)
+        if keys:
+            yield keys, positions
+
+    def _internal_groups(self, children, fill_factor):
+        """
+        Agrupa los nodos de un nivel (página, menor clave, mayor clave) en nodos padre
+        de al menos dos hijos.
+        """
+        if not self.compact:
+            capacity = max(2, min(self.M, int(self.M * fill_factor)))
+            nodes = len(children)
+            groups = math.ceil(nodes / capacity)
+            if nodes // groups < 2:
+                groups = nodes // 2  # cada nodo interno necesita al menos dos hijos
+            start = 0
+            for size in self._split_evenly(nodes, groups):
+                yield children[start:start + size]
+                start += size
+            return
+
+        budget = int(self.page_size * fill_factor)
+        groups = [[children[0]]]
+        separators = [[]]
+        for left, child in zip(children, children[1:]):
+            separator = self._separator(left[2], child[1]).encode('utf-8')
+            candidate = separators[-1] + [separator]
+            if len(groups[-1]) >= 2 and compact_page_size(candidate, False) > budget:
+                groups.append([child])
+                separators.append([])
+            else:
+                groups[-1].append(child)
+                separators[-1] = candidate
+        if len(groups) > 1 and len(groups[-1]) == 1:
+            last = groups.pop()
+            if len(groups[-1]) > 2:
+                last.insert(0, groups[-1].pop())
+                groups.append(last)
+            else:
+                groups[-1].extend(last)
+        yield from groups
+
+    def _write_bottom_up(self, pairs, total, fill_factor):
+        father_offset, next_offset = self._field_offsets()
+        fathers = []  # (página, padre): se escriben al final, cuando se conocen
+        buffer_pool.discard(self.index_file)  # el archivo se reescribe por fuera del pool
+        with open(self.index_file, 'w+b') as f:
+            f.write(struct.pack('ii', 0, -2))
+
+            # Hojas: claves y posiciones ordenadas, enlazadas con la siguiente hoja
+            children = []  # (página, menor clave, mayor clave) del nivel recién escrito
+            page_number = 0
+            for keys, positions in self._leaf_groups(pairs, total, fill_factor):
+                page = IndexPage(leaf=True, M=self.M)
+                page.keys[:len(keys)] = keys
+                page.childrens[:len(keys)] = positions
+                page.key_count = len(keys)
+                page.childrens[self.M - 1] = page_number + 1
+                f.write(self._page_to_bytes(page))
+                children.append((page_number, keys[0], keys[-1]))
+                page_number += 1
+            last_leaf = page_number - 1
+
+            # Niveles internos: cada separador divide la mayor clave de un hijo y la menor del siguiente
+            while len(children) > 1:
+                parents = []
+                for group in self._internal_groups(children, fill_factor):
+                    page = IndexPage(leaf=False, M=self.M)
+                    page.childrens[:len(group)] = [child[0] for child in group]
+                    page.keys[:len(group) - 1] = [self._separator(left[2], right[1])
+                                                  for left, right in zip(group, group[1:])]
+                    page.key_count = len(group) - 1
+                    fathers.extend((child[0], page_number) for child in group)
+                    f.write(self._page_to_bytes(page))
+                    parents.append((page_number, group[0][1], group[-1][2]))
+                    page_number += 1
+                children = parents
+
+            # Se completan los punteros que no se conocían al escribir cada página
+            for page, father in fathers:
+                f.seek(TAM_ENCABEZAD_IND + page * self.tam_indexp + father_offset)
+                f.write(struct.pack('i', father))
+            f.seek(TAM_ENCABEZAD_IND + last_leaf * self.tam_indexp + next_offset)
+            f.write(struct.pack('i', -1))
+            f.seek(0)
+            f.write(struct.pack('ii', page_number, page_number - 1))
+
+class RangeCursor:
+    """
+    Cursor sobre un recorrido de hojas del árbol B+: entrega los resultados
+    de a `n` con fetch, sin materializar el rango completo.
+    """
+    def __init__(self, entries):
+        self._entries = iter(entries)
+        self.exhausted = False
+
+    def fetch(self, n: int = None) -> list:
+        """
+        Retorna hasta `n` pares (clave, posición); todos los restantes si n es None.
+        """
+        rows = list(islice(self._entries, n))
+        if n is None or len(rows) < n:
+            self.exhausted = True
+        return rows
+
+    def __iter__(self):
+        return self._entries
+
 class IndexPage():
     def __init__(self, leaf=True, M=None):
         self.leaf = leaf
@@ -602,6 +1102,49 @@ class IndexPage():
 
         return instance
     
+    def to_compact_bytes(self, page_size):
+        """
+        Serializa la página en formato compacto (claves varchar): encabezado, prefijo común,
+        punteros y luego cada clave como (largo del sufijo, sufijo). Se rellena hasta page_size.
+        """
+        keys = [key.encode('utf-8') for key in self.keys[:self.key_count]]
+        prefix = os.path.commonprefix([keys[0], keys[-1]]) if keys else b''
+        children = self.key_count if self.leaf else self.key_count + 1
+        next_leaf = self.childrens[self.M - 1] if self.leaf else -1
+        parts = [COMPACT_HEADER.pack(self.leaf, self.key_count, self.father, next_leaf, len(prefix)),
+                 prefix,
+                 struct.pack(f'={children}i', *self.childrens[:children])]
+        for key in keys:
+            suffix = key[len(prefix):]
+            parts.append(struct.pack('=H', len(suffix)))
+            parts.append(suffix)
+        data = b''.join(parts)
+        if len(data) > page_size:
+            raise ValueError(f"La página ocupa {len(data)} bytes y el máximo es {page_size}")
+        return data.ljust(page_size, b'\x00')
+
+    @classmethod
+    def from_compact_bytes(cls, data, M):
+        leaf, key_count, father, next_leaf, prefix_len = COMPACT_HEADER.unpack_from(data)
+        offset = COMPACT_HEADER.size
+        prefix = bytes(data[offset:offset + prefix_len])
+        offset += prefix_len
+
+        instance = cls(leaf=leaf, M=M)
+        children = key_count if leaf else key_count + 1
+        instance.childrens[:children] = struct.unpack_from(f'={children}i', data, offset)
+        offset += 4 * children
+        if leaf:
+            instance.childrens[M - 1] = next_leaf
+        for i in range(key_count):
+            (length,) = struct.unpack_from('=H', data, offset)
+            offset += 2
+            instance.keys[i] = (prefix + data[offset:offset + length]).decode('utf-8')
+            offset += length
+        instance.key_count = key_count
+        instance.father = father
+        return instance
+
     # busca el indice de la clave minima mas cercana a la clave dada por biseccion
     def find_index(self, key):
         """
@@ -0,0 +1,193 @@
+import unittest
+import os
+import sys
+import random
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+from BPtree_struct.Indice_BPTree_file import BPTree, get_fanout_for_page_size
+from Heap_struct.Heap import Heap
+from Utils.buffer_pool import buffer_pool
+
+
+class TestBPTree(unittest.TestCase):
+    def setUp(self):
+        self.format_dict = {"id": "i", "name": "10s"}
+        self.data_file = "test_bptree_data.bin"
+        self.index_file = "test_bptree_index.bin"
+        self.heap = Heap(self.format_dict, key="id", data_file_name=self.data_file, force_create=True)
+        random.seed(7)
+        self.ids = [random.randint(0, 300) for _ in range(500)]  # con repetidos
+        self.positions = list(self.heap.insert_many([[i, f"n{i}"] for i in self.ids]))
+
+    def tearDown(self):
+        for filename in (self.data_file, self.index_file):
+            buffer_pool.discard(filename)
+            Heap.discard(filename)
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def _tree(self, M=5):
+        buffer_pool.discard(self.index_file)
+        if os.path.exists(self.index_file):
+            os.remove(self.index_file)
+        return BPTree(self.format_dict, "id", os.path.abspath(self.index_file),
+                      os.path.abspath(self.data_file), max_num_child=M)
+
+    def _expected(self, left, right):
+        return sorted(pos for pos, i in zip(self.positions, self.ids) if left <= i <= right)
+
+    def test_bulk_load_matches_searches(self):
+        for M, fill_factor in ((5, 1.0), (4, 0.7), (100, 1.0)):
+            tree = self._tree(M)
+            tree.bulk_load(fill_factor=fill_factor, max_keys_in_memory=64)  # fuerza varios bloques
+            for key in (0, 17, 150, 300, 301):
+                self.assertEqual(sorted(tree.search(key)), self._expected(key, key))
+            self.assertEqual(sorted(tree.search_range(40, 210)), self._expected(40, 210))
+            self.assertFalse(any(f.startswith(self.index_file + ".run") for f in os.listdir(".")))
+
+    def test_index_scan_does_not_read_records(self):
+        tree = self._tree()
+        tree.bulk_load()
+        deleted = self._expected(100, 100)[0]
+        self.heap.mark_deleted(deleted)
+        tree.HEAP.read = None  # cualquier lectura de registros fallaría
+
+        entries = tree.index_scan(90, 120)
+        self.assertEqual(sorted(pos for _, pos in entries),
+                         [p for p in self._expected(90, 120) if p != deleted])
+        self.assertTrue(all(90 <= key <= 120 and self.ids[pos] == key for key, pos in entries))
+        self.assertIn(deleted, [pos for _, pos in tree.index_scan(100, 100, check_heap=False)])
+
+    def test_cursor_pages_through_range(self):
+        tree = self._tree()
+        tree.bulk_load()
+        cursor = tree.cursor(40, 210, left_open=True)
+        pages = []
+        while not cursor.exhausted:
+            pages.append(cursor.fetch(50))
+        self.assertTrue(all(len(page) <= 50 for page in pages))
+        keys = [key for page in pages for key, _ in page]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(sorted(pos for page in pages for _, pos in page),
+                         [p for p in self._expected(40, 210) if self.ids[p] != 40])
+
+    def test_compact_pages_for_varchar_keys(self):
+        format_dict = {"id": "i", "name": "40s"}
+        heap = Heap(format_dict, key="name", data_file_name=self.data_file, force_create=True)
+        names = [f"cliente/region-{i % 7}/{random.randint(0, 2000):05d}" for i in range(1500)]
+        heap.insert_many([[i, name] for i, name in enumerate(names)])
+
+        def expected(left, right):
+            return sorted(pos for pos, name in enumerate(names) if left <= name <= right)
+
+        for build in ("add", "bulk_load"):
+            buffer_pool.discard(self.index_file)
+            if os.path.exists(self.index_file):
+                os.remove(self.index_file)
+            tree = BPTree(format_dict, "name", os.path.abspath(self.index_file),
+                          os.path.abspath(self.data_file), page_size=512)
+            self.assertTrue(tree.compact)
+            if build == "add":
+                for pos in range(len(names)):
+                    tree.add(pos_new_record=pos)
+            else:
+                tree.bulk_load(fill_factor=0.9)
+            for name in (names[0], names[100], "cliente/region-3/00000", "zzz"):
+                self.assertEqual(sorted(tree.search(name)), expected(name, name))
+            self.assertEqual(sorted(tree.search_range("cliente/region-2", "cliente/region-4/01000")),
+                             expected("cliente/region-2", "cliente/region-4/01000"))
+
+            pages, root = tree._read_header_index()
+            if build == "bulk_load":
+                compact_pages = pages
+
+        # con páginas fijas del mismo tamaño el árbol necesita más páginas
+        buffer_pool.discard(self.index_file)
+        os.remove(self.index_file)
+        fixed = BPTree(format_dict, "name", os.path.abspath(self.index_file),
+                       os.path.abspath(self.data_file), max_num_child=get_fanout_for_page_size(512, "40s"))
+        fixed.bulk_load(fill_factor=0.9)
+        self.assertLessEqual(fixed.tam_indexp, 512)
+        self.assertLess(compact_pages, fixed._read_header_index()[0])
+
+    def test_add_after_bulk_load(self):
+        tree = self._tree()
+        tree.bulk_load(self.positions[:300])
+        for pos in self.positions[300:]:
+            tree.add(pos_new_record=pos)
+        self.assertEqual(sorted(tree.search_range(0, 300)), self.positions)
+
+    def test_bulk_load_on_non_empty_tree_inserts(self):
+        tree = self._tree()
+        tree.add(pos_new_record=self.positions[0])
+        tree.bulk_load(self.positions[1:])
+        self.assertEqual(sorted(tree.search_range(0, 300)), self.positions)
+
+    def test_remap_positions(self):
+        tree = self._tree()
+        tree.bulk_load()
+        removed = set(random.sample(self.positions, 200))
+        remap, live = [], 0
+        for pos in self.positions:
+            remap.append(-1 if pos in removed else live)
+            live += pos not in removed
+
+        remapped_file = os.path.abspath(self.index_file + ".remap")
+        try:
+            remapped = tree.remap_positions(remap, remapped_file)
+            self.assertEqual(sorted(remapped.index_scan(0, 300, check_heap=False)),
+                             sorted((self.ids[p], remap[p]) for p in self.positions if p not in removed))
+        finally:
+            buffer_pool.discard(remapped_file)
+            os.remove(remapped_file)
+
+    def test_delete_keeps_tree_searchable(self):
+        for build in ("add", "bulk_load"):
+            tree = self._tree(M=4)
+            if build == "add":
+                for pos in self.positions:
+                    tree.add(pos_new_record=pos)
+            else:
+                tree.bulk_load()
+            removed = random.sample(self.positions, 450)
+            for pos in removed:
+                self.assertTrue(tree.delete(self.ids[pos], pos))
+            self.assertFalse(tree.delete(self.ids[removed[0]], removed[0]))
+
+            alive = set(self.positions) - set(removed)
+            for key in (0, 17, 150, 300):
+                self.assertEqual(sorted(tree.search(key)),
+                                 sorted(p for p in alive if self.ids[p] == key))
+            self.assertEqual(sorted(tree.search_range(0, 300)), sorted(alive))
+
+            # se puede seguir insertando y vaciar el árbol por completo
+            for pos in removed[:100]:
+                tree.add(pos_new_record=pos)
+            alive |= set(removed[:100])
+            self.assertEqual(sorted(tree.search_range(0, 300)), sorted(alive))
+            for pos in alive:
+                self.assertTrue(tree.delete(self.ids[pos], pos))
+            self.assertEqual(tree.search_range(0, 300), [])
+            self.assertEqual(tree._read_header_index()[1], -1)
+
+    def test_delete_on_compact_pages(self):
+        format_dict = {"id": "i", "name": "30s"}
+        heap = Heap(format_dict, key="name", data_file_name=self.data_file, force_create=True)
+        names = [f"k/{random.randint(0, 300):04d}" + "x" * random.randint(0, 20) for _ in range(800)]
+        heap.insert_many([[i, name] for i, name in enumerate(names)])
+        tree = BPTree(format_dict, "name", os.path.abspath(self.index_file),
+                      os.path.abspath(self.data_file), page_size=256)
+        tree.bulk_load()
+
+        removed = set(random.sample(range(len(names)), 600))
+        for pos in removed:
+            self.assertTrue(tree.delete(names[pos], pos))
+        alive = set(range(len(names))) - removed
+        self.assertEqual(sorted(tree.search_range("k/", "k/9999")), sorted(alive))
+        for pos in list(alive)[:20]:
+            self.assertEqual(sorted(tree.search(names[pos])),
+                             sorted(p for p in alive if names[p] == names[pos]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
 from Utils.Registro import *
 import math
 from Heap_struct.Heap import Heap
+from Utils.buffer_pool import buffer_pool
 
 
 # Constantes generales
@@ -250,9 +251,11 @@ class BRIN:
             with open(self.data_file, 'wb') as f:
                 f.write(struct.pack('i', 0)) 
         if not os.path.exists(self.index_file):
+            buffer_pool.discard(self.index_file)
             with open(self.index_file, 'wb') as f:
                 f.write(struct.pack('i?', 0, True))
         if not os.path.exists(self.page_file):
+            buffer_pool.discard(self.page_file)
             with open(self.page_file, 'wb') as f:
                 f.write(struct.pack('i', 0))
 
@@ -263,37 +266,31 @@ class BRIN:
         """
         Lee el encabezado del archivo de páginas.
         """
-        with open(self.page_file, 'rb') as f:
-            header = f.read(TAM_ENCABEZAD_PAGE)
-            if not header:
-                return 0
-            return struct.unpack('i', header)[0]
+        header = buffer_pool.read(self.page_file, 0, TAM_ENCABEZAD_PAGE)
+        if not header:
+            return 0
+        return struct.unpack('i', header)[0]
 
     def _write_header_page(self, num_pages):
         """
         Escribe el encabezado del archivo de páginas.
         """
-        with open(self.page_file, 'r+b') as f:
-            f.seek(0)
-            f.write(struct.pack('i', num_pages))
+        buffer_pool.write(self.page_file, 0, struct.pack('i', num_pages))
     
     ## Encabezado de archivo para indice BRIN ##
     def _read_header_index(self):
         """
         Lee el encabezado del archivo de índice BRIN.
         """
-        with open(self.index_file, 'rb') as f:
-            header = f.read(TAM_ENCABEZAD_BRIN)
-            num_brins, is_order = struct.unpack('i?', header)
-            return num_brins, is_order
+        header = buffer_pool.read(self.index_file, 0, TAM_ENCABEZAD_BRIN)
+        num_brins, is_order = struct.unpack('i?', header)
+        return num_brins, is_order
 
     def _write_header_index(self, num_indexes , is_order):
         """
         Escribe el encabezado del archivo de índice BRIN.
         """
-        with open(self.index_file, 'r+b') as f:
-            f.seek(0)
-            f.write(struct.pack('i?', num_indexes , is_order))
+        buffer_pool.write(self.index_file, 0, struct.pack('i?', num_indexes , is_order))
     
     def _update_order(self, is_order):
         """
@@ -308,18 +305,15 @@ class BRIN:
         """
         Lee una página del archivo de páginas.
         """
-        with open(self.page_file, 'rb') as f:
-            f.seek(TAM_ENCABEZAD_PAGE + page_number * self.tam_page)
-            data = f.read(self.tam_page)
-            return Index_Page.from_bytes(data, self.M, self.format_key, self.format_page)
+        data = buffer_pool.read(self.page_file, TAM_ENCABEZAD_PAGE + page_number * self.tam_page, self.tam_page)
+        return Index_Page.from_bytes(data, self.M, self.format_key, self.format_page)
         
     def _write_page(self, page_number, page : Index_Page):
         """
         Escribe una página en el archivo de páginas.
         """
-        with open(self.page_file, 'r+b') as f:
-            f.seek(TAM_ENCABEZAD_PAGE + page_number * self.tam_page)
-            f.write(page.to_bytes(self.format_key, self.format_page))
+        buffer_pool.write(self.page_file, TAM_ENCABEZAD_PAGE + page_number * self.tam_page,
+                          page.to_bytes(self.format_key, self.format_page))
     
     def _add_page(self, page):
         """
@@ -335,18 +329,15 @@ class BRIN:
         """
         Lee un índice BRIN del archivo de índice.
         """
-        with open(self.index_file, 'rb') as f:
-            f.seek(TAM_ENCABEZAD_BRIN + index_number * self.tam_index)
-            data = f.read(self.tam_index)
-            return Indice_Brin.from_bytes(data, self.K, self.format_key, self.format_index)
+        data = buffer_pool.read(self.index_file, TAM_ENCABEZAD_BRIN + index_number * self.tam_index, self.tam_index)
+        return Indice_Brin.from_bytes(data, self.K, self.format_key, self.format_index)
         
     def _write_brin(self, index_number, brin : Indice_Brin):
         """
         Escribe un índice BRIN en el archivo de índice.
         """
-        with open(self.index_file, 'r+b') as f:
-            f.seek(TAM_ENCABEZAD_BRIN + index_number * self.tam_index)
-            f.write(brin.to_bytes(self.format_key, self.format_index))
+        buffer_pool.write(self.index_file, TAM_ENCABEZAD_BRIN + index_number * self.tam_index,
+                          brin.to_bytes(self.format_key, self.format_index))
     
     def _add_brin(self , key , pos_new_record):
         """
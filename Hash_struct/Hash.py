@@ -2,43 +2,92 @@ import pickle
 import sys
 import hashlib
 import os
+import shutil
+import zlib
 sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
 from Utils.Registro import *
+from Utils.buffer_pool import buffer_pool
+from Utils.scratch import scratch_space
 from Heap_struct.Heap import *
 
-def get_bits(dato: any, nbits: int) -> str:
+try:
+    import xxhash
+except ImportError:  # xxhash es opcional: sin él no se ofrece 'xxh64'
+    xxhash = None
+
+MAGIC = 0x33485348          # marca del formato con directorio en arreglo ("HSH3")
+MAGIC_V2 = 0x32485348       # mismo formato con buckets sin fingerprints ("HSH2")
+MAGIC_V1 = 0x48415348       # además sin la función de hash en el encabezado ("HASH")
+DIRECTORY_CHUNK = 1024      # entradas del directorio por página del buffer pool
+
+MASK32 = 0xFFFFFFFF
+MASK64 = 0xFFFFFFFFFFFFFFFF
+FINGERPRINT_BITS = 32       # bits bajos del hash de la clave que se guardan junto a cada posición
+PART_STRUCT = struct.Struct('Qi')  # (hash, posición) en los archivos temporales de bulk_build
+
+def _sha256(data: bytes) -> int:
+    return int.from_bytes(hashlib.sha256(data).digest(), 'big')
+
+def _crc32(data: bytes) -> int:
+    # CRC32 (en C) + mezcla final de murmur3 para que los bits bajos queden bien repartidos
+    h = zlib.crc32(data)
+    h ^= h >> 16
+    h = (h * 0x85EBCA6B) & MASK32
+    h ^= h >> 13
+    h = (h * 0xC2B2AE35) & MASK32
+    return h ^ (h >> 16)
+
+def _fnv1a(data: bytes) -> int:
+    h = 0xCBF29CE484222325
+    for byte in data:
+        h = ((h ^ byte) * 0x100000001B3) & MASK64
+    return h
+
+# Funciones de hash disponibles: nombre -> (id guardado en el encabezado, función bytes -> int).
+# Todas son deterministas entre procesos (no se usa hash() de Python, que tiene semilla aleatoria).
+HASH_FUNCTIONS = {
+    'sha256': (0, _sha256),   # la del formato original
+    'crc32': (1, _crc32),
+    'fnv1a': (2, _fnv1a),
+}
+if xxhash is not None:
+    HASH_FUNCTIONS['xxh64'] = (3, xxhash.xxh64_intdigest)
+
+DEFAULT_HASH_FUNCTION = 'crc32'
+
+def hash_function_by_id(function_id: int):
+    for name, (identifier, function) in HASH_FUNCTIONS.items():
+        if identifier == function_id:
+            return function
+    raise ValueError(f"Función de hash {function_id} no disponible (¿falta instalar xxhash?)")
+
+def key_bytes(dato: any) -> bytes:
+    """
+    Convierte una clave a bytes para hashearla. Los números se hashean por su texto,
+    así la clave leída de un CSV ('17') y la de una consulta (17) caen en el mismo bucket.
+    """
+    if isinstance(dato, str):
+        return dato.encode('utf-8')
+    if isinstance(dato, (int, float)):
+        return str(dato).encode('utf-8')
+    return pickle.dumps(dato)
+
+def hash_key(dato: any, hash_function: str = DEFAULT_HASH_FUNCTION) -> int:
+    """
+    Hash deterministico y persistente de un dato, como entero.
+    :param dato: dato a hashear
+    :param hash_function: nombre de la función de hash (ver HASH_FUNCTIONS)
+    """
+    return HASH_FUNCTIONS[hash_function][1](key_bytes(dato))
+
+def get_bits(dato: any, nbits: int, hash_function: str = DEFAULT_HASH_FUNCTION) -> str:
     """
     toma los ultimos n bits de un dato en binario.
     :param dato: dato a convertir
     :param nbits: cantidad de bits a tomar
+    :param hash_function: nombre de la función de hash (ver HASH_FUNCTIONS)
     """
-    # hashed = None
-    # if isinstance(dato, int): # numeros
-    #     hashed = hash(dato)
-    # elif isinstance(dato, float): # float
-    #     hashed = hash(dato)
-    # elif isinstance(dato, str): # texto
-    #     hashed = hash(dato)
-    # else:
-    #     dato_bytes = pickle.dumps(dato)
-    #     hashed = hash(dato_bytes)
-
-    # Convert data to bytes for hashing
-    if isinstance(dato, int):
-        data_bytes = str(dato).encode('utf-8')
-    elif isinstance(dato, float):
-        data_bytes = str(dato).encode('utf-8')
-    elif isinstance(dato, str):
-        data_bytes = dato.encode('utf-8')
-    else:
-        data_bytes = pickle.dumps(dato)
-    
-    # Hash deterministico persitente usando SHA256
-    hash_obj = hashlib.sha256(data_bytes)
-    hash_int = int(hash_obj.hexdigest(), 16)
-
-    # return bin(hashed & ((1 << nbits) - 1))[2:].zfill(nbits)
-    return bin(hash_int & ((1 << nbits) - 1))[2:].zfill(nbits)
+    return bin(hash_key(dato, hash_function) & ((1 << nbits) - 1))[2:].zfill(nbits)
 
 class BucketType:
     """
@@ -48,9 +97,11 @@ class BucketType:
     BT.to_bytes = convierte el bucket a bytes
     BT.from_bytes = convierte bytes a un bucket
     BT.max_records = cantidad maxima de registros por bucket
+    Junto a cada posición se guarda el fingerprint de su clave (bits bajos del hash), así
+    las entradas que no coinciden se descartan sin leer el registro del heap.
     """
     def __init__(self, max_records: int):
-        self.FORMAT = 'i' * max_records + 'iii' # *Records, local_depth, fullness, overflow_position
+        self.FORMAT = 'i' * max_records + 'I' * max_records + 'iii' # *Records, *Fingerprints, local_depth, fullness, overflow_position
         self.size = struct.calcsize(self.FORMAT)
         self.max_records = max_records
 
@@ -60,6 +111,7 @@ class BucketType:
         """
         return struct.pack(self.FORMAT,
                            *bucket['records'],
+                           *bucket['fingerprints'],
                            bucket['local_depth'],
                            bucket['fullness'],
                            bucket['overflow_position']
@@ -72,6 +124,7 @@ class BucketType:
         unpacked = struct.unpack(self.FORMAT, data)
         bucket = {
             'records': list(unpacked[0:self.max_records]),
+            'fingerprints': list(unpacked[self.max_records:2 * self.max_records]),
             'local_depth': unpacked[-3],
             'fullness': unpacked[-2],
             'overflow_position': unpacked[-1]
@@ -80,24 +133,13 @@ class BucketType:
 
 class TreeNodeType:
     """
-    Estructura que maneja el control de los nodos del arbol.
+    Nodo del árbol de directorio del formato anterior (trie binario en el archivo de índice).
+    Solo se usa para migrar índices antiguos al directorio en arreglo.
     """
     def __init__(self):
         self.FORMAT = 'iiii'
         self.size = struct.calcsize(self.FORMAT)
 
-
-    def to_bytes(self, treeNode: dict) -> bytes:
-        """
-        Convierte el nodo a bytes.
-        """
-        return struct.pack(self.FORMAT,
-                            treeNode['bucket_position'],
-                            treeNode['left'],
-                            treeNode['right'],
-                            treeNode['depth']
-                           )
-
     def from_bytes(self, data: bytes) -> dict:
         """
         Convierte bytes a un nodo.
@@ -113,27 +155,42 @@ class TreeNodeType:
 
 class HeaderType:
     """
-    Estructura que maneja el control del encabezado.
-    global_depth | data_last | bucket_last | node_last
+    Estructura que maneja el control del encabezado del archivo de índice.
+    magic | file_id | version | global_depth | max_depth | bucket_count | hash_function
+    Después del encabezado va el directorio: 2^global_depth posiciones de buckets ('i').
     """
     def __init__(self):
-        self.FORMAT = 'iiii'
+        self.FORMAT = 'IIIiiii'
         self.size = struct.calcsize(self.FORMAT)
 
-    def read(self, file, index: int) -> int:
+    def to_bytes(self, header: dict) -> bytes:
         """
-        Lee el encabezado del archivo de índice
+        Convierte el encabezado a bytes.
         """
-        file.seek(4 * index)
-        data = file.read(4)
-        return struct.unpack('i', data)[0]
+        return struct.pack(self.FORMAT,
+                           MAGIC,
+                           header['file_id'],
+                           header['version'],
+                           header['global_depth'],
+                           header['max_depth'],
+                           header['bucket_count'],
+                           header['hash_function']
+                           )
 
-    def write(self, file, value: int, index: int) -> None:
+    def from_bytes(self, data: bytes) -> dict:
         """
-        Escribe en el encabezado del archivo de índice
+        Convierte bytes a un encabezado.
         """
-        file.seek(4 * index)
-        file.write(struct.pack('i', value))
+        unpacked = struct.unpack(self.FORMAT, data)
+        header = {
+            'file_id': unpacked[1],
+            'version': unpacked[2],
+            'global_depth': unpacked[3],
+            'max_depth': unpacked[4],
+            'bucket_count': unpacked[5],
+            'hash_function': unpacked[6]
+        }
+        return header
 
 class Hash:
     def __init__(self, table_format: dict,
@@ -143,302 +200,536 @@ class Hash:
                  data_file_name: str,
                  global_depth: int = 16,
                  max_records_per_bucket: int = 4,
-                 force_create: bool = False):
+                 force_create: bool = False,
+                 hash_function: str = DEFAULT_HASH_FUNCTION):
         """
         Inicializa el hash extensible.
+        El directorio es un arreglo de 2^D posiciones de buckets (D = profundidad global actual)
+        que se guarda después del encabezado del archivo de índice y se mantiene en memoria;
+        se duplica cuando un bucket con profundidad local D se divide.
         :param table_format: formato de la tabla
         :param key: indice de ordenamiento
         :param buckets_file_name: nombre del archivo de buckets
         :param index_file_name: nombre del archivo de índice
-        :param global_depth: profundidad global
+        :param global_depth: profundidad global máxima (a partir de ella se usa overflow)
         :param max_records_per_bucket: cantidad maxima de registros por bucket
+        :param hash_function: función de hash para índices nuevos (ver HASH_FUNCTIONS); un índice
+        existente usa la que quedó guardada en su encabezado
         """
-        
+
         self.index_file = index_file_name
         self.buckets_file = buckets_file_name
-        self.global_depth = global_depth
+        self.max_depth = global_depth
         self.max_records = max_records_per_bucket
 
-        self.NT = TreeNodeType()
         self.RT = RegistroType(table_format, key)
         self.BT = BucketType(max_records_per_bucket)
         self.HEAP = Heap(table_format, key, data_file_name, force_create=force_create)
         self.Header = HeaderType()
 
-        self._initialize_files(global_depth, force=force_create)
+        self.directory = []     # copia en memoria del directorio
+        self._loaded = None     # (file_id, version) de la copia en memoria
+        self._hash_function = None
+
+        self._initialize_files(global_depth, HASH_FUNCTIONS[hash_function][0], force=force_create)
 
     # utility functions
-    def _initialize_files(self, global_depth, force=False):
+    def _initialize_files(self, global_depth, hash_function, force=False):
         """
-        Inicializa los archivos de índice y datos.
+        Inicializa los archivos de índice y buckets: directorio de profundidad 0 con un solo bucket.
+        Los índices con el directorio en árbol del formato anterior se migran al arreglo.
         """
-        if force or (not os.path.exists(self.index_file)) or (os.path.getsize(self.index_file) < self.Header.size):
+        if force or (not os.path.exists(self.index_file)) or (os.path.getsize(self.index_file) < self.Header.size) \
+                or (not os.path.exists(self.buckets_file)) or (os.path.getsize(self.buckets_file) < self.BT.size):
+            buffer_pool.discard(self.index_file)
+            buffer_pool.discard(self.buckets_file)
+            header = {'file_id': self._new_file_id(), 'version': 0, 'global_depth': 0,
+                      'max_depth': global_depth, 'bucket_count': 1, 'hash_function': hash_function}
             with open(self.index_file, 'wb') as f:
-                # 0 = global_depth, 1 = data_last, 2 = bucket_last, 3 = node_last
-                f.write(struct.pack('i', global_depth))
+                f.write(self.Header.to_bytes(header))
                 f.write(struct.pack('i', 0))
-                f.write(struct.pack('i', 2))
-                f.write(struct.pack('i', 3))
-                # root
-                f.write(self.NT.to_bytes({'bucket_position': -1, 'left': 1, 'right': 2, 'depth': 0}))
-                # left (0)
-                f.write(self.NT.to_bytes({'bucket_position': 0, 'left': -1, 'right': -1, 'depth': 0}))
-                # right (1)
-                f.write(self.NT.to_bytes({'bucket_position': 1, 'left': -1, 'right': -1, 'depth': 0}))
-
-        if force or (not os.path.exists(self.buckets_file)) or (os.path.getsize(self.buckets_file) < self.Header.size):
             with open(self.buckets_file, 'wb') as f:
-                # [0,0,0...0,0,0] + [localdepth, fullness, overflowPosition]
-                f.write(struct.pack(self.BT.FORMAT, *([-1] * self.max_records + [1,0,-1])))
-                f.write(struct.pack(self.BT.FORMAT, *([-1] * self.max_records + [1,0,-1])))
+                # [-1,-1...-1] + [localdepth, fullness, overflowPosition]
+                f.write(self.BT.to_bytes(self._empty_bucket(0)))
+            return
+
+        data = buffer_pool.read(self.index_file, 0, self.Header.size)
+        magic = struct.unpack('I', data[:4])[0]
+        if magic == MAGIC:
+            return
+        if magic == MAGIC_V2:
+            self._add_fingerprints(self.Header.from_bytes(data)['hash_function'])
+            self._write_header(self.Header.from_bytes(data))
+            return
+        self._add_fingerprints(HASH_FUNCTIONS['sha256'][0])
+        if magic == MAGIC_V1:
+            self._upgrade_header()
+        else:
+            self._migrate_trie()
 
-    def _insert_value_in_bucket(self, buckets_file, index_file, bucket_position, data_position):
+    def _new_file_id(self) -> int:
+        return int.from_bytes(os.urandom(4), 'little')
+
+    def _empty_bucket(self, local_depth: int) -> dict:
+        return {'records': [-1] * self.max_records,
+                'fingerprints': [0] * self.max_records,
+                'local_depth': local_depth,
+                'fullness': 0,
+                'overflow_position': -1}
+
+    def _read_header(self) -> dict:
         """
-        Inserta la posición del dato en el bucket. Si el bucket está lleno y en profundidad máxima,
-        se maneja con overflow por push-front. Si no está en profundidad máxima, retorna False para disparar un split.
+        Lee el encabezado del archivo de índice.
         """
-        buckets_file.seek(bucket_position * self.BT.size)
-        bucket = self.BT.from_bytes(buckets_file.read(self.BT.size))
+        return self.Header.from_bytes(buffer_pool.read(self.index_file, 0, self.Header.size))
 
-        # Si el bucket no está lleno, simplemente insertamos
-        if bucket['fullness'] < self.max_records:
-            bucket['records'][bucket['fullness']] = data_position
-            bucket['fullness'] += 1
-            buckets_file.seek(bucket_position * self.BT.size)
-            buckets_file.write(self.BT.to_bytes(bucket))
-            return True
+    def _write_header(self, header: dict) -> None:
+        """
+        Escribe el encabezado del archivo de índice.
+        """
+        buffer_pool.write(self.index_file, 0, self.Header.to_bytes(header))
 
-        # Si el bucket está lleno pero su profundidad es menor que la global → split
-        if bucket['local_depth'] < self.global_depth:
-            return False
+    def _directory(self) -> list:
+        """
+        Retorna el directorio en memoria, recargándolo si otra instancia lo modificó
+        (cambia la versión del encabezado) o si el archivo fue reemplazado.
+        """
+        header = self._read_header()
+        if self._loaded != (header['file_id'], header['version']):
+            size = 1 << header['global_depth']
+            directory = []
+            for start in range(0, size, DIRECTORY_CHUNK):
+                count = min(DIRECTORY_CHUNK, size - start)
+                data = buffer_pool.read(self.index_file, self.Header.size + start * 4, count * 4)
+                directory.extend(struct.unpack(f'{count}i', data))
+            self.directory = directory
+            self._hash_function = hash_function_by_id(header['hash_function'])
+            self._loaded = (header['file_id'], header['version'])
+        return self.directory
 
-        # Si está lleno y en profundidad máxima → manejar con push-front de overflow
-        new_bucket_pos = self.Header.read(index_file, 2)
-        self.Header.write(index_file, new_bucket_pos + 1, 2)
-
-        # new_bucket = {
-        #     'records': bucket['records'][:],  # Copiamos los registros del bucket original
-        #     'fullness': self.max_records,
-        #     'local_depth': self.global_depth,
-        #     'overflow_position': bucket['overflow_position']  # encadena al antiguo primer overflow
-        # }
-        # bucket['records'] = [-1] * self.max_records  # Limpiamos los registros del bucket original
-        # bucket['records'][0] = data_position
-        # bucket['fullness'] = 0
-        # # El bucket base apunta ahora al nuevo overflow (nuevo "head" de la cadena)
-        # bucket['overflow_position'] = new_bucket_pos
+    def _write_directory(self, chunks) -> None:
+        """
+        Escribe en el archivo de índice las páginas del directorio indicadas.
+        """
+        size = len(self.directory)
+        for chunk in sorted(chunks):
+            start = chunk * DIRECTORY_CHUNK
+            count = min(DIRECTORY_CHUNK, size - start)
+            buffer_pool.write(self.index_file, self.Header.size + start * 4,
+                              struct.pack(f'{count}i', *self.directory[start:start + count]))
+
+    def _hash(self, key) -> int:
+        """
+        Hash de una clave con la función guardada en el encabezado del índice.
+        """
+        self._directory()
+        return self._hash_function(key_bytes(key))
+
+    def _bucket_for(self, hashed: int) -> int:
+        """
+        Posición del bucket que corresponde a un hash: un acceso al directorio en memoria.
+        """
+        directory = self._directory()
+        return directory[hashed & (len(directory) - 1)]
+
+    def _read_bucket(self, bucket_position: int) -> dict:
+        """
+        Lee un bucket del archivo de buckets.
+        """
+        data = buffer_pool.read(self.buckets_file, bucket_position * self.BT.size, self.BT.size)
+        return self.BT.from_bytes(data)
+
+    def _write_bucket(self, bucket_position: int, bucket: dict) -> None:
+        """
+        Escribe un bucket en el archivo de buckets.
+        """
+        buffer_pool.write(self.buckets_file, bucket_position * self.BT.size, self.BT.to_bytes(bucket))
+
+    def _chain(self, bucket_position: int):
+        """
+        Recorre un bucket y su cadena de overflow, retornando (posición, bucket).
+        """
+        while bucket_position != -1:
+            bucket = self._read_bucket(bucket_position)
+            yield bucket_position, bucket
+            bucket_position = bucket['overflow_position']
+
+    def _normalize_key(self, key):
+        if self.RT.dict_format[self.RT.key] == 'i':
+            key = int(key)
+        elif self.RT.dict_format[self.RT.key] == 'f':
+            key = float(key)
+        elif self.RT.dict_format[self.RT.key] == 'd':
+            key = float(key)
+        return key
+
+    def _migrate_trie(self):
+        """
+        Convierte un archivo de índice del formato anterior (árbol binario de nodos, donde el
+        nivel k decide con el bit k del hash SHA256) al directorio en arreglo. Los buckets no
+        cambian, solo se corrige su profundidad local, y el índice sigue usando SHA256.
+        """
+        buffer_pool.flush(self.index_file)
+        buffer_pool.discard(self.index_file)
+        NT = TreeNodeType()
+        with open(self.index_file, 'rb') as f:
+            max_depth, _, bucket_count, _ = struct.unpack('iiii', f.read(16))
+            nodes = f.read()
+
+        leaves = []  # (bits del camino, profundidad, bucket)
+        stack = [(0, 0, 0)]
+        while stack:
+            node_index, path, depth = stack.pop()
+            node = NT.from_bytes(nodes[node_index * NT.size:(node_index + 1) * NT.size])
+            if node['bucket_position'] != -1:
+                leaves.append((path, depth, node['bucket_position']))
+            else:
+                stack.append((node['left'], path, depth + 1))
+                stack.append((node['right'], path | (1 << depth), depth + 1))
+
+        global_depth = max(depth for _, depth, _ in leaves)
+        directory = [-1] * (1 << global_depth)
+        for path, depth, bucket_position in leaves:
+            for i in range(path, len(directory), 1 << depth):
+                directory[i] = bucket_position
+            bucket = self._read_bucket(bucket_position)
+            bucket['local_depth'] = depth
+            self._write_bucket(bucket_position, bucket)
+
+        header = {'file_id': self._new_file_id(), 'version': 0, 'global_depth': global_depth,
+                  'max_depth': max_depth, 'bucket_count': bucket_count,
+                  'hash_function': HASH_FUNCTIONS['sha256'][0]}
+        with open(self.index_file, 'wb') as f:
+            f.write(self.Header.to_bytes(header))
+            f.write(struct.pack(f'{len(directory)}i', *directory))
+
+    def _upgrade_header(self):
+        """
+        Agrega la función de hash al encabezado de un índice con directorio en arreglo que
+        no la tenía (esos índices se armaron con SHA256).
+        """
+        buffer_pool.flush(self.index_file)
+        buffer_pool.discard(self.index_file)
+        with open(self.index_file, 'rb') as f:
+            _, file_id, version, global_depth, max_depth, bucket_count = struct.unpack('IIIiii', f.read(24))
+            directory = f.read()
+        header = {'file_id': file_id, 'version': version, 'global_depth': global_depth,
+                  'max_depth': max_depth, 'bucket_count': bucket_count,
+                  'hash_function': HASH_FUNCTIONS['sha256'][0]}
+        with open(self.index_file, 'wb') as f:
+            f.write(self.Header.to_bytes(header))
+            f.write(directory)
+
+    def _add_fingerprints(self, hash_function: int):
+        """
+        Convierte el archivo de buckets del formato sin fingerprints: calcula el fingerprint
+        de cada posición leyendo su registro (las de registros eliminados se descartan).
+        """
+        buffer_pool.flush(self.buckets_file)
+        buffer_pool.discard(self.buckets_file)
+        old = struct.Struct('i' * self.max_records + 'iii')
+        function = hash_function_by_id(hash_function)
+        with open(self.buckets_file, 'rb') as f:
+            data = f.read()
+        with open(self.buckets_file, 'wb') as f:
+            for offset in range(0, len(data) - old.size + 1, old.size):
+                unpacked = old.unpack_from(data, offset)
+                bucket = self._empty_bucket(unpacked[-3])
+                bucket['overflow_position'] = unpacked[-1]
+                for data_position in unpacked[:unpacked[-2]]:
+                    record = self.HEAP.read(data_position)
+                    if record != None:
+                        bucket['records'][bucket['fullness']] = data_position
+                        bucket['fingerprints'][bucket['fullness']] = \
+                            function(key_bytes(self.RT.get_key(record))) & MASK32
+                        bucket['fullness'] += 1
+                f.write(self.BT.to_bytes(bucket))
+
+    def _entries(self, bucket: dict):
+        """
+        Pares (posición, fingerprint) ocupados de un bucket.
+        """
+        return zip(bucket['records'][:bucket['fullness']], bucket['fingerprints'][:bucket['fullness']])
+
+    def _entry_hashes(self, bucket_position: int) -> list:
+        """
+        Retorna (posición, hash) de las entradas de un bucket y su cadena de overflow.
+        Mientras la profundidad máxima quepa en el fingerprint, este basta para repartir
+        las entradas y no se lee ningún registro.
+        """
+        entries = []
+        for _, bucket in self._chain(bucket_position):
+            for data_position, fingerprint in self._entries(bucket):
+                if self.max_depth <= FINGERPRINT_BITS:
+                    entries.append((data_position, fingerprint))
+                    continue
+                record = self.HEAP.read(data_position)
+                if record != None:
+                    entries.append((data_position, self._hash(self.RT.get_key(record))))
+        return entries
+
+    def _push_overflow(self, bucket_position: int, bucket: dict, data_position: int, hashed: int) -> None:
+        """
+        Inserta en un bucket lleno que no se puede dividir, con overflow por push-front:
+        el nuevo bucket recibe los registros antiguos y el bucket base queda con el nuevo.
+        """
+        header = self._read_header()
+        new_bucket_pos = header['bucket_count']
+        header['bucket_count'] += 1
+        self._write_header(header)
 
         # Nuevo bucket: recibe los registros existentes del bucket original
         new_bucket = {
             'records': bucket['records'][:],  # Copia los registros antiguos
+            'fingerprints': bucket['fingerprints'][:],
             'fullness': self.max_records,     # Está lleno (todos los registros antiguos)
-            'local_depth': self.global_depth,
+            'local_depth': bucket['local_depth'],
             'overflow_position': bucket['overflow_position']  # Mantiene la cadena existente
         }
 
         # Bucket original: conserva el nuevo registro + apunta al overflow
         bucket['records'] = [data_position] + [-1] * (self.max_records - 1)
+        bucket['fingerprints'] = [hashed & MASK32] + [0] * (self.max_records - 1)
         bucket['fullness'] = 1 #actualizar fullness
         bucket['overflow_position'] = new_bucket_pos
 
         # Escribimos ambos buckets
-        buckets_file.seek(bucket_position * self.BT.size)
-        buckets_file.write(self.BT.to_bytes(bucket))
-
-        buckets_file.seek(new_bucket_pos * self.BT.size)
-        buckets_file.write(self.BT.to_bytes(new_bucket))
-
-        return True
+        self._write_bucket(bucket_position, bucket)
+        self._write_bucket(new_bucket_pos, new_bucket)
+
+    def _split(self, bucket_position: int, local_depth: int, hashed: int) -> list:
+        """
+        Divide un bucket (con su cadena de overflow) según el bit `local_depth` del hash,
+        duplicando el directorio si la profundidad local alcanza la global. `hashed` es
+        cualquier hash que cae en el bucket.
+        Retorna (posición, hash) de los registros vivos que hay que reinsertar.
+        """
+        entries = self._entry_hashes(bucket_position)
+        header = self._read_header()
+        directory = self._directory()
+        changed = set()
+        if local_depth == header['global_depth']:
+            old_size = len(directory)
+            directory.extend(directory)
+            header['global_depth'] += 1
+            changed.update(range(old_size // DIRECTORY_CHUNK, (2 * old_size - 1) // DIRECTORY_CHUNK + 1))
+
+        new_bucket_pos = header['bucket_count']
+        header['bucket_count'] += 1
+        for i in range(hashed & ((1 << local_depth) - 1), len(directory), 1 << local_depth):
+            if (i >> local_depth) & 1:
+                directory[i] = new_bucket_pos
+                changed.add(i // DIRECTORY_CHUNK)
+
+        # las posiciones de la cadena de overflow quedan sin uso
+        self._write_bucket(bucket_position, self._empty_bucket(local_depth + 1))
+        self._write_bucket(new_bucket_pos, self._empty_bucket(local_depth + 1))
+
+        header['version'] += 1
+        self._write_directory(changed)
+        self._write_header(header)
+        self._loaded = (header['file_id'], header['version'])
+        return entries
+
+    def _add_to_hash(self, data_position, hashed):
+        while True:
+            bucket_position = self._bucket_for(hashed)
+            bucket = self._read_bucket(bucket_position)
 
+            # Si el bucket no está lleno, simplemente insertamos
+            if bucket['fullness'] < self.max_records:
+                bucket['records'][bucket['fullness']] = data_position
+                bucket['fingerprints'][bucket['fullness']] = hashed & MASK32
+                bucket['fullness'] += 1
+                self._write_bucket(bucket_position, bucket)
+                return
 
+            # Si está en profundidad máxima o dividirlo no separaría nada (claves repetidas) → overflow
+            if bucket['local_depth'] >= self.max_depth or not self._can_split(bucket_position, hashed):
+                self._push_overflow(bucket_position, bucket, data_position, hashed)
+                return
 
-    def _add_to_hash(self, buckets_file, index_file, data_position, index_hash):
-        node_index = 0
-        k = 1
-        while True:
-            index_file.seek(self.Header.size + node_index * self.NT.size)
-            node = self.NT.from_bytes(index_file.read(self.NT.size))
-            bucket_position = node['bucket_position']
-            if bucket_position == -1:
-                if index_hash[-k] == '0':
-                    node_index = node['left']
-                else:
-                    node_index = node['right']
-                k += 1
-            else:
-                break
-
-        inserted = self._insert_value_in_bucket(buckets_file, index_file, bucket_position, data_position)
-        if not inserted:
-            #print("Splitting")
-            buckets_file.seek(bucket_position * self.BT.size)
-            old_bucket = self.BT.from_bytes(buckets_file.read(self.BT.size))
-            # separar bucket buckets
-            bucket_left_pos = bucket_position
-            bucket_right_pos = self.Header.read(index_file, 2)
-            self.Header.write(index_file, bucket_right_pos + 1, 2)
-            empty_bucket = {'records': [-1] * self.max_records,
-                           'local_depth': old_bucket['local_depth'] + 1,
-                           'fullness': 0,
-                           'overflow_position': -1}
-            buckets_file.seek(bucket_left_pos * self.BT.size)
-            buckets_file.write(self.BT.to_bytes(empty_bucket))
-            buckets_file.seek(bucket_right_pos * self.BT.size)
-            buckets_file.write(self.BT.to_bytes(empty_bucket))
-
-            # separar index
-            pos = self.Header.read(index_file, 3)
-            ## nuevos nodos
-            new_parent = self.NT.to_bytes({'bucket_position': -1,
-                                'left': pos, 'right': (pos + 1), 'depth': node['depth'] + 1})
-            new_node_left = self.NT.to_bytes({'bucket_position': bucket_left_pos,
-                                'left': -1, 'right': -1, 'depth': node['depth']+1})
-            new_node_right = self.NT.to_bytes({'bucket_position': bucket_right_pos,
-                                'left': -1, 'right': -1, 'depth': node['depth']+1})
-
-
-            index_file.seek(self.Header.size + pos * self.NT.size)
-            index_file.write(new_node_left)
-            index_file.seek(self.Header.size + (pos + 1) * self.NT.size)
-            index_file.write(new_node_right)
-            index_file.seek(self.Header.size + node_index * self.NT.size)
-            index_file.write(new_parent)
-
-            self.Header.write(index_file, pos + 2, 3)
-
-            # reinsertar elementos
-            for i in range(old_bucket['fullness']):
-                record = self.HEAP.read(old_bucket['records'][i])
-                if record != None:
-                    self._aux_insert(buckets_file, index_file, record, old_bucket['records'][i])
+            for position, entry_hash in self._split(bucket_position, bucket['local_depth'], hashed):
+                self._add_to_hash(position, entry_hash)
 
-            # reinserta el nuevo registro
-            record = self.HEAP.read(data_position)
-            if record != None:
-                self._aux_insert(buckets_file, index_file, record, data_position)
+    def _can_split(self, bucket_position: int, hashed: int) -> bool:
+        """
+        Indica si dividir el bucket sirve: algún hash difiere del nuevo dentro de los bits
+        permitidos por la profundidad máxima (o se libera algún registro eliminado).
+        """
+        mask = (1 << self.max_depth) - 1
+        entries = self._entry_hashes(bucket_position)
+        if len(entries) < sum(bucket['fullness'] for _, bucket in self._chain(bucket_position)):
+            return True
+        return not entries or any((entry_hash ^ hashed) & mask for _, entry_hash in entries)
 
-    def _find_in_bucket(self, bucket, key, matches):
+    def _find_in_bucket(self, bucket, key, fingerprint, matches):
         """
-        Busca un registro en un bucket.
+        Busca un registro en un bucket. Solo se leen del heap las entradas cuyo
+        fingerprint coincide (para confirmar la clave).
         """
-        for i in range(bucket['fullness']):
-            record = self.HEAP.read(bucket['records'][i])
+        for position, entry_fingerprint in self._entries(bucket):
+            if entry_fingerprint != fingerprint:
+                continue
+            record = self.HEAP.read(position)
             if record != None:
                 if self.RT.get_key(record) == key:
-                    matches.append(bucket['records'][i])
+                    matches.append(position)
         return matches
 
-    # Funciones recursivas
-    def _aux_insert(self, buckets_file, index_file, record, data_position):
-        """
-        Funcion para reinsertar recursivamente los registros que se dividieron
-        """
-        index_hash = get_bits(self.RT.get_key(record), self.global_depth)
-        self._add_to_hash(buckets_file, index_file, data_position, index_hash)
-
-    def _aux_search(self, buckets_file, index_file, node_index, index_hash, key):
+    def _matches(self, position, entry_fingerprint, key, fingerprint, data_position):
         """
-        Funcion recursiva de busqueda
+        Indica si la entrada del bucket es la que se quiere eliminar: la posición exacta
+        si se conoce, o el primer registro vivo con la clave.
         """
-        index_file.seek(self.Header.size + node_index * self.NT.size)
-        node = self.NT.from_bytes(index_file.read(self.NT.size))
-        if node['bucket_position'] == -1:
-            if index_hash[-1] == '0':
-                return self._aux_search(buckets_file, index_file, node['left'], index_hash[:-1], key)
-            else:
-                return self._aux_search(buckets_file, index_file, node['right'], index_hash[:-1], key)
-        else:
-            matches = []
-            buckets_file.seek(node['bucket_position'] * self.BT.size)
-            bucket = self.BT.from_bytes(buckets_file.read(self.BT.size))
-            self._find_in_bucket(bucket, key, matches)
-
-            overflow_position = bucket['overflow_position']
-            while overflow_position != -1:
-                buckets_file.seek(overflow_position * self.BT.size)
-                bucket = self.BT.from_bytes(buckets_file.read(self.BT.size))
-                self._find_in_bucket(bucket, key, matches)
-                overflow_position = bucket['overflow_position']
-            return matches
-
-    def _aux_delete(self, buckets_file, index_file, node_index, index_hash, key):
-        """
-        Funcion recursiva de busqueda
-        """
-        index_file.seek(self.Header.size + node_index * self.NT.size)
-        node = self.NT.from_bytes(index_file.read(self.NT.size))
-        if node['bucket_position'] == -1:
-            if index_hash[-1] == '0':
-                return self._aux_delete(buckets_file, index_file, node['left'], index_hash[:-1], key)
-            else:
-                return self._aux_delete(buckets_file, index_file, node['right'], index_hash[:-1], key)
-        else:
-            buckets_file.seek(node['bucket_position'] * self.BT.size)
-            bucket = self.BT.from_bytes(buckets_file.read(self.BT.size))
-            for i in range(bucket['fullness']):
-                record = self.HEAP.read(bucket['records'][i])
-                if record != None:
-                    if self.RT.get_key(record) == key:
-                        # Eliminar el registro
-                        bucket['records'][i] = bucket['records'][bucket['fullness'] - 1]
-                        bucket['records'][bucket['fullness'] - 1] = -1
-                        bucket['fullness'] -= 1
-                        buckets_file.seek(node['bucket_position'] * self.BT.size)
-                        buckets_file.write(self.BT.to_bytes(bucket))
-                        return True
-            overflow_position = bucket['overflow_position']
-            while overflow_position != -1:
-                buckets_file.seek(overflow_position * self.BT.size)
-                bucket = self.BT.from_bytes(buckets_file.read(self.BT.size))
-                for i in range(bucket['fullness']):
-                    record = self.HEAP.read(bucket['records'][i])
-                    if record != None:
-                        if self.RT.get_key(record) == key:
-                            # Eliminar el registro
-                            # bucket['records'][i] = -1
-                            # bucket['fullness'] -= 1
-                            # buckets_file.seek(node['bucket_position'] * self.BT.size)
-                            # buckets_file.write(self.BT.to_bytes(bucket))
-
-                            last_index = bucket['fullness'] - 1
-                            bucket['records'][i] = bucket['records'][last_index]
-                            bucket['records'][last_index] = -1
-                            bucket['fullness'] = last_index  # Decrement fullness
-                            
-                            buckets_file.seek(overflow_position * self.BT.size)
-                            buckets_file.write(self.BT.to_bytes(bucket))
-                            return True
-                overflow_position = bucket['overflow_position'] 
-        return False
-
-    def _aux_range_search(self, buckets_file, index_file, node_index, lower, upper):
-        lista = []
-        index_file.seek(self.Header.size + node_index * self.NT.size)
-        node = self.NT.from_bytes(index_file.read(self.NT.size))
-        if node['bucket_position'] == -1:
-            lista.extend(self._aux_range_search(buckets_file, index_file, node['left'], lower, upper))
-            lista.extend(self._aux_range_search(buckets_file, index_file, node['right'], lower, upper))
-        else:
-            buckets_file.seek(node['bucket_position'] * self.BT.size)
-            bucket = self.BT.from_bytes(buckets_file.read(self.BT.size))
-            for i in range(bucket['fullness']):
-                record = self.HEAP.read(bucket['records'][i])
-                if record != None:
-                    if lower <= self.RT.get_key(record) <= upper:
-                        lista.append(bucket['records'][i])
-            overflow_position = bucket['overflow_position']
-            while overflow_position != -1:
-                buckets_file.seek(overflow_position * self.BT.size)
-                bucket = self.BT.from_bytes(buckets_file.read(self.BT.size))
-                for i in range(bucket['fullness']):
-                    record = self.HEAP.read(bucket['records'][i])
-                    if record != None:
-                        if lower <= self.RT.get_key(record) <= upper:
-                            lista.append(bucket['records'][i])
-                overflow_position = bucket['overflow_position']
-
-        return lista
-
+        if data_position is not None:
+            return position == data_position
+        if entry_fingerprint != fingerprint:
+            return False
+        record = self.HEAP.read(position)
+        return record != None and self.RT.get_key(record) == key
+
+    def remap_positions(self, remap, buckets_file_name, index_file_name):
+        """
+        Copia el hash a otros archivos cambiando cada posición p por remap[p]
+        (las que tienen remap -1 se quitan de su bucket). El directorio no cambia,
+        así que no hace falta leer ningún registro.
+        :param remap: nueva posición de cada posición antigua (-1 si se eliminó)
+        :param buckets_file_name: archivo de buckets de la copia
+        :param index_file_name: archivo de índice de la copia
+        """
+        buffer_pool.flush(self.index_file)
+        buffer_pool.flush(self.buckets_file)
+        for source, target in ((self.index_file, index_file_name), (self.buckets_file, buckets_file_name)):
+            buffer_pool.discard(target)
+            shutil.copyfile(source, target)
+
+        with open(buckets_file_name, 'r+b') as f:
+            data = bytearray(f.read())
+            for offset in range(0, len(data) - self.BT.size + 1, self.BT.size):
+                bucket = self.BT.from_bytes(data[offset:offset + self.BT.size])
+                entries = [(remap[p], fingerprint) for p, fingerprint in self._entries(bucket)
+                           if 0 <= p < len(remap) and remap[p] != -1]
+                records = [p for p, _ in entries]
+                bucket['records'] = records + [-1] * (self.max_records - len(records))
+                bucket['fingerprints'] = [fingerprint for _, fingerprint in entries] + \
+                    [0] * (self.max_records - len(records))
+                bucket['fullness'] = len(records)
+                data[offset:offset + self.BT.size] = self.BT.to_bytes(bucket)
+            f.seek(0)
+            f.write(data)
+
+    def bulk_build(self, positions=None, max_entries_in_memory: int = 100000):
+        """
+        Construye el hash a partir de los registros del heap (todos los no eliminados,
+        o solo `positions`) sin insertar uno por uno.
+
+        Los pares (hash, posición) se reparten por los bits bajos del hash, en memoria o, si
+        son más de `max_entries_in_memory`, en archivos temporales junto al índice (uno por
+        prefijo). Cada grupo se divide por el siguiente bit mientras no quepa en un bucket,
+        igual que harían los splits, y los buckets se escriben en orden en el archivo;
+        al final se escribe el directorio completo.
+        Si el hash ya tiene datos, los registros se insertan uno por uno.
+        """
+        pairs = self.HEAP.iter_keys(positions)
+        bucket = self._read_bucket(0)
+        header = self._read_header()
+        if header['bucket_count'] > 1 or bucket['fullness'] > 0 or bucket['overflow_position'] != -1:
+            for key, data_position in pairs:
+                self._add_to_hash(data_position, self._hash(key))
+            return
+
+        self._directory()
+        total = self.HEAP._read_header() if positions is None else len(positions)
+        prefix_bits = min(self.max_depth, ((total - 1) // max_entries_in_memory).bit_length()) if total > 0 else 0
+        buckets = []  # (prefijo, profundidad local, posición del bucket)
+        bucket_count = 0
+        with scratch_space.session(self.index_file) as scratch:
+            parts = self._partition_by_prefix(pairs, prefix_bits, max_entries_in_memory, scratch)
+            buffer_pool.discard(self.buckets_file)
+            buffer_pool.discard(self.index_file)
+            with open(self.buckets_file, 'wb') as f:
+                for prefix, part in enumerate(parts):
+                    if isinstance(part, str):
+                        name, part = part, self._read_part(part)
+                        scratch.remove(name)
+                    groups = []
+                    self._split_group(part, prefix, prefix_bits, groups)
+                    for group_prefix, local_depth, entries in groups:
+                        buckets.append((group_prefix, local_depth, bucket_count))
+                        chunks = [entries[i:i + self.max_records]
+                                  for i in range(0, len(entries), self.max_records)] or [[]]
+                        for i, chunk in enumerate(chunks):
+                            bucket = self._empty_bucket(local_depth)
+                            bucket['records'][:len(chunk)] = [pos for _, pos in chunk]
+                            bucket['fingerprints'][:len(chunk)] = [hashed & MASK32 for hashed, _ in chunk]
+                            bucket['fullness'] = len(chunk)
+                            if i + 1 < len(chunks):
+                                bucket['overflow_position'] = bucket_count + 1
+                            f.write(self.BT.to_bytes(bucket))
+                            bucket_count += 1
+
+        global_depth = max(local_depth for _, local_depth, _ in buckets)
+        directory = [-1] * (1 << global_depth)
+        for prefix, local_depth, bucket_position in buckets:
+            for i in range(prefix, len(directory), 1 << local_depth):
+                directory[i] = bucket_position
+
+        header.update({'file_id': self._new_file_id(), 'version': 0, 'global_depth': global_depth,
+                       'bucket_count': bucket_count})
+        with open(self.index_file, 'wb') as f:
+            f.write(self.Header.to_bytes(header))
+            f.write(struct.pack(f'{len(directory)}i', *directory))
+
+    def _partition_by_prefix(self, pairs, prefix_bits, max_entries_in_memory, scratch) -> list:
+        """
+        Reparte los pares (hash, posición) según los `prefix_bits` bits bajos del hash.
+        Con 0 bits retorna una sola lista en memoria; si no, un archivo temporal de la
+        sesión `scratch` por prefijo.
+        """
+        if prefix_bits == 0:
+            return [[(self._hash_function(key_bytes(key)), pos) for key, pos in pairs]]
+
+        mask = (1 << prefix_bits) - 1
+        parts = [scratch.path(f"part{i}") for i in range(1 << prefix_bits)]
+        blocks = [[] for _ in parts]
+        buffered = 0
+
+        def spill():
+            for part, block in zip(parts, blocks):
+                with open(part, 'ab') as f:
+                    f.write(b''.join(PART_STRUCT.pack(hashed, pos) for hashed, pos in block))
+                block.clear()
+
+        for key, pos in pairs:
+            hashed = self._hash_function(key_bytes(key)) & MASK64
+            blocks[hashed & mask].append((hashed, pos))
+            buffered += 1
+            if buffered >= max_entries_in_memory:
+                spill()
+                buffered = 0
+        spill()
+        return parts
+
+    def _read_part(self, part: str) -> list:
+        with open(part, 'rb') as f:
+            return list(PART_STRUCT.iter_unpack(f.read()))
+
+    def _split_group(self, entries, prefix, depth, groups):
+        """
+        Divide un grupo de entradas con los mismos `depth` bits bajos por el bit siguiente
+        mientras no quepan en un bucket. Se detiene en la profundidad máxima o si todas las
+        entradas tienen el mismo hash (esas quedan en un bucket con overflow).
+        """
+        limit = min(self.max_depth, 64)
+        mask = (1 << limit) - 1
+        if len(entries) <= self.max_records or depth >= limit \
+                or not any((hashed ^ entries[0][0]) & mask for hashed, _ in entries):
+            groups.append((prefix, depth, entries))
+            return
+        bit = 1 << depth
+        self._split_group([e for e in entries if not e[0] & bit], prefix, depth + 1, groups)
+        self._split_group([e for e in entries if e[0] & bit], prefix | bit, depth + 1, groups)
 
     def insert(self, record, data_position=None):
         """
@@ -447,37 +738,25 @@ class Hash:
         :param data_position: posicion del registro en el archivo de datos.
         Si no se especifica, se agrega al final del archivo (funcionalidad como indice principal).
         """
-        with open(self.index_file, 'r+b') as index_file, \
-               open(self.buckets_file, 'r+b') as buckets_file:
-            if data_position is None:
-                data_position = self.HEAP.insert(record)
+        if data_position is None:
+            data_position = self.HEAP.insert(record)
 
-            index_hash = get_bits(self.RT.get_key(record), self.global_depth)
-            self._add_to_hash(buckets_file, index_file, data_position, index_hash)
-            return data_position
+        self._add_to_hash(data_position, self._hash(self.RT.get_key(record)))
+        return data_position
 
     def search(self, key):
         """
-        Busca un registro en el hash extensible.
+        Busca un registro en el hash extensible: un acceso al directorio en memoria
+        y la lectura del bucket (más su cadena de overflow, si la tiene).
         :param key: clave a buscar
-        :return: registro encontrado o None si no se encuentra
+        :return: posiciones de los registros encontrados
         """
-        if self.RT.dict_format[self.RT.key] == 'i':
-            key = int(key)
-        elif self.RT.dict_format[self.RT.key] == 'f':
-            key = float(key)
-        elif self.RT.dict_format[self.RT.key] == 'd':
-            key = float(key)
-
-        with open(self.index_file, 'r+b') as index_file, \
-                open(self.buckets_file, 'r+b') as buckets_file:
-            index_hash = get_bits(key, self.global_depth)
-            index_file.seek(self.Header.size)
-            root = self.NT.from_bytes(index_file.read(self.NT.size))
-            if index_hash[-1] == '0':
-                return self._aux_search(buckets_file, index_file, root['left'], index_hash[:-1], key)
-            else:
-                return self._aux_search(buckets_file, index_file, root['right'], index_hash[:-1], key)
+        key = self._normalize_key(key)
+        hashed = self._hash(key)
+        matches = []
+        for _, bucket in self._chain(self._bucket_for(hashed)):
+            self._find_in_bucket(bucket, key, hashed & MASK32, matches)
+        return matches
 
     def range_search(self, lower, upper):
         """
@@ -486,34 +765,35 @@ class Hash:
         :param upper: limite superior
         :return: lista de registros encontrados
         """
-        with open(self.index_file, 'r+b') as index_file, \
-                open(self.buckets_file, 'r+b') as buckets_file:
-            index_file.seek(self.Header.size)
-            root = self.NT.from_bytes(index_file.read(self.NT.size))
-            if root['bucket_position'] == -1:
-                lista = self._aux_range_search(buckets_file, index_file, root['left'], lower, upper)
-                lista.extend(self._aux_range_search(buckets_file, index_file, root['right'], lower, upper))
-
+        lista = []
+        for bucket_position in dict.fromkeys(self._directory()):
+            for _, bucket in self._chain(bucket_position):
+                for i in range(bucket['fullness']):
+                    record = self.HEAP.read(bucket['records'][i])
+                    if record != None:
+                        if lower <= self.RT.get_key(record) <= upper:
+                            lista.append(bucket['records'][i])
         return lista
 
-    def delete(self, key):
+    def delete(self, key, data_position=None):
         """
         Elimina un registro del hash extensible.
         :param key: clave a eliminar
+        :param data_position: posicion del registro en el archivo de datos. Si se especifica,
+        se elimina esa entrada aunque el registro ya este marcado como eliminado en el heap.
         """
-        if self.RT.dict_format[self.RT.key] == 'i':
-            key = int(key)
-        elif self.RT.dict_format[self.RT.key] == 'f':
-            key = float(key)
-        elif self.RT.dict_format[self.RT.key] == 'd':
-            key = float(key)
-
-        with open(self.index_file, 'r+b') as index_file, \
-                open(self.buckets_file, 'r+b') as buckets_file:
-            index_hash = get_bits(key, self.global_depth)
-            index_file.seek(self.Header.size)
-            root = self.NT.from_bytes(index_file.read(self.NT.size))
-            if index_hash[-1] == '0':
-                return self._aux_delete(buckets_file, index_file, root['left'], index_hash[:-1], key)
-            else:
-                return self._aux_delete(buckets_file, index_file, root['right'], index_hash[:-1], key)
+        key = self._normalize_key(key)
+        hashed = self._hash(key)
+        for bucket_position, bucket in self._chain(self._bucket_for(hashed)):
+            for i in range(bucket['fullness']):
+                if self._matches(bucket['records'][i], bucket['fingerprints'][i], key, hashed & MASK32, data_position):
+                    # Eliminar el registro
+                    last_index = bucket['fullness'] - 1
+                    bucket['records'][i] = bucket['records'][last_index]
+                    bucket['fingerprints'][i] = bucket['fingerprints'][last_index]
+                    bucket['records'][last_index] = -1
+                    bucket['fingerprints'][last_index] = 0
+                    bucket['fullness'] = last_index
+                    self._write_bucket(bucket_position, bucket)
+                    return True
+        return False
@@ -1,6 +1,9 @@
 import unittest
 import os
-from Hash import Hash  # Reemplazar con el nombre real del archivo
+import struct
+from Hash import Hash, HASH_FUNCTIONS, get_bits, hash_key  # Reemplazar con el nombre real del archivo
+from Heap_struct.Heap import Heap
+from Utils.buffer_pool import buffer_pool
 
 
 class TestHash(unittest.TestCase):
@@ -59,6 +62,139 @@ class TestHash(unittest.TestCase):
         registros = [self.hash.HEAP.read(p) for p in range_pos]
         self.assertTrue(all(r[1] != 20 for r in registros))
 
+    def test_remap_positions(self):
+        self.hash.HEAP.mark_deleted(1)
+        remap = self.hash.HEAP.compact("hash_test_data_remap.bin")
+        self.hash.remap_positions(remap, "hash_test_buckets_remap.bin", "hash_test_index_remap.bin")
+        remapped = Hash(self.format, self.key, "hash_test_buckets_remap.bin", "hash_test_index_remap.bin",
+                        "hash_test_data_remap.bin", global_depth=4)
+        try:
+            self.assertEqual(remap, [0, -1, 1, 2, 3, 4])
+            self.assertEqual(sorted(remapped.search(18)), [0, 1, 2])
+            self.assertEqual(remapped.search(19), [4])
+            self.assertEqual(remapped.search(20), [3])
+        finally:
+            for f in ["hash_test_data_remap.bin", "hash_test_buckets_remap.bin", "hash_test_index_remap.bin"]:
+                buffer_pool.discard(f)
+                Heap.discard(f)
+                if os.path.exists(f):
+                    os.remove(f)
+
+    def test_directory_doubles_and_lookup_reads_one_bucket(self):
+        files = ["hash_test_data_dir.bin", "hash_test_buckets_dir.bin", "hash_test_index_dir.bin"]
+        try:
+            index = Hash(self.format, self.key, files[1], files[2], files[0],
+                         max_records_per_bucket=2, force_create=True)
+            for edad in range(300):
+                index.insert([f"p{edad}", edad, 1.0])
+            for _ in range(10):  # claves repetidas: overflow en vez de duplicar el directorio
+                index.insert(["Rep", 7, 1.0])
+
+            depth = index._read_header()['global_depth']
+            self.assertEqual(len(index._directory()), 2 ** depth)
+            self.assertLess(depth, 16)
+
+            reads = []
+            read_bucket = index._read_bucket
+            index._read_bucket = lambda position: reads.append(position) or read_bucket(position)
+            self.assertEqual(index.search(150), [150])
+            self.assertEqual(len(reads), 1)
+            self.assertEqual(len(index.search(7)), 11)
+
+            reopened = Hash(self.format, self.key, files[1], files[2], files[0], max_records_per_bucket=2)
+            self.assertEqual(sorted(reopened.range_search(0, 299)), list(range(310)))
+        finally:
+            for f in files:
+                buffer_pool.discard(f)
+                Heap.discard(f)
+                if os.path.exists(f):
+                    os.remove(f)
+
+    def test_migrates_tree_directory(self):
+        # índice del formato anterior: raíz con dos hojas según el último bit del hash
+        buckets = {0: [], 1: []}
+        for pos in range(6):
+            edad = self.hash.HEAP.read(pos)[1]
+            buckets[int(get_bits(edad, 1, "sha256"))].append(pos)
+        buffer_pool.discard("hash_test_index.bin")
+        buffer_pool.discard("hash_test_buckets.bin")
+        with open("hash_test_index.bin", "wb") as f:
+            f.write(struct.pack("iiii", 4, 0, 2, 3))
+            f.write(struct.pack("iiii", -1, 1, 2, 0))
+            f.write(struct.pack("iiii", 0, -1, -1, 0))
+            f.write(struct.pack("iiii", 1, -1, -1, 0))
+        with open("hash_test_buckets.bin", "wb") as f:
+            for bit in (0, 1):  # buckets sin fingerprints: posiciones, local_depth, fullness, overflow
+                f.write(struct.pack("i" * 7, *(buckets[bit] + [-1] * (4 - len(buckets[bit]))),
+                                    1, len(buckets[bit]), -1))
+
+        migrated = Hash(self.format, self.key, "hash_test_buckets.bin", "hash_test_index.bin",
+                        "hash_test_data.bin", global_depth=4)
+        self.assertEqual(len(migrated._directory()), 2)
+        self.assertEqual(sorted(migrated.search(18)), [0, 2, 3])
+        migrated.insert(["Ana", 18, 1.5])
+        self.assertEqual(sorted(migrated.search(18)), [0, 2, 3, 6])
+        self.assertEqual(migrated.search(20), [4])
+
+    def test_hash_functions_are_persistent(self):
+        # mismos valores en cualquier proceso, y la clave como texto cae en el mismo bucket
+        self.assertEqual(hash_key(17), 1024455050)
+        self.assertEqual(hash_key("17"), hash_key(17))
+        self.assertEqual(hash_key("Pepe", "fnv1a"), 745758166197131709)
+
+        for name in HASH_FUNCTIONS:
+            index = Hash(self.format, self.key, "hash_test_buckets.bin", "hash_test_index.bin",
+                         "hash_test_data.bin", max_records_per_bucket=2, force_create=True, hash_function=name)
+            for edad in range(40):
+                index.insert(["X", edad % 20, 1.0])
+            reopened = Hash(self.format, self.key, "hash_test_buckets.bin", "hash_test_index.bin",
+                            "hash_test_data.bin", max_records_per_bucket=2)
+            self.assertEqual(reopened._read_header()["hash_function"], HASH_FUNCTIONS[name][0])
+            self.assertEqual(sorted(reopened.search(7)), [7, 27])
+
+    def test_lookup_reads_only_matching_fingerprints(self):
+        reads = []
+        read = self.hash.HEAP.read
+        self.hash.HEAP.read = lambda position: reads.append(position) or read(position)
+        self.assertEqual(self.hash.search(20), [4])
+        self.assertEqual(reads, [4])
+
+        reads.clear()
+        self.assertEqual(self.hash.search(21), [])
+        self.assertEqual(reads, [])
+        self.assertTrue(self.hash.delete(19, 5))
+        self.assertEqual(self.hash.search(19), [1])
+
+    def test_bulk_build(self):
+        files = ["hash_test_data_bulk.bin", "hash_test_buckets_bulk.bin", "hash_test_index_bulk.bin"]
+        try:
+            index = Hash(self.format, self.key, files[1], files[2], files[0],
+                         max_records_per_bucket=2, force_create=True)
+            edades = [i % 150 for i in range(600)]
+            index.HEAP.insert_many([["X", edad, 1.0] for edad in edades])
+            index.HEAP.mark_deleted(7)
+            for max_entries in (100000, 50):  # en memoria y con archivos temporales
+                for f in files[1:]:
+                    buffer_pool.discard(f)
+                    os.remove(f)
+                index = Hash(self.format, self.key, files[1], files[2], files[0], max_records_per_bucket=2)
+                index.bulk_build(max_entries_in_memory=max_entries)
+                self.assertFalse(any(".part" in f for f in os.listdir(".")))
+                self.assertEqual(sorted(index.search(7)), [157, 307, 457])
+                self.assertEqual(sorted(index.search(8)), [8, 158, 308, 458])
+
+                # después se puede seguir insertando; con datos, bulk_build inserta uno por uno
+                index.insert(["Y", 7, 1.0], 7)
+                index.bulk_build([0])
+                self.assertEqual(sorted(index.search(7)), [157, 307, 457])  # 7 sigue eliminado
+                self.assertEqual(sorted(index.search(0)), [0, 0, 150, 300, 450])
+        finally:
+            for f in files:
+                buffer_pool.discard(f)
+                Heap.discard(f)
+                if os.path.exists(f):
+                    os.remove(f)
+
 
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -1,137 +1,498 @@
 import sys
 import os
+import mmap
+import atexit
+import threading
+import operator
+import heapq
+from contextlib import contextmanager
 sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
 from Utils.Registro import *
 
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional: sin él los recorridos usan struct
+    np = None
+
+# Operadores soportados por Heap.scan
+SCAN_OPS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+# Tipos struct que se pueden evaluar como columnas de numpy ('B'/'H': códigos de DictColumn)
+NUMPY_TYPES = {'i': 'i4', 'q': 'i8', 'Q': 'u8', 'f': 'f4', 'd': 'f8', '?': '?', 'B': 'u1', 'H': 'u2'}
+
+
+class _HeapFile:
+    """
+    Estado compartido por todos los Heap que abren el mismo archivo:
+    un descriptor abierto durante toda la vida del proceso y el encabezado
+    (count, deleted) en memoria, que se escribe en disco solo al hacer flush.
+    `free` es la lista de huecos (posiciones eliminadas, como min-heap); se arma
+    la primera vez que se necesita a partir de los flags de eliminado, que ya
+    están en disco, así que no hace falta guardarla aparte.
+    Todos los hilos comparten el descriptor (y su posición), así que cada seek con su
+    lectura o escritura, y cada cambio del encabezado, se hace con `lock` tomado.
+    """
+    __slots__ = ('path', 'file', 'count', 'deleted', 'dirty', 'free', 'lock')
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+        self.count = 0
+        self.deleted = 0
+        self.dirty = False
+        self.free = None
+        self.lock = threading.RLock()
+
+    def reopen(self, create: bool = False):
+        """
+        (Re)abre el archivo. Si no existe, está truncado o `create` es True, se crea vacío.
+        Se reutiliza el mismo objeto para que los Heap ya construidos sigan el archivo nuevo.
+        """
+        with self.lock:
+            self.close()
+            if create or not os.path.exists(self.path) or os.path.getsize(self.path) < Heap.HEADER_SIZE:
+                with open(self.path, 'wb') as f:
+                    f.write(struct.pack(Heap.HEADER_FORMAT, 0, 0))  # encabezado inicial: 0 registros
+            self.file = open(self.path, 'r+b')
+            self.count, self.deleted = struct.unpack(Heap.HEADER_FORMAT, self.file.read(Heap.HEADER_SIZE))
+            self.dirty = False
+            self.free = None
+
+    def is_stale(self) -> bool:
+        """
+        True si el archivo fue borrado, reemplazado o truncado por fuera del Heap.
+        """
+        if self.file is None:
+            return True
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        own = os.fstat(self.file.fileno())
+        return (st.st_dev, st.st_ino) != (own.st_dev, own.st_ino) or st.st_size < Heap.HEADER_SIZE
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        with self.lock:
+            self.file.seek(offset)
+            return self.file.read(size)
+
+    def write_at(self, offset: int, data) -> None:
+        with self.lock:
+            self.file.seek(offset)
+            self.file.write(data)
+
+    def flush(self):
+        with self.lock:
+            if self.file is None:
+                return
+            if self.dirty:
+                self.file.seek(0)
+                self.file.write(struct.pack(Heap.HEADER_FORMAT, self.count, self.deleted))
+                self.dirty = False
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+_heap_files = {}  # ruta absoluta -> _HeapFile
+
+
 class Heap:
     HEADER_FORMAT = 'ii'
     HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
 
     def __init__(self, table_format, key: str,
-                 data_file_name: str, force_create: bool = False):
+                 data_file_name: str, force_create: bool = False,
+                 reuse_slots: bool = False):
+        """
+        :param reuse_slots: si es True, `insert` ocupa primero los huecos de registros
+        eliminados (el de menor posición); si es False, siempre agrega al final.
+        Solo es seguro si ningún índice guarda posiciones de registros eliminados.
+        """
         self.filename = data_file_name
+        self.reuse_slots = reuse_slots
         self.RT = RegistroType(table_format, key)
         self.record_total_size = self.RT.size + 1  # +1 byte para el flag de eliminado
+        self._record_struct = struct.Struct(self.RT.FORMAT + '?')  # registro + flag de eliminado
+        self._key_struct = self._build_key_struct()                # solo la llave + flag de eliminado
+        self._key_dtype = self._build_key_dtype()                  # idem, como dtype de numpy (o None)
         self.key = key
+        self._file = self._open_shared(os.path.abspath(self.filename), force_create)
 
-        if not os.path.exists(self.filename):
-            with open(self.filename, 'wb') as f:
-                f.write(struct.pack(self.HEADER_FORMAT, 0, 0))  # encabezado inicial: 0 registros
-        elif os.path.getsize(self.filename) < self.HEADER_SIZE:
-            with open(self.filename, 'wb') as f:
-                f.write(struct.pack(self.HEADER_FORMAT, 0, 0))  # encabezado inicial: 0 registros
+    @classmethod
+    def _open_shared(cls, path: str, force_create: bool) -> _HeapFile:
+        """
+        Devuelve el estado compartido del archivo, creándolo (o reiniciándolo) si hace falta.
+        """
+        state = _heap_files.get(path)
+        if state is None:
+            state = _HeapFile(path)
+            _heap_files[path] = state
+        if force_create or state.is_stale():
+            state.reopen(create=force_create)
+        return state
+
+    def _build_key_struct(self) -> struct.Struct:
+        """
+        Struct que, aplicado a un registro completo (con su flag), solo extrae la llave
+        y el flag de eliminado: el resto de columnas se saltan como bytes de relleno.
+        """
+        types = list(self.RT.dict_format.values())
+        key_type = types[self.RT.key_index]
+        before = struct.calcsize('=' + ''.join(types[:self.RT.key_index]))
+        after = self.RT.size - before - struct.calcsize('=' + key_type)
+        return struct.Struct(f'={before}x{key_type}{after}x?')
+
+    def _build_key_dtype(self):
+        """
+        dtype estructurado de numpy con la llave y el flag de eliminado en sus offsets reales.
+        Es None si numpy no está instalado o la llave no es numérica.
+        """
+        key_type = self.RT.dict_format[self.RT.key]
+        if np is None or key_type not in NUMPY_TYPES:
+            return None
+        types = list(self.RT.dict_format.values())
+        before = struct.calcsize('=' + ''.join(types[:self.RT.key_index]))
+        return np.dtype({'names': ['key', 'deleted'],
+                         'formats': ['=' + NUMPY_TYPES[key_type], 'u1'],
+                         'offsets': [before, self.RT.size],
+                         'itemsize': self.record_total_size})
+
+    ### PERSISTENCIA ###
+
+    def flush(self):
+        """
+        Escribe el encabezado en disco (si cambió) y vacía el buffer del archivo.
+        """
+        self._file.flush()
+
+    def close(self):
+        self.flush()
 
-        if force_create:
-            with open(self.filename, 'wb') as f:
-                f.write(struct.pack(self.HEADER_FORMAT, 0, 0))
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @classmethod
+    def flush_all(cls):
+        """
+        Persiste los encabezados de todos los archivos heap abiertos en el proceso.
+        Cada archivo se escribe con su lock tomado, así que no interfiere con otros hilos
+        que lo estén usando; las consultas deberían preferir `flush` de su propio heap.
+        """
+        for state in list(_heap_files.values()):  # otro hilo puede abrir un heap mientras tanto
+            state.flush()  # toma el lock del archivo
+
+    @staticmethod
+    def flush_file(filename: str):
+        """
+        Persiste el encabezado de un solo archivo heap, si está abierto en el proceso.
+        """
+        state = _heap_files.get(os.path.abspath(filename))
+        if state is not None:
+            state.flush()
+
+    @staticmethod
+    def discard(filename: str):
+        """
+        Cierra el archivo sin escribir su encabezado. Se usa antes de borrarlo.
+        """
+        state = _heap_files.get(os.path.abspath(filename))
+        if state is not None:
+            state.close()
+
+    ### ENCABEZADO ###
 
     def _read_header(self):
-        with open(self.filename, 'rb') as f:
-            return struct.unpack(self.HEADER_FORMAT, f.read(self.HEADER_SIZE))[0]
+        return self._file.count
 
     def _read_deleted(self):
-        with open(self.filename, 'rb') as f:
-            return struct.unpack(self.HEADER_FORMAT, f.read(self.HEADER_SIZE))[1]
+        return self._file.deleted
 
     def _write_header(self, count, deleted):
-        with open(self.filename, 'r+b') as f:
-            f.seek(0)
-            f.write(struct.pack(self.HEADER_FORMAT, count, deleted))
+        with self._file.lock:
+            self._file.count = count
+            self._file.deleted = deleted
+            self._file.dirty = True
 
     def is_deleted(self, pos):
         if self.read(pos):
             return False
         return True
 
+    def _free_slots(self) -> list:
+        """
+        Huecos disponibles (min-heap de posiciones eliminadas), armado desde los flags.
+        """
+        state = self._file
+        with state.lock:
+            if state.free is None:
+                size = self.record_total_size
+                with self._mapped_records() as records, records[size - 1::size] as flags:
+                    state.free = [pos for pos, flag in enumerate(flags) if flag]
+                heapq.heapify(state.free)
+            return state.free
+
     def insert(self, registro):
-        with open(self.filename, 'ab') as f:
-            offset = self._read_header() * self.record_total_size + self.HEADER_SIZE
-            f.seek(offset)
-            data = self.RT.to_bytes(registro)
-            f.write(data)
-            f.write(b'\x00')
+        data = self.RT.to_bytes(registro) + b'\x00'
+        state = self._file
+        with state.lock:  # la posición se asigna y se escribe sin que otro hilo se meta en medio
+            if self.reuse_slots and state.deleted > 0:
+                free = self._free_slots()
+                if free:
+                    pos = heapq.heappop(free)
+                    state.write_at(self.HEADER_SIZE + pos * self.record_total_size, data)
+                    self._write_header(state.count, state.deleted - 1)
+                    return pos
+            count = state.count
+            state.write_at(count * self.record_total_size + self.HEADER_SIZE, data)
+            self._write_header(count + 1, state.deleted)
+            return count
 
-        count = self._read_header()
-        self._write_header(count + 1, self._read_deleted())
-        return count
+    def insert_many(self, registros: list) -> range:
+        """
+        Inserta varios registros con una sola escritura y una sola actualización del encabezado.
+        Siempre agrega al final (aun con reuse_slots). Retorna el rango de posiciones asignadas.
+        """
+        total = len(registros)
+        if total == 0:
+            return range(self._file.count, self._file.count)
+
+        buffer = bytearray(total * self.record_total_size)
+        pack_into = self._record_struct.pack_into
+        offset = 0
+        for registro in registros:
+            pack_into(buffer, offset, *self.RT.to_values(registro), False)
+            offset += self.record_total_size
+
+        state = self._file
+        with state.lock:
+            count = state.count
+            state.write_at(count * self.record_total_size + self.HEADER_SIZE, buffer)
+            self._write_header(count + total, state.deleted)
+        return range(count, count + total)
 
     def read(self, pos: int) -> list | None:
-        if pos < 0 or pos >= self._read_header():
+        if pos < 0 or pos >= self._file.count:
+            return None
+        data = self._file.read_at(self.HEADER_SIZE + (pos * self.record_total_size), self.record_total_size)
+        if data[-1:] == b'\x01':
             return None
-        with open(self.filename, 'rb') as f:
-            f.seek(self.HEADER_SIZE + (pos * self.record_total_size))
-            data = f.read(self.RT.size)
-            flag = f.read(1)
-            registro = self.RT.from_bytes(data)
-            if flag == b'\x01':
-                return None
-            return registro
+        return self.RT.from_bytes(data[:self.RT.size])
 
     def mark_deleted(self, pos):
-        with open(self.filename, 'r+b') as f:
-            f.seek(self.HEADER_SIZE + (pos * self.record_total_size) + self.RT.size)
-            f.write(b'\x01')
-        deleted_count = self._read_deleted()
-        deleted_count += 1
-        if deleted_count == 30:
-            return True
-        self._write_header(self._read_header(), deleted_count)
-        return False
+        """
+        Marca el registro como eliminado y actualiza la cantidad de eliminados del encabezado.
+        Retorna False si el registro ya estaba eliminado.
+        """
+        state = self._file
+        offset = self.HEADER_SIZE + (pos * self.record_total_size) + self.RT.size
+        with state.lock:
+            if state.read_at(offset, 1) == b'\x01':
+                return False
+            state.write_at(offset, b'\x01')
+            self._write_header(state.count, state.deleted + 1)
+            if state.free is not None:
+                heapq.heappush(state.free, pos)
+        return True
+
 
+    def compact(self, data_file_name: str) -> list:
+        """
+        Escribe en `data_file_name` un heap nuevo solo con los registros no eliminados,
+        en el mismo orden. Retorna el remap: remap[pos] es la nueva posición del registro
+        que estaba en pos, o -1 si estaba eliminado.
+        El archivo se escribe directamente, sin estado compartido, para luego reemplazar
+        al actual con os.replace.
+        """
+        size = self.record_total_size
+        remap = [-1] * self._file.count
+        live = 0
+        with open(data_file_name, 'wb') as out:
+            out.write(struct.pack(self.HEADER_FORMAT, 0, 0))
+            with self._mapped_records() as records, records[size - 1::size] as flags:
+                start = None  # inicio del tramo actual de registros vivos
+                for pos, flag in enumerate(flags):
+                    if not flag:
+                        remap[pos] = live
+                        live += 1
+                        if start is None:
+                            start = pos
+                    elif start is not None:
+                        out.write(records[start * size:pos * size])
+                        start = None
+                if start is not None:
+                    out.write(records[start * size:len(flags) * size])
+            out.seek(0)
+            out.write(struct.pack(self.HEADER_FORMAT, live, 0))
+        return remap
+
+    ### RECORRIDOS COMPLETOS ###
+
+    @contextmanager
+    def _mapped_records(self):
+        """
+        Mapea en memoria (solo lectura) la zona de registros del archivo y la entrega
+        como memoryview, sin copiarla. El memoryview no debe usarse fuera del `with`.
+        """
+        count = self._file.count
+        if count == 0:
+            yield memoryview(b'')
+            return
+        with self._file.lock:
+            f = self._file.file
+            f.flush()  # lo que está en el buffer del descriptor debe verse en el mapeo
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with mm:
+            available = (len(mm) - self.HEADER_SIZE) // self.record_total_size
+            end = self.HEADER_SIZE + min(count, available) * self.record_total_size
+            view = memoryview(mm)
+            records = view[self.HEADER_SIZE:end]
+            try:
+                yield records
+            finally:
+                records.release()
+                view.release()
 
     def _select_all(self, include_deleted=False):
         registros = []
-        count = self._read_header()
-
-        with open(self.filename, 'rb') as f:
-            f.seek(self.HEADER_SIZE)
-            for _ in range(count):
-                data = f.read(self.RT.size)
-                flag = f.read(1)
-                if not data or not flag:
-                    break
-                if flag == b'\x01' and not include_deleted:
+        with self._mapped_records() as records:
+            for values in self._record_struct.iter_unpack(records):
+                if values[-1] and not include_deleted:
                     continue
-                registro = self.RT.from_bytes(data)
-                registros.append(registro)
+                registros.append(self.RT.from_values(values[:-1]))
         return registros
 
+    def iter_keys(self, positions=None):
+        """
+        Genera pares (llave, posición) de los registros no eliminados, leyendo solo la llave.
+        Si se pasa `positions`, solo se consideran esas posiciones (en ese orden).
+        """
+        decode = self.RT.decoders[self.RT.key_index] or (lambda key: key)
+        with self._mapped_records() as records:
+            if positions is None:
+                for pos, (key, deleted) in enumerate(self._key_struct.iter_unpack(records)):
+                    if not deleted:
+                        yield decode(key), pos
+                return
+            unpack_from = self._key_struct.unpack_from
+            total = len(records) // self.record_total_size
+            for pos in positions:
+                if 0 <= pos < total:
+                    key, deleted = unpack_from(records, pos * self.record_total_size)
+                    if not deleted:
+                        yield decode(key), pos
+
+    def live_positions(self, positions) -> list:
+        """
+        Filtra `positions` dejando solo los registros no eliminados.
+        Solo se lee el byte de eliminado de cada registro, no el registro completo.
+        """
+        if not positions:
+            return []
+        with self._mapped_records() as records:
+            total = len(records) // self.record_total_size
+            size = self.RT.size
+            return [pos for pos in positions
+                    if 0 <= pos < total and records[pos * self.record_total_size + size] != 1]
+
     def search(self, left, right):
         """
         Busca registros en el rango [left, right] (incluyendo ambos extremos).
         """
+        return self.scan('between', left, right)
+
+    def scan(self, op: str, value, upper=None) -> list:
+        """
+        Retorna las posiciones de los registros no eliminados cuya llave cumple `llave op value`.
+        `op` es uno de ==, !=, <, <=, >, >= o 'between' (en ese caso se usa [value, upper]).
+        Si numpy está disponible y la llave es numérica, el predicado se evalúa vectorizado.
+        """
+        if op != 'between' and op not in SCAN_OPS:
+            raise ValueError(f"Operador no soportado: {op}")
+        key_type = self.RT.dict_format[self.RT.key]
+        if isinstance(key_type, DictColumn):
+            # el predicado se evalúa sobre los pocos valores del diccionario
+            # y en el archivo solo se buscan los códigos que lo cumplen
+            value, op = self._matching_codes(key_type.dictionary, op, value, upper), 'in'
+        with self._mapped_records() as records:
+            if self._key_dtype is not None:
+                return self._numpy_scan(records, op, value, upper)
+            return self._struct_scan(records, op, value, upper)
+
+    @staticmethod
+    def _matching_codes(dictionary, op, value, upper) -> set:
+        if op == 'between':
+            return {code for code, v in enumerate(dictionary.values) if value <= v <= upper}
+        compare = SCAN_OPS[op]
+        return {code for code, v in enumerate(dictionary.values) if compare(v, value)}
+
+    def _struct_scan(self, records, op, value, upper):
+        decode = self.RT.decoders[self.RT.key_index] or (lambda key: key)
+        if op == 'in':
+            decode = lambda key: key  # se comparan los códigos del diccionario
+            match = value.__contains__
+        elif op == 'between':
+            match = lambda key: value <= key <= upper
+        else:
+            compare = SCAN_OPS[op]
+            match = lambda key: compare(key, value)
         registros = []
-        count = self._read_header()
-
-        with open(self.filename, 'rb') as f:
-            f.seek(self.HEADER_SIZE)
-            for i in range(count):
-                data = f.read(self.RT.size)
-                flag = f.read(1)
-                if not data or not flag:
-                    break
-                if flag == b'\x01':
-                    continue
-                registro = self.RT.from_bytes(data)
-                if left <= self.RT.get_key(registro) <= right:
-                    registros.append(i)
+        for i, (key, deleted) in enumerate(self._key_struct.iter_unpack(records)):
+            if not deleted and match(decode(key)):
+                registros.append(i)
         return registros
 
+    def _numpy_scan(self, records, op, value, upper):
+        # Los arreglos apuntan al mapeo: no deben sobrevivir a esta función
+        table = np.frombuffer(records, dtype=self._key_dtype)
+        keys = table['key']
+        if keys.dtype.kind == 'f':
+            # numpy compara un float32 contra el literal bajado a float32; struct lo compara
+            # ya ampliado a double: se amplía la columna para que ambos caminos coincidan
+            keys = keys.astype('f8')
+        if op == 'in':
+            mask = np.isin(keys, list(value))
+        elif op == 'between':
+            mask = _np_compare(keys, '>=', value) & _np_compare(keys, '<=', upper)
+        else:
+            mask = _np_compare(keys, op, value)
+        mask &= table['deleted'] != 1
+        return np.flatnonzero(mask).tolist()
+
     def get_all(self):
         """
-        Busca registros en el rango [left, right] (incluyendo ambos extremos).
+        Retorna las posiciones de todos los registros no eliminados.
+        Solo se revisa el byte de eliminado de cada registro.
         """
-        registros = []
-        count = self._read_header()
-
-        with open(self.filename, 'rb') as f:
-            f.seek(self.HEADER_SIZE)
-            for i in range(count):
-                data = f.read(self.RT.size)
-                flag = f.read(1)
-                if not data or not flag:
-                    break
-                if flag == b'\x01':
-                    continue
-                registros.append(i)
-        return registros
\ No newline at end of file
+        with self._mapped_records() as records:
+            flags = records[self.RT.size::self.record_total_size].tobytes()
+        return [i for i, flag in enumerate(flags) if flag != 1]
+
+
+def _np_compare(column, op, value):
+    """
+    Compara una columna de numpy con un valor de python. Si el valor está fuera del rango
+    de un tipo entero (p. ej. los infinitos de services.cast) el resultado es constante.
+    """
+    if column.dtype.kind in 'iu':
+        info = np.iinfo(column.dtype)
+        if value > info.max or value < info.min:
+            return np.full(len(column), SCAN_OPS[op](info.min, value))
+    return SCAN_OPS[op](column, value)
+
+
+atexit.register(Heap.flush_all)
@@ -2,6 +2,7 @@ import unittest
 import os
 import sys
 import struct
+import threading
 from Heap_struct.Heap import Heap
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
@@ -37,9 +38,13 @@ class TestHeap(unittest.TestCase):
         pos = self.heap.insert([3, "Charlie", True])
         self.assertEqual(self.heap.read(pos), [3, "Charlie", True])
 
-        self.heap.mark_deleted(pos)
+        self.assertTrue(self.heap.mark_deleted(pos))
         self.assertIsNone(self.heap.read(pos))
 
+        # eliminar dos veces no vuelve a contar el registro
+        self.assertFalse(self.heap.mark_deleted(pos))
+        self.assertEqual(self.heap._read_deleted(), 1)
+
     def test_read_out_of_range(self):
         self.assertIsNone(self.heap.read(-1))  # menor que cero
         self.assertIsNone(self.heap.read(100))  # mucho mayor que el número de registros
@@ -56,3 +61,132 @@ class TestHeap(unittest.TestCase):
 
         todos = self.heap._select_all(include_deleted=True)
         self.assertEqual(len(todos), 3)
+
+    def test_shared_header_and_flush(self):
+        self.heap.insert([7, "Grace", True])
+        otro = Heap(self.format_dict, key="id", data_file_name=self.filename)
+        self.assertEqual(otro.read(0), [7, "Grace", True])
+
+        self.heap.flush()
+        with open(self.filename, 'rb') as f:
+            count, deleted = struct.unpack(Heap.HEADER_FORMAT, f.read(Heap.HEADER_SIZE))
+        self.assertEqual((count, deleted), (1, 0))
+
+    def test_concurrent_inserts_and_flush_all(self):
+        # cada hilo inserta en el mismo heap mientras otro persiste todos los encabezados
+        done = threading.Event()
+
+        def insert(start):
+            for i in range(start, start + 300):
+                self.heap.insert([i, f"n{i}", True])
+
+        def flush():
+            while not done.is_set():
+                Heap.flush_all()
+
+        flusher = threading.Thread(target=flush)
+        flusher.start()
+        writers = [threading.Thread(target=insert, args=(start,)) for start in (0, 300)]
+        for thread in writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        done.set()
+        flusher.join()
+
+        self.heap.flush()
+        self.assertEqual(sorted(r[0] for r in self.heap._select_all()), list(range(600)))
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(struct.unpack(Heap.HEADER_FORMAT, f.read(Heap.HEADER_SIZE)), (600, 0))
+
+    def test_insert_many(self):
+        self.heap.insert([1, "Alice", True])
+        posiciones = self.heap.insert_many([[2, "Bob", False], [3, "Carol", True]])
+
+        self.assertEqual(posiciones, range(1, 3))
+        self.assertEqual(self.heap.read(2), [3, "Carol", True])
+        self.assertEqual(self.heap._read_header(), 3)
+        self.assertEqual(self.heap.insert_many([]), range(3, 3))
+
+    def test_reuse_deleted_slots(self):
+        self.heap.insert_many([[i, f"n{i}", True] for i in range(6)])
+        self.heap.mark_deleted(4)
+        self.heap.mark_deleted(1)
+
+        # por defecto solo se agrega al final
+        self.assertEqual(self.heap.insert([6, "n6", True]), 6)
+
+        # otro Heap sobre el mismo archivo, con reutilización: arma los huecos desde los flags
+        reuse = Heap(self.format_dict, key="id", data_file_name=self.filename, reuse_slots=True)
+        self.assertEqual(reuse.insert([7, "n7", True]), 1)
+        self.assertEqual(reuse._read_deleted(), 1)
+        self.heap.mark_deleted(0)
+        self.assertEqual(reuse.insert([8, "n8", True]), 0)
+        self.assertEqual(reuse.insert([9, "n9", True]), 4)
+        self.assertEqual(reuse.insert([10, "n10", True]), 7)
+
+        self.assertEqual(reuse._read_deleted(), 0)
+        self.assertEqual([r[0] for r in reuse._select_all()], [8, 7, 2, 3, 9, 5, 6, 10])
+
+    def test_compact(self):
+        self.heap.insert_many([[i, f"n{i}", True] for i in range(10)])
+        for pos in (0, 4, 5, 9):
+            self.heap.mark_deleted(pos)
+        compact_file = "test_compact.bin"
+        try:
+            remap = self.heap.compact(compact_file)
+            self.assertEqual(remap, [-1, 0, 1, 2, -1, -1, 3, 4, 5, -1])
+
+            compacted = Heap(self.format_dict, key="id", data_file_name=compact_file)
+            self.assertEqual(compacted._read_header(), 6)
+            self.assertEqual(compacted._read_deleted(), 0)
+            self.assertEqual([r[0] for r in compacted._select_all()], [1, 2, 3, 6, 7, 8])
+        finally:
+            Heap.discard(compact_file)
+            if os.path.exists(compact_file):
+                os.remove(compact_file)
+
+    def test_scan(self):
+        self.heap.insert_many([[i, f"n{i}", True] for i in range(10)])
+        self.heap.mark_deleted(4)
+
+        self.assertEqual(self.heap.scan("==", 3), [3])
+        self.assertEqual(self.heap.scan(">", 7), [8, 9])
+        self.assertEqual(self.heap.scan("<=", 5), [0, 1, 2, 3, 5])
+        self.assertEqual(self.heap.scan("between", 3, 6), [3, 5, 6])
+        self.assertEqual(len(self.heap.scan("!=", 0)), 8)
+        self.assertEqual(self.heap.scan("<", int(1e100)), self.heap.get_all())
+
+    def test_scan_float32_column(self):
+        filename = "test_float.bin"
+        try:
+            heap = Heap({"id": "i", "v": "f"}, key="v", data_file_name=filename, force_create=True)
+            heap.insert_many([[i, v] for i, v in enumerate([0.1, 0.5, 0.25, 2.0])])
+            expected = {("==", 0.1): [], ("==", 0.5): [1], ("<", 0.1): [], ("<=", 0.25): [0, 2],
+                        (">", 0.1): [0, 1, 2, 3], ("!=", 0.1): [0, 1, 2, 3]}
+            for key_dtype in (heap._key_dtype, None):  # con numpy y con struct
+                heap._key_dtype = key_dtype
+                for (op, value), positions in expected.items():
+                    self.assertEqual(heap.scan(op, value), positions, (op, value, key_dtype))
+                self.assertEqual(heap.search(0.1, 0.5), [0, 1, 2])  # float32(0.1) > 0.1
+        finally:
+            Heap.discard(filename)
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_scan_dictionary_column(self):
+        filename = "test_dict.txt"
+        try:
+            heap = Heap({"id": "i", "pais": DictColumn(filename)}, key="pais",
+                        data_file_name=self.filename, force_create=True)
+            heap.insert_many([[1, "Peru"], [2, "Chile"], [3, "Peru"], [4, "Bolivia"]])
+            heap.mark_deleted(2)
+
+            self.assertEqual(heap.scan("==", "Peru"), [0])
+            self.assertEqual(heap.scan("!=", "Peru"), [1, 3])
+            self.assertEqual(heap.scan("between", "Bolivia", "Chile"), [1, 3])
+            self.assertEqual(heap.scan("==", "Ecuador"), [])
+            self.assertEqual(heap.read(3), [4, "Bolivia"])
+        finally:
+            if os.path.exists(filename):
+                os.remove(filename)
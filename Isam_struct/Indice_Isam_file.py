@@ -5,9 +5,11 @@ import csv
 sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
 from Utils.Registro import *
 import math
-import heapq
 from sympy import symbols, Eq, solve
 from Heap_struct.Heap import Heap
+from Utils.buffer_pool import buffer_pool
+from Utils.scratch import scratch_space
+from Utils.external_sort import ExternalSort
 from collections import deque
 
 # Constantes generales
@@ -303,6 +305,7 @@ class ISAM():
         Inicializa los archivos de índice y datos.
         """
         if not os.path.exists(self.index_file):
+            buffer_pool.discard(self.index_file)
             with open(self.index_file, 'wb') as f:
                 f.write(struct.pack('iiii', 0, 0, 1,-1)) # Inicializa el encabezado del archivo de índice (0 datos, -2 indica que recien inicia)
                 depends =  True                                      # Construye el índice estático
@@ -317,16 +320,12 @@ class ISAM():
 
     ### MANEJO DE ENCABEZADOS ###
     def _read_header(self):
-        with open(self.index_file, 'rb') as f:
-            f.seek(0)
-            header = f.read(TAM_ENCABEZAD_IND)
-            num_pages, num_over , max_num_child ,  pos_root = struct.unpack('iiii', header)
+        header = buffer_pool.read(self.index_file, 0, TAM_ENCABEZAD_IND)
+        num_pages, num_over , max_num_child ,  pos_root = struct.unpack('iiii', header)
         return num_pages, num_over, max_num_child, pos_root
     
     def _write_header(self, num_pages, num_over, max_num_child, pos_root):
-        with open(self.index_file, 'r+b') as f:
-            f.seek(0)
-            f.write(struct.pack('iiii',num_pages, num_over,max_num_child ,pos_root))   
+        buffer_pool.write(self.index_file, 0, struct.pack('iiii',num_pages, num_over,max_num_child ,pos_root))
 
     ### MANEJO DE DATOS (CASE INDEPENT) ###
     def _read_data_header(self):
@@ -373,20 +372,16 @@ class ISAM():
         """
         Lee una página de índice del archivo.
         """
-        with open(self.index_file, 'rb') as f:
-            offset = TAM_ENCABEZAD_IND + page_number * self.tam_indexp
-            f.seek(offset)
-            data = f.read(self.tam_indexp)
-            return Index_Page.from_bytes(data, self.M, self.format_key, self.indexp_format)    
+        offset = TAM_ENCABEZAD_IND + page_number * self.tam_indexp
+        data = buffer_pool.read(self.index_file, offset, self.tam_indexp)
+        return Index_Page.from_bytes(data, self.M, self.format_key, self.indexp_format)    
                           
     def _write_index_page(self, page_number, page):
         """
         Escribe una página de índice al final del archivo.
         """
-        with open(self.index_file, 'r+b') as f:
-            offset = TAM_ENCABEZAD_IND + page_number * self.tam_indexp
-            f.seek(offset)
-            f.write(page.to_bytes(self.format_key, self.indexp_format))  # Escribe la página en la posición especificada
+        offset = TAM_ENCABEZAD_IND + page_number * self.tam_indexp
+        buffer_pool.write(self.index_file, offset, page.to_bytes(self.format_key, self.indexp_format))  # Escribe la página en la posición especificada
 
     def _add_index_page(self, page):
         """
@@ -408,220 +403,109 @@ class ISAM():
 
     ### FUNCIONES PARA GENERAR LOS INDICES DEL ISAM ###
 
-    ## MERGE SORT EXTERNO ###
-    def external_merge_sort_multi_temp(self, file_path, record_size, format_temp, max_records_in_memory=10):
-        """
-        Ordenamiento externo tipo merge sort usando múltiples archivos temporales.
-        """
-        # 1. Dividir en bloques ordenados
-        temp_files = self._split_into_sorted_blocks_multi(file_path, record_size, format_temp, max_records_in_memory)
-
-        # 2. Mezclar los bloques ordenados
-        self._merge_sorted_blocks_multi(temp_files, file_path, record_size, format_temp)
-
-        # 3. Eliminar archivos temporales
-        for temp in temp_files:
-            os.remove(temp)
-
-    def _split_into_sorted_blocks_multi(self, input_file, record_size, format_temp, max_records):
-        """
-        Divide el archivo original en varios bloques ordenados y los guarda en archivos temporales separados.
-        """
-        temp_files = []
-        with open(input_file, 'rb') as fin:
-            block_count = 0
-            while True:
-                block = []
-                for _ in range(max_records):
-                    data = fin.read(record_size)
-                    if not data:
-                        break
-                    record_temp = Index_temp.from_bytes(data, self.format_key)
-                    key = record_temp.key
-                    offset = record_temp.pos
-                    block.append((key, offset))
-                if not block:
-                    break
-
-                # Ordenar y guardar en archivo temporal
-                block.sort()
-                temp_name = f'temp_block_{block_count}.bin'
-                # print (f"Creando {temp_name} con {len(block)} registros")
-                with open(temp_name, 'wb') as fout:
-                    for key, offset in block:
-                        temp_record = Index_temp(key, offset)
-                        fout.write(temp_record.to_bytes(self.format_key))
-                temp_files.append(temp_name)
-                block_count += 1
-
-        return temp_files
-
-    def _merge_sorted_blocks_multi(self, temp_files, output_file, record_size, format_temp):
-        """
-        Mezcla múltiples archivos ordenados usando un heap (merge k-ways).
-        """
-        open_files = [open(fname, 'rb') for fname in temp_files]
-        heap = []
-
-        # Inicializar el heap con el primer registro de cada archivo
-        for i, f in enumerate(open_files):
-            data = f.read(record_size)
-            if data:
-                record_temp = Index_temp.from_bytes(data, self.format_key)
-                key = record_temp.key
-                offset = record_temp.pos
-                heapq.heappush(heap, (key, offset, i))
-
-        with open(output_file, 'wb') as fout:
-            while heap:
-                key, offset, i = heapq.heappop(heap)
-                record_temp = Index_temp(key, offset)
-                fout.write(record_temp.to_bytes(self.format_key))
-
-                # Leer siguiente elemento del mismo archivo
-                data = open_files[i].read(record_size)
-                if data:
-                    record_temp = Index_temp.from_bytes(data, self.format_key)
-                    next_key = record_temp.key
-                    next_offset = record_temp.pos
-                    heapq.heappush(heap, (next_key, next_offset, i))
-
-
-
-        # Cerrar archivos
-        for f in open_files:
-            f.close()
-
     ## CONSTRUCCION DE INDICES ESTATICOS ##
 
     def build_index(self):
         """
-        Construye el índice estático ordenado en el mismo archivo temp.bin.
+        Construye el índice estático ordenado. Los pares (key, offset) se ordenan en un archivo
+        temporal único de la sesión de scratch del índice, que se elimina al terminar.
         """
-        size = self.HEAP._read_header()
         format_temp = f'{self.format_key}i'  # Formato (key, offset)
         record_size = struct.calcsize(format_temp)
-        order_file = 'temp.bin'
-        # 1. Escribir datos (key, offset) en temp.bin
-        with open(order_file, 'wb') as f:
-            for i in range(size):
-                record = self.HEAP.read(i)
-                if record is not None:
-                    key = self.RT.get_key(record)
-                    offset = i
-                    record_temp = Index_temp(key, offset)
-                    f.write(record_temp.to_bytes(self.format_key))
-
-        # 2. Ordenar usando merge sort externo
-        self.external_merge_sort_multi_temp(order_file, record_size, format_temp)
-
-        # 3. Verificación
-        file_size = os.path.getsize(order_file)
-        total_records = file_size // record_size
-        HOLA = []
-        with open(order_file, 'rb') as f:
-            for i in range(total_records):
-                data = f.read(record_size)
-                record_temp = Index_temp.from_bytes(data, self.format_key)
-                key = record_temp.key
-                offset = record_temp.pos
-                HOLA.append(key)
-
-        # 3. Calcula M y lista de posiciones
-        size = os.path.getsize(order_file)
-        num_records = size // record_size
-        self.M ,posiciones= Calculate_M(num_records)
-        self.indexp_format = get_index_format(self.M, self.format_key)
-        self.tam_indexp = struct.calcsize(self.indexp_format)
-
-        # actualizar encabezado del índice
-        num_pages, num_over , _ ,  pos_root = self._read_header()
-        self._write_header(num_pages, num_over, self.M,pos_root)  # Inicializa el encabezado del índice
-
-        lista = posiciones.copy()
-        # 4. Generar paginas (HOJAS) de data ordenada
-
-        # print("=== Generando hojas ===")
-        with open(order_file, 'rb') as f:
-            limit = lista.pop(0)
-            limit = lista.pop(0) 
-            page = Index_Page(leaf=True, M=self.M)
-            for i in range(num_records):
-                data = f.read(record_size)
-                record_temp = Index_temp.from_bytes(data, self.format_key)
-                key = record_temp.key
-                pos = record_temp.pos
-                if i == num_records -1:
-                    page.keys[page.key_count] = key
-                    page.childrens[page.key_count] = pos
-                    page.key_count += 1
-                    self._add_index_page(page)
-                    break
-                # Si la lista de posiciones está vacía, crear una nueva página
-                if i == limit and i != 0 :
-                    self._add_index_page(page)
-                    page = Index_Page(leaf=True, M=self.M)
-                    limit = lista.pop(0) if lista else None
-                # Agregar clave y offset a la página
-                page.keys[page.key_count] = key
-                page.childrens[page.key_count] = pos
-                page.key_count += 1
-
-        num_pages_data, num_over , max_num_child ,  pos_root = self._read_header()
-        for i in range(num_pages_data):
-            page = self._read_index_page(i)
-
-        lista = posiciones.copy()
-        with open(order_file, 'rb') as f:
-            i = 1
-            page = Index_Page(leaf=False, M=self.M)
-            page.childrens[0] = 0  
-            pos_page, num_over , max_num_child ,  pos_root= self._read_header()
-            page_root = Index_Page(leaf=False, M=self.M)
-            page_root.childrens[0] = pos_page
-            for num in range(1,len(lista)):
-                if i % self.M != 0 :
-                    f.seek(lista[num] * record_size)
+        with scratch_space.session(self.index_file) as scratch:
+            order_file = scratch.path('order')
+            # 1-2. Escribir los pares (key, offset) ordenados con el merge sort externo compartido
+            sorter = ExternalSort(self.RT, pos_format='i', aligned=True, workers=scratch_space.sort_workers)
+            num_records = sorter.sort_to_file(self.HEAP.iter_keys(), order_file, scratch)
+
+            # 3. Calcula M y lista de posiciones
+            self.M ,posiciones= Calculate_M(num_records)
+            self.indexp_format = get_index_format(self.M, self.format_key)
+            self.tam_indexp = struct.calcsize(self.indexp_format)
+
+            # actualizar encabezado del índice
+            num_pages, num_over , _ ,  pos_root = self._read_header()
+            self._write_header(num_pages, num_over, self.M,pos_root)  # Inicializa el encabezado del índice
+
+            lista = posiciones.copy()
+            # 4. Generar paginas (HOJAS) de data ordenada
+
+            # print("=== Generando hojas ===")
+            with open(order_file, 'rb') as f:
+                limit = lista.pop(0)
+                limit = lista.pop(0) 
+                page = Index_Page(leaf=True, M=self.M)
+                for i in range(num_records):
                     data = f.read(record_size)
                     record_temp = Index_temp.from_bytes(data, self.format_key)
                     key = record_temp.key
                     pos = record_temp.pos
+                    if i == num_records -1:
+                        page.keys[page.key_count] = key
+                        page.childrens[page.key_count] = pos
+                        page.key_count += 1
+                        self._add_index_page(page)
+                        break
+                    # Si la lista de posiciones está vacía, crear una nueva página
+                    if i == limit and i != 0 :
+                        self._add_index_page(page)
+                        page = Index_Page(leaf=True, M=self.M)
+                        limit = lista.pop(0) if lista else None
+                    # Agregar clave y offset a la página
                     page.keys[page.key_count] = key
-                    page.childrens[page.key_count+1] = i
+                    page.childrens[page.key_count] = pos
                     page.key_count += 1
-                else:
-                    self._add_index_page(page)
-                    pos_page,_ , _,_= self._read_header()
-                    f.seek(lista[num] * record_size)
-                    data = f.read(record_size)
-                    record_temp = Index_temp.from_bytes(data, self.format_key)
-                    key = record_temp.key
-                    pos = record_temp.pos
-                    page = Index_Page(leaf=False, M=self.M)
-                    page.childrens[0] = i
-                    page_root.keys[page_root.key_count] = key
-                    page_root.childrens[page_root.key_count+1] = pos_page
-                    page_root.key_count += 1
-
-                i += 1
-            # print (page.keys , page.childrens, page.next, "|" ,page.key_count)
-            self._add_index_page(page)
-            if page_root.key_count == self.M - 1:
-                num_pages, num_over,_ , _ = self._read_header()
-                self._add_index_page(page_root)
-                # Actualizar el encabezado del índice con la nueva raíz
-                self._write_header(num_pages+1, num_over, self.M, num_pages)
-                
-        num_pages, num_over ,_ , _= self._read_header()
-        for i in range(num_pages_data, num_pages-1):
-            page = self._read_index_page(i)
-
-        page = self._read_index_page(num_pages-1)
 
+            num_pages_data, num_over , max_num_child ,  pos_root = self._read_header()
+            for i in range(num_pages_data):
+                page = self._read_index_page(i)
+
+            lista = posiciones.copy()
+            with open(order_file, 'rb') as f:
+                i = 1
+                page = Index_Page(leaf=False, M=self.M)
+                page.childrens[0] = 0  
+                pos_page, num_over , max_num_child ,  pos_root= self._read_header()
+                page_root = Index_Page(leaf=False, M=self.M)
+                page_root.childrens[0] = pos_page
+                for num in range(1,len(lista)):
+                    if i % self.M != 0 :
+                        f.seek(lista[num] * record_size)
+                        data = f.read(record_size)
+                        record_temp = Index_temp.from_bytes(data, self.format_key)
+                        key = record_temp.key
+                        pos = record_temp.pos
+                        page.keys[page.key_count] = key
+                        page.childrens[page.key_count+1] = i
+                        page.key_count += 1
+                    else:
+                        self._add_index_page(page)
+                        pos_page,_ , _,_= self._read_header()
+                        f.seek(lista[num] * record_size)
+                        data = f.read(record_size)
+                        record_temp = Index_temp.from_bytes(data, self.format_key)
+                        key = record_temp.key
+                        pos = record_temp.pos
+                        page = Index_Page(leaf=False, M=self.M)
+                        page.childrens[0] = i
+                        page_root.keys[page_root.key_count] = key
+                        page_root.childrens[page_root.key_count+1] = pos_page
+                        page_root.key_count += 1
+
+                    i += 1
+                # print (page.keys , page.childrens, page.next, "|" ,page.key_count)
+                self._add_index_page(page)
+                if page_root.key_count == self.M - 1:
+                    num_pages, num_over,_ , _ = self._read_header()
+                    self._add_index_page(page_root)
+                    # Actualizar el encabezado del índice con la nueva raíz
+                    self._write_header(num_pages+1, num_over, self.M, num_pages)
+                
+            num_pages, num_over ,_ , _= self._read_header()
+            for i in range(num_pages_data, num_pages-1):
+                page = self._read_index_page(i)
 
-        # eliminar archivo temporal
-        if os.path.exists(order_file):
-            os.remove(order_file)
+            page = self._read_index_page(num_pages-1)
 
     ### FUNCIONES DEL ISAM ###
 
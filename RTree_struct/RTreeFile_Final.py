@@ -6,6 +6,7 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
 from Utils.Registro import *
 from Heap_struct.Heap import *
+from Utils.buffer_pool import buffer_pool
 
 point_format = ""
 mbr_format = ""
@@ -491,30 +492,31 @@ class RTreeFile:
 
         os.makedirs(os.path.dirname(self.index_filename), exist_ok=True)
         if not os.path.exists(self.index_filename): # crear archivo si no existe
+            buffer_pool.discard(self.index_filename)
             open(self.index_filename, 'w').close() 
 
         os.makedirs(os.path.dirname(self.data_filename), exist_ok=True)
         if not os.path.exists(self.data_filename): # crear archivo si no existe
             open(self.data_filename, 'w').close() 
 
-        with open(self.index_filename, "ab+") as f:
-            if f.tell() == 0:
-                root = -1  # int
-                b = 32
-                dim = len(keys)
-                m = int(b * 0.3)
-                size = 0
-                typef = table_format[keys[0]]  # can be changed to add support for different type indexes
-                point_format = dim * typef + "?i"
-                mbr_format = 2 * (dim * typef)
-                rect_format = "i?i?" + ((b + 1) * "i")
-                self.write_header(
-                    root, size, b, m, dim, point_format, mbr_format, rect_format
-                )
-            else:
-                root, size, b, m, dim, point_format, mbr_format, rect_format = (
-                    self.get_header()
-                )
+        # el header puede estar aún en el buffer pool, por eso no se mira el tamaño del archivo
+        if len(buffer_pool.read(self.index_filename, 0, header_size)) != header_size:
+            root = -1  # int
+            b = 32
+            dim = len(keys)
+            m = int(b * 0.3)
+            size = 0
+            typef = table_format[keys[0]]  # can be changed to add support for different type indexes
+            point_format = dim * typef + "?i"
+            mbr_format = 2 * (dim * typef)
+            rect_format = "i?i?" + ((b + 1) * "i")
+            self.write_header(
+                root, size, b, m, dim, point_format, mbr_format, rect_format
+            )
+        else:
+            root, size, b, m, dim, point_format, mbr_format, rect_format = (
+                self.get_header()
+            )
 
     def get_root(self):
         """
@@ -555,72 +557,68 @@ class RTreeFile:
         """
         Escribe el header de los índices
         """
-        with open(self.index_filename, "r+b") as f:
-            f.seek(0)
-            f.write(
-                struct.pack(
-                    header_format,
-                    root,
-                    size,
-                    bf,
-                    mf, 
-                    dimf,
-                    point_f.encode(),
-                    mbr_f.encode(),
-                    rect_f.encode(),
-                )
+        buffer_pool.write(
+            self.index_filename,
+            0,
+            struct.pack(
+                header_format,
+                root,
+                size,
+                bf,
+                mf, 
+                dimf,
+                point_f.encode(),
+                mbr_f.encode(),
+                rect_f.encode(),
             )
+        )
 
     def get_header(self):
         """
         Retorna el header del archivo de índices
         """
-        with open(self.index_filename, "r+b") as f:
-            global header_format, header_size
-            f.seek(0)
-            root, size, bf, mf, df, point_f, mbr_f, rect_f = struct.unpack(
-                header_format, f.read(header_size)
-            )
-            return (
-                root,
-                size,
-                bf,
-                mf,
-                df,
-                point_f.decode().strip("\x00"),
-                mbr_f.decode().strip("\x00"),
-                rect_f.decode().strip("\x00"),
-            )
+        global header_format, header_size
+        root, size, bf, mf, df, point_f, mbr_f, rect_f = struct.unpack(
+            header_format, buffer_pool.read(self.index_filename, 0, header_size)
+        )
+        return (
+            root,
+            size,
+            bf,
+            mf,
+            df,
+            point_f.decode().strip("\x00"),
+            mbr_f.decode().strip("\x00"),
+            rect_f.decode().strip("\x00"),
+        )
 
     def write_rec_at(self, pos, rec):
         """
         Escribe el rectangulo rec en la posición pos en el archivo de índices
         """
-        with open(self.index_filename, "r+b") as f:
-            global rect_format, point_format, mbr_format, b
-            point_size = struct.calcsize(point_format)
-            mbr_size = struct.calcsize(mbr_format)
-            total_size = struct.calcsize(rect_format) + (b + 1) * point_size + mbr_size
-            f.seek(header_size + pos * total_size)
-            f.write(rec.to_binary())
+        global rect_format, point_format, mbr_format, b
+        point_size = struct.calcsize(point_format)
+        mbr_size = struct.calcsize(mbr_format)
+        total_size = struct.calcsize(rect_format) + (b + 1) * point_size + mbr_size
+        buffer_pool.write(self.index_filename, header_size + pos * total_size, rec.to_binary())
 
     def get_rec_at(self, pos):
         """
         Obtiene el rectángulo en la posición pos en el archivo de índices
         """
-        with open(self.index_filename, "r+b") as f:
-            global rect_format, point_format, mbr_format, b
-            rect_format_size = struct.calcsize(rect_format)
-            point_size = struct.calcsize(point_format)
-            mbr_size = struct.calcsize(mbr_format)
-            total_size = rect_format_size + (b + 1) * point_size + mbr_size
-            f.seek(header_size + pos * total_size)
-            return self.Rectangle.from_binary(self, f.read(total_size))
+        global rect_format, point_format, mbr_format, b
+        rect_format_size = struct.calcsize(rect_format)
+        point_size = struct.calcsize(point_format)
+        mbr_size = struct.calcsize(mbr_format)
+        total_size = rect_format_size + (b + 1) * point_size + mbr_size
+        data = buffer_pool.read(self.index_filename, header_size + pos * total_size, total_size)
+        return self.Rectangle.from_binary(self, data)
     
     def get_key_at(self, pos):
         """
         Obtiene el key del registro en la posicion pos en el archivo de data
         """
+        self.HEAP.flush()  # el heap escribe con buffer; se vacía antes de leer el archivo directamente
         with open(self.data_filename, "r+b") as f:
             f.seek(pos * self.RT.size + 4)
             record = self.RT.from_bytes(f.read(self.RT.size))
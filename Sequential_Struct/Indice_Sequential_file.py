@@ -5,11 +5,18 @@ import csv
 sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
 from Utils.Registro import *
 from Heap_struct.Heap import Heap
+from Utils.scratch import scratch_space
 import math
+import heapq
+from bisect import bisect_left, insort
+from operator import itemgetter
 
 # Constantes generales
 TAM_ENCABEZADO = 12        # Encabezado de datos.bin: 4+4+4 = 12 bytes | pos_root(i) + num_aux(i) + tam_aux(i)
 TAM_DATA = 4              # Tamaño de los datos (4 bytes)
+TAM_BLOQUE = 4096         # Bytes del área principal que se leen de una vez en una búsqueda
+TAM_BUFFER = 1 << 16      # Bytes que se leen/escriben de una vez al reconstruir
+AUX_RATIO = 0.25          # El área auxiliar puede crecer hasta esta fracción del área principal
 
 
 class Index_Record:
@@ -68,6 +75,13 @@ class Index_Record:
         return f"key: {self.key}, pos: {self.pos}, next: {self.next})"
 
 class Sequential:
+    # Índice disperso del área principal (ordenada), compartido por las instancias del proceso:
+    # ruta del índice -> (inodo, num_dat, clave de cada `fence_stride` registros).
+    # Solo cambia en `reconstruction`, que reemplaza el archivo.
+    _fences = {}
+    # Área auxiliar ordenada en memoria: ruta -> [inodo, num_dat, tam_aux, run] (ver `_aux_run`)
+    _aux_runs = {}
+
     def __init__(self, table_format , name_key: str ,
                  name_index_file = 'Sequential_Struct/index_file.bin', 
                  name_data_file = 'Sequential_Struct/data_file.bin',
@@ -81,6 +95,9 @@ class Sequential:
         self._initialize_files()                                                 # Inicializa los archivos de índice y datos
         self.K = num_aux                                                   # Tamaño del archivo auxiliar
         self.HEAP = Heap(table_format, name_key, name_data_file, force_create=force_create)
+        self.tam_index = struct.calcsize(f'{self.format_key}ii')               # Tamaño de un registro de índice
+        self.fence_stride = max(1, TAM_BLOQUE // self.tam_index)                # Registros por bloque del área principal
+        self._block = None                                                     # Último bloque leído: (inicio, cantidad, bytes)
 
 
     def _initialize_files(self):
@@ -139,6 +156,11 @@ class Sequential:
         """
         Lee un registro de índice desde el archivo de índice en la posición dada.
         """
+        if self._block is not None:
+            start, count, data = self._block
+            if start <= pos < start + count:
+                offset = (pos - start) * self.tam_index
+                return Index_Record.from_bytes(data[offset:offset + self.tam_index], self.format_key)
         format_index = f'{self.format_key}ii'
         tam_index = struct.calcsize(format_index)
         with open(self.index_file, 'rb') as f:
@@ -151,6 +173,7 @@ class Sequential:
         """
         Escribe un registro de índice en el archivo de índice en la posición dada.
         """
+        self._block = None
         format_index = f'{self.format_key}ii'
         tam_index = struct.calcsize(format_index)
         with open(self.index_file, 'r+b') as f:
@@ -162,6 +185,7 @@ class Sequential:
         """
         Agrega un nuevo registro de índice al final del archivo de índice y actualiza el encabezado.
         """
+        self._block = None
         format_index = f'{self.format_key}ii'
         tam_index = struct.calcsize(format_index)
         with open(self.index_file, 'r+b') as f:
@@ -187,90 +211,118 @@ class Sequential:
     
     ### FUNCIONES DE MANEJO DE SEQUENTIAL ###
 
-    ## INSERCION ##
+    ## LECTURA DEL AREA PRINCIPAL ##
 
-    def binary_search_prev(self, key):
+    def _read_block(self, start: int, count: int) -> None:
         """
-        Realiza una búsqueda binaria en el archivo de índice para encontrar la posición anterior al resgistro buscado.
+        Lee `count` registros de índice desde `start` con una sola lectura. El bloque queda
+        guardado para que `read_index` no vuelva al disco mientras no haya escrituras.
         """
-        pos_root, num_dat, _ = self._read_header()
-        if pos_root == -1:
-            return pos_root
-        left = 0
-        right = num_dat - 1
-        mid = pos_root
-        index_record = self.read_index(pos_root)
+        with open(self.index_file, 'rb') as f:
+            f.seek(TAM_ENCABEZADO + start * self.tam_index)
+            data = f.read(count * self.tam_index)
+        self._block = (start, count, data)
 
-        while left <= right:
+    def _fence_keys(self, num_dat: int) -> list:
+        """
+        Retorna la clave de cada `fence_stride` registros del área principal. Se arma con una
+        lectura secuencial la primera vez y se reutiliza hasta la siguiente reconstrucción.
+        """
+        path = os.path.abspath(self.index_file)
+        inode = os.stat(path).st_ino
+        cached = Sequential._fences.get(path)
+        if cached is not None and cached[0] == inode and cached[1] == num_dat:
+            return cached[2]
+        with open(self.index_file, 'rb') as f:
+            f.seek(TAM_ENCABEZADO)
+            data = f.read(num_dat * self.tam_index)
+        fences = [Index_Record.from_bytes(data[i * self.tam_index:(i + 1) * self.tam_index], self.format_key).key
+                  for i in range(0, num_dat, self.fence_stride)]
+        Sequential._fences[path] = (inode, num_dat, fences)
+        return fences
+
+    def _lower_bound(self, key, num_dat: int) -> int:
+        """
+        Posición del primer registro del área principal con clave >= key (num_dat si no hay).
+        La búsqueda binaria se hace sobre el índice disperso en memoria y luego dentro de
+        un solo bloque leído del archivo.
+        """
+        block = bisect_left(self._fence_keys(num_dat), key) - 1
+        if block < 0:
+            return 0
+        start = block * self.fence_stride
+        self._read_block(start, min(self.fence_stride, num_dat - start))
+        left, right = 0, self._block[1]
+        while left < right:
             mid = (left + right) // 2
-            index_record = self.read_index(mid)
-            if index_record.key == key:
-                # Si se encuentra la clave, se busca el registro anterior
-                pos_prev = mid-1
-                if pos_prev < 0:
-                    return pos_root
-                index_record = self.read_index(pos_prev)
-                while index_record.next == -2 or index_record.key >= key:
-                    pos_prev -= 1
-                    if pos_prev < 0:
-                        return pos_root
-                    index_record = self.read_index(pos_prev)
-                return pos_prev # retorna la posición del registro anterior
-            elif index_record.key < key:
+            if self.read_index(start + mid).key < key:
                 left = mid + 1
             else:
-                right = mid - 1
-
-        pos_prev = mid  
-        while index_record.next == -2 or index_record.key >= key:
-            pos_prev -= 1
-            if pos_prev < 0:
-                return pos_root
-            index_record = self.read_index(pos_prev)
-        return pos_prev # retorna la posición del registro anterior
-    
-    def linear_search(self, key, pos : int = None):
+                right = mid
+        return start + left
+
+    def _main_from(self, start: int, num_dat: int, block_records: int = None):
         """
-        Realiza una búsqueda lineal en el archivo de índice para encontrar la posición del prev y el registro buscado.
-        retorna: prev_ptr, temp_ptr
+        Recorre el área principal desde `start` leyendo bloques completos (reutiliza el
+        último bloque leído si lo contiene). Genera (posición, registro de índice).
         """
-        # el pos retornado o es el pos_root o un pos positivo del registro anterior
-        prev_ptr = pos
-        temp_ptr = pos
+        block_records = block_records or self.fence_stride
+        while start < num_dat:
+            if self._block is not None and self._block[0] <= start < self._block[0] + self._block[1]:
+                block_start, count, data = self._block
+            else:
+                self._read_block(start, min(block_records, num_dat - start))
+                block_start, count, data = self._block
+            for i in range(start - block_start, count):
+                offset = i * self.tam_index
+                yield block_start + i, Index_Record.from_bytes(data[offset:offset + self.tam_index], self.format_key)
+            start = block_start + count
 
-        # Caso 1: Archivo vacío
-        if temp_ptr == -1:
-            return -1, -1
-        pos_root, num_dat, tam_aux = self._read_header()
-        root = self.read_index(pos_root)
-
-        # Caso 2: La clave está en la raíz
-        if root.key == key:
-            return -1, pos_root
-        # Caso 3: La clave es menor que la raíz
-        if root.key > key:
-            return -1, -1
-        
-        # Búsqueda lineal
-        while temp_ptr != -1:
-            # print("temp_ptr", temp_ptr)
-            index_record = self.read_index(temp_ptr)
-            # Caso 4: Encontramos la clave
-            if index_record.key == key:
-                # print ("encontramos la clave")
-                return prev_ptr, temp_ptr
-            # Caso 5: Pasamos el punto donde debería estar la clave
-            if index_record.key > key:
-                # print ("pasamos el punto")
-                return prev_ptr, -1
-            # Avanzamos al siguiente registro
-            prev_ptr = temp_ptr
-            temp_ptr = index_record.next
+    ## AREA AUXILIAR ##
 
-        
-        # Caso 6: Llegamos al final sin encontrar la clave
-        return prev_ptr, -1
+    def _aux_run(self, num_dat: int, tam_aux: int) -> list:
+        """
+        Registros vigentes del área auxiliar como lista ordenada [(key, pos_index, pos)].
+        En disco el área auxiliar solo se agrega al final; el orden se mantiene en memoria,
+        compartido por las instancias del proceso, y se vuelve a leer (una lectura) si el
+        archivo cambió por fuera.
+        """
+        path = os.path.abspath(self.index_file)
+        inode = os.stat(path).st_ino
+        cached = Sequential._aux_runs.get(path)
+        if cached is not None and cached[:3] == [inode, num_dat, tam_aux]:
+            return cached[3]
+        with open(self.index_file, 'rb') as f:
+            f.seek(TAM_ENCABEZADO + num_dat * self.tam_index)
+            data = f.read(tam_aux * self.tam_index)
+        run = []
+        for i in range(tam_aux):
+            index_record = Index_Record.from_bytes(data[i * self.tam_index:(i + 1) * self.tam_index], self.format_key)
+            if index_record.next != -2:
+                run.append((index_record.key, num_dat + i, index_record.pos))
+        run.sort()
+        Sequential._aux_runs[path] = [inode, num_dat, tam_aux, run]
+        return run
+
+    def _aux_limit(self, num_dat: int) -> int:
+        """
+        Tamaño del área auxiliar que dispara la reconstrucción: crece con el área principal
+        para que el costo de reconstruir se reparta entre muchas inserciones.
+        """
+        return max(self.K, int(num_dat * AUX_RATIO))
 
+    def _iter_sorted(self, num_dat: int, tam_aux: int):
+        """
+        Genera (key, pos) de todos los registros vigentes en orden de clave: mezcla del área
+        principal (leída en bloques grandes) con el área auxiliar ordenada en memoria.
+        """
+        main = ((index_record.key, index_record.pos)
+                for _, index_record in self._main_from(0, num_dat, TAM_BUFFER // self.tam_index)
+                if index_record.next != -2)
+        aux = ((key, pos) for key, _, pos in self._aux_run(num_dat, tam_aux))
+        return heapq.merge(main, aux, key=itemgetter(0))
+
+    ## INSERCION ##
 
     def add(self,pos_new_record :int = None, record: list = None):
 
@@ -288,159 +340,132 @@ class Sequential:
             key = self.RT.get_key(record)  # Obtiene la clave del registro 
 
         pos_root, num_dat, tam_aux  = self._read_header()
+        run = self._aux_run(num_dat, tam_aux)
 
-        ## CASO 1: Si el índice está vacío, se agrega el registro como raíz
-        index_record = Index_Record(key = key, pos = pos_new_record)
-        pos_new_index = self.add_index(index_record)
+        # El registro se agrega al final del área auxiliar (una escritura, sin tocar punteros)
+        # y se ubica en su lugar dentro del área auxiliar ordenada en memoria
+        pos_new_index = self.add_index(Index_Record(key = key, pos = pos_new_record))
+        insort(run, (key, pos_new_index, pos_new_record))
+        Sequential._aux_runs[os.path.abspath(self.index_file)][2] = tam_aux + 1
 
         if pos_root == -1:
-            self.update_root(pos_new_index)
-            if tam_aux +1 == self.K:
-                self.reconstruction()
-            # print(pos_new_index, index_record, "->", self._read_record(index_record.pos))
-            # print( "Registro agregado como raíz")
-            return
-        
-        ## CASO 2: indice con registros
-        # busqueda binaria
-        pos = self.binary_search_prev(key)
-        # busqueda lineal
-        prev_ptr, temp_ptr = self.linear_search(key, pos)
-        
-        # CASO 2.1: Si el registro es menor que la raíz, se convierte en la nueva raíz
-        if prev_ptr == -1 :
-            index_record.next = pos_root
-            self.update_root(pos_new_index)
-            self.write_index(index_record, pos_new_index)
-            # print(pos_new_index, index_record, "->", self._read_record(index_record.pos))
-            if tam_aux +1 == self.K:
-                self.reconstruction()
-            # print("Registro cambio a la raíz")
-            return 
-        else:
-            index_record_prev = self.read_index(prev_ptr)
-            pos_next = index_record_prev.next
-            index_record_prev.next = pos_new_index # apunta al nuevo registro
-            self.write_index(index_record_prev, prev_ptr)
-            index_record.next = pos_next  # apunta al prev->next
-            self.write_index(index_record, pos_new_index)
-            # print(pos_new_index, index_record, "->", self._read_record(index_record.pos))
-            if tam_aux +1 == self.K:
-                self.reconstruction()
-            # print( "Registro agregado en la posición correcta")
-            return
-    
+            self.update_root(0)
+        if tam_aux + 1 >= self._aux_limit(num_dat):
+            self.reconstruction()
 
     def reconstruction(self):
         """
-        Reconstruye el sequential file cuando se alcanza el tamaño máximo.
-        """
-        # Crear un nuevo archivo de índice
-        pos_root,_,_ = self._read_header()
-        pos_index = pos_root
-        total_dat = 0
-        with open("temp.bin", "wb") as temp:
-            temp.write(struct.pack('iii', -1, 0, 0))
-            while pos_index != -1:
-                index_record = self.read_index(pos_index)
-                next_pos = index_record.next
-                if next_pos == -1:
-                    index_record.next = -1
-                    temp.write(index_record.to_bytes(self.format_key))
-                    total_dat += 1
-                    break
-                index_record.next = total_dat+1
-                temp.write(index_record.to_bytes(self.format_key))
-                pos_index = next_pos
-                total_dat += 1
-            # Actualizar el encabezado del nuevo archivo 
-            temp.seek(0)
-            temp.write(struct.pack('iii', 0, total_dat , 0))
-        os.remove(self.index_file)
-        os.rename("temp.bin", self.index_file)
-        self.K = round(total_dat**0.5 +0.5)
-    
+        Reconstruye el sequential file cuando el área auxiliar llega a su límite: mezcla en un
+        solo recorrido el área principal con el área auxiliar ordenada y escribe el nuevo
+        archivo secuencialmente, en bloques grandes. Los registros eliminados se descartan.
+        """
+        path = os.path.abspath(self.index_file)
+        _, num_dat, tam_aux = self._read_header()
+        total = 0
+        fences = []
+        with scratch_space.session(self.index_file) as scratch:
+            temp_file = scratch.sibling(self.index_file)
+            with open(temp_file, "wb") as temp:
+                temp.write(struct.pack('iii', -1, 0, 0))
+                buffer = []
+                for key, pos in self._iter_sorted(num_dat, tam_aux):
+                    if total % self.fence_stride == 0:
+                        fences.append(key)
+                    buffer.append(Index_Record(key, pos, total + 1).to_bytes(self.format_key))
+                    total += 1
+                    if len(buffer) * self.tam_index >= TAM_BUFFER:
+                        temp.write(b''.join(buffer))
+                        buffer = []
+                temp.write(b''.join(buffer))
+                if total > 0:
+                    # el último registro no tiene siguiente
+                    temp.seek(TAM_ENCABEZADO + (total - 1) * self.tam_index)
+                    temp.write(Index_Record(key, pos, -1).to_bytes(self.format_key))
+                # Actualizar el encabezado del nuevo archivo 
+                temp.seek(0)
+                temp.write(struct.pack('iii', 0 if total > 0 else -1, total, 0))
+            os.replace(temp_file, self.index_file)
+        self._block = None
+        inode = os.stat(path).st_ino
+        Sequential._fences[path] = (inode, total, fences)
+        Sequential._aux_runs[path] = [inode, total, 0, []]
+
+    ## ELIMINACION ##
+
     def delete(self, key):
         """
-        Elimina un registro del archivo de índice y actualiza el encabezado.
+        Elimina del índice todos los registros con la clave dada (se marcan con next = -2).
         """
         pos_root, num_dat, tam_aux = self._read_header()
         if pos_root == -1:
             return "El árbol está vacío."
-        
-        # busqueda binaria
-        pos = self.binary_search_prev(key)
-        # busqueda lineal
-        prev_ptr, temp_ptr = self.linear_search(key, pos)
-        next_ptr = None
-        if temp_ptr == -1:
-            return "Registro no encontrado."
-        else:
-            while temp_ptr != -1:
-                index_record = self.read_index(temp_ptr)
-                if index_record.key == key:
-                    next_ptr = index_record.next
-                    delete_index = self.read_index(temp_ptr)
-                    delete_index.next = -2
-                    self.write_index(delete_index, temp_ptr)
-                    temp_ptr = next_ptr
-
-                else:
-                    break
-            if prev_ptr == -1:
-                self.update_root(next_ptr)
-            else:
-                index_record_prev = self.read_index(prev_ptr)
-                index_record_prev.next = next_ptr
-                self.write_index(index_record_prev, prev_ptr)
 
+        deleted = []
+        for pos_index, index_record in self._main_from(self._lower_bound(key, num_dat), num_dat):
+            if index_record.key != key:
+                break
+            if index_record.next != -2:
+                deleted.append((pos_index, index_record))
+        run = self._aux_run(num_dat, tam_aux)
+        i = bisect_left(run, (key,))
+        while i < len(run) and run[i][0] == key:
+            _, pos_index, pos = run.pop(i)
+            deleted.append((pos_index, Index_Record(key, pos)))
+
+        if not deleted:
+            self._block = None
+            return "Registro no encontrado."
+        for pos_index, index_record in deleted:
+            index_record.next = -2
+            self.write_index(index_record, pos_index)
 
+    ## BUSQUEDA ##
 
     def search(self, key):
         """
-        Busca todos los registros en el archivo de índice que tengan ese key.
+        Busca todos los registros en el archivo de índice que tengan ese key: un bloque
+        del área principal y una búsqueda binaria en el área auxiliar en memoria.
         """
-        pos_root, num_dat, _ = self._read_header()
+        pos_root, num_dat, tam_aux = self._read_header()
         result = []
         if pos_root == -1:
             return result
-        # busqueda binaria
-        pos = self.binary_search_prev(key)
-        # busqueda lineal
-        prev_ptr, temp_ptr = self.linear_search(key, pos)
-        while temp_ptr != -1:
-            index_record = self.read_index(temp_ptr)
-            if index_record.key == key:
-                result.append(index_record.pos)
-            else:
+        for _, index_record in self._main_from(self._lower_bound(key, num_dat), num_dat):
+            if index_record.key != key:
                 break
-            temp_ptr = index_record.next
+            if index_record.next != -2:
+                result.append(index_record.pos)
+        self._block = None  # otra instancia puede escribir el archivo antes de la siguiente búsqueda
+
+        run = self._aux_run(num_dat, tam_aux)
+        i = bisect_left(run, (key,))
+        while i < len(run) and run[i][0] == key:
+            result.append(run[i][2])
+            i += 1
         return result
         
     def search_range(self, key1, key2):
         """
         Busca todos los registros en el archivo de índice que estén dentro del rango [key1, key2].
         """
-        pos_root, num_dat, _ = self._read_header()
-        result = []
+        pos_root, num_dat, tam_aux = self._read_header()
         if pos_root == -1:
-            return result
-        # busqueda binaria
-        pos = self.binary_search_prev(key1)
-        # busqueda lineal
-        prev_ptr, temp_ptr = self.linear_search(key1, pos)
-        if temp_ptr == -1:
-            temp_ptr = prev_ptr
-            if prev_ptr == -1:
-                temp_ptr = pos_root
-        while temp_ptr != -1:
-            index_record = self.read_index(temp_ptr)
-            if index_record.key >= key1 and index_record.key <= key2:
-                result.append(index_record.pos)
-            elif index_record.key > key2:
+            return []
+        main = []
+        for _, index_record in self._main_from(self._lower_bound(key1, num_dat), num_dat):
+            if index_record.key > key2:
                 break
-            temp_ptr = index_record.next
-        return result
+            if index_record.next != -2:
+                main.append((index_record.key, index_record.pos))
+        self._block = None
+
+        run = self._aux_run(num_dat, tam_aux)
+        aux = []
+        i = bisect_left(run, (key1,))
+        while i < len(run) and run[i][0] <= key2:
+            aux.append((run[i][0], run[i][2]))
+            i += 1
+        return [pos for _, pos in heapq.merge(main, aux, key=itemgetter(0))]
         
     def mostrar(self):
         # mostrar el data ordenado
@@ -460,31 +485,18 @@ class Sequential:
         print("Fin de la lista")
         print("====================================")
 
-    def inorder_aux(self , pos : int , l :list):
-        """
-        Realiza un recorrido inorden del árbol B+.
-        """
-        if pos == -1:
-            return
-        index_record = self.read_index(pos)
-        self.inorder_aux(index_record.next, l)
-        l.append(pos)
-    
     def inorder(self):
         """
         Realiza un recorrido inorden .
         """
-        list = []
-        pos_root, num_dat, _ = self._read_header()
+        pos_root, num_dat, tam_aux = self._read_header()
         if pos_root == -1:
             print("El árbol está vacío.")
             return
         print("====================================")
         print("Recorrido inorden:")
-        self.inorder_aux(pos_root,list)
-        for i in range(len(list) - 1, -1, -1):
-            index_record = self.read_index(list[i])
-            print( list[i] , index_record, "->", self._read_record(index_record.pos))
+        for key, pos in self._iter_sorted(num_dat, tam_aux):
+            print(key, "->", self.HEAP.read(pos))
         print()
         print("Fin del recorrido inorden.")
         print("====================================")
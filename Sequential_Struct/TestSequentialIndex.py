@@ -0,0 +1,77 @@
+import unittest
+import os
+import sys
+import random
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+from Sequential_Struct.Indice_Sequential_file import Sequential
+from Heap_struct.Heap import Heap
+
+
+class TestSequentialIndex(unittest.TestCase):
+    def setUp(self):
+        self.format_dict = {"name": "8s", "id": "i"}
+        self.data_file = "test_seq_data.bin"
+        self.index_file = "test_seq_index.bin"
+        for filename in (self.data_file, self.index_file):
+            if os.path.exists(filename):
+                os.remove(filename)
+        self.seq = Sequential(self.format_dict, "id", self.index_file, self.data_file,
+                              num_aux=30, force_create=True)
+        random.seed(5)
+        self.keys = {}
+        for _ in range(1500):
+            key = random.randint(0, 600)
+            pos = self.seq.HEAP.insert(["x", key])
+            self.keys[pos] = key
+            self.seq.add(pos_new_record=pos)
+
+    def tearDown(self):
+        for filename in (self.data_file, self.index_file):
+            Heap.discard(filename)
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def _expected(self, left, right):
+        return sorted(pos for pos, key in self.keys.items() if left <= key <= right)
+
+    def test_search_with_sparse_index(self):
+        _, num_dat, _ = self.seq._read_header()
+        self.assertEqual(len(self.seq._fence_keys(num_dat)), -(-num_dat // self.seq.fence_stride))
+        for key in (-1, 0, 17, 300, 600, 601):
+            self.assertEqual(sorted(self.seq.search(key)), self._expected(key, key))
+        self.assertEqual(sorted(self.seq.search_range(100, 250)), self._expected(100, 250))
+
+    def test_search_after_deletes(self):
+        for key in random.sample(range(601), 150):
+            self.seq.delete(key)
+            self.keys = {pos: k for pos, k in self.keys.items() if k != key}
+        for key in range(0, 601, 7):
+            self.assertEqual(sorted(self.seq.search(key)), self._expected(key, key))
+        self.assertEqual(sorted(self.seq.search_range(0, 600)), self._expected(0, 600))
+
+    def test_aux_area_is_sorted_in_memory(self):
+        _, num_dat, tam_aux = self.seq._read_header()
+        self.assertLess(tam_aux, self.seq._aux_limit(num_dat))
+        run = self.seq._aux_run(num_dat, tam_aux)
+        self.assertEqual(run, sorted(run))
+
+        # otra instancia (sin la caché del proceso) lee el área auxiliar del archivo
+        Sequential._aux_runs.clear()
+        Sequential._fences.clear()
+        other = Sequential(self.format_dict, "id", self.index_file, self.data_file, num_aux=30)
+        self.assertEqual(other._aux_run(num_dat, tam_aux), run)
+        self.assertEqual(sorted(other.search_range(-10, 700)), sorted(self.keys))
+
+        # la reconstrucción mezcla ambas áreas en orden
+        other.reconstruction()
+        pos_root, num_dat, tam_aux = other._read_header()
+        self.assertEqual((pos_root, num_dat, tam_aux), (0, len(self.keys), 0))
+        keys = [other.read_index(i).key for i in range(num_dat)]
+        self.assertEqual(keys, sorted(self.keys.values()))
+        self.assertEqual(sorted(self.seq.search(300)), self._expected(300, 300))
+        self.assertFalse(os.path.exists(self.index_file + ".tmp"))
+
+
+if __name__ == '__main__':
+    unittest.main()
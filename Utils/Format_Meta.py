@@ -1,99 +1,162 @@
+import copy
 import json
 import os
+import pickle
+import struct
 from fastapi import HTTPException
 
-def create_meta(data: dict, name: str) -> None:
-    """Agrega un nuevo diccionario con clave 'name' a una lista en MetaData"""
-    filename = "Schema/metadata"+".meta"
-    all_data = []
-
-    # Si el archivo existe, cargar la lista existente
-    if os.path.exists(filename):
-        with open(filename, "r", encoding="utf-8") as f:
+CATALOG_DIR = "Schema/catalog"
+LEGACY_META = "Schema/metadata.meta"
+VERSION_FILE = "version.bin"
+_version_struct = struct.Struct('q')
+
+
+class Catalog:
+    """
+    Catálogo del sistema: una entrada binaria (pickle) por tabla dentro de `directory`.
+
+    Las entradas se cargan una sola vez en memoria, por lo que buscar una tabla es O(1).
+    Cada cambio reescribe solo el archivo de esa tabla (archivo temporal + os.replace,
+    que es atómico) e incrementa un contador de versión global que se guarda en disco.
+    Cada entrada recuerda la versión en la que se escribió, para que los cachés
+    (p. ej. el catálogo de tablas de services) detecten si quedaron desactualizados.
+    """
+
+    def __init__(self, directory: str = CATALOG_DIR, legacy: str = LEGACY_META):
+        self.directory = directory
+        self.legacy = legacy
+        self.entries = {}  # nombre -> (version, data)
+        self.version = 0
+        self._load()
+
+    def _entry_path(self, name: str) -> str:
+        return os.path.join(self.directory, name + ".tbl")
+
+    def _write_atomic(self, path: str, payload: bytes) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _load(self) -> None:
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+            self._migrate()
+            return
+        version_path = os.path.join(self.directory, VERSION_FILE)
+        if os.path.exists(version_path):
+            with open(version_path, "rb") as f:
+                self.version = _version_struct.unpack(f.read(_version_struct.size))[0]
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".tbl"):
+                continue
+            with open(os.path.join(self.directory, filename), "rb") as f:
+                try:
+                    self.entries[filename[:-4]] = pickle.load(f)
+                except (pickle.UnpicklingError, EOFError):
+                    print(f"Advertencia: la entrada '{filename}' del catálogo está corrupta y se ignora.")
+
+    def _migrate(self) -> None:
+        """
+        Importa las tablas del antiguo metadata.meta (lista JSON), si existe.
+        """
+        if not os.path.exists(self.legacy):
+            return
+        with open(self.legacy, "r", encoding="utf-8") as f:
             try:
                 all_data = json.load(f)
             except json.JSONDecodeError:
-                print("Advertencia: El archivo estaba corrupto. Se sobrescribirá.")
+                print("Advertencia: El archivo metadata estaba corrupto. No se migrará.")
+                return
+        for item in all_data:
+            for name, data in item.items():
+                self.put(name, data)
+        print(f"Se migraron {len(self.entries)} tablas de '{self.legacy}' al catálogo.")
+
+    def _bump(self) -> int:
+        self.version += 1
+        self._write_atomic(os.path.join(self.directory, VERSION_FILE), _version_struct.pack(self.version))
+        return self.version
+
+    def put(self, name: str, data: dict) -> None:
+        entry = (self._bump(), copy.deepcopy(data))
+        self._write_atomic(self._entry_path(name), pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+        self.entries[name] = entry
+
+    def get(self, name: str) -> dict:
+        """
+        Entrada de la tabla, sin copiar: es de solo lectura. Para cambiarla se modifica
+        una copia (copy.deepcopy) y se guarda con `put`.
+        """
+        entry = self.entries.get(name)
+        return None if entry is None else entry[1]
+
+    def remove(self, name: str) -> bool:
+        if self.entries.pop(name, None) is None:
+            return False
+        if os.path.exists(self._entry_path(name)):
+            os.remove(self._entry_path(name))
+        self._bump()
+        return True
+
+    def table_version(self, name: str) -> int:
+        """
+        Versión del catálogo en la que se escribió la tabla (None si no existe).
+        """
+        entry = self.entries.get(name)
+        return None if entry is None else entry[0]
+
+    def items(self) -> list:
+        """
+        Tablas (nombre, data) en el orden en que se escribieron por última vez.
+        """
+        return [(name, entry[1]) for name, entry in sorted(self.entries.items(), key=lambda e: e[1][0])]
+
+
+_catalogs = {}  # ruta absoluta del directorio -> Catalog
+
+def get_catalog() -> Catalog:
+    """Catálogo del directorio Schema actual (se carga una sola vez por proceso)"""
+    path = os.path.abspath(CATALOG_DIR)
+    catalog = _catalogs.get(path)
+    if catalog is None:
+        catalog = Catalog(path, os.path.abspath(LEGACY_META))
+        _catalogs[path] = catalog
+    return catalog
+
+def catalog_version(name: str = None) -> int:
+    """Versión global del catálogo, o la versión de la entrada 'name'"""
+    catalog = get_catalog()
+    return catalog.version if name is None else catalog.table_version(name)
 
-    # Eliminar entrada anterior si ya existía con ese nombre
-    all_data = [item for item in all_data if name not in item]
-
-    # Agregar nueva entrada
-    all_data.append({name: data})
-
-    # Guardar la lista actualizada
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(all_data, f, indent=4)
-
-    print(f"Dato guardado bajo la clave '{name}' en '{filename}'.")
+def create_meta(data: dict, name: str) -> None:
+    """Agrega (o reemplaza) la entrada con clave 'name' en el catálogo"""
+    get_catalog().put(name, data)
+    print(f"Dato guardado bajo la clave '{name}' en '{CATALOG_DIR}'.")
 
 def select_meta(name: str) -> dict:
-    """Busca y devuelve el diccionario correspondiente a 'name' desde MetaData"""
-    filename = "Schema/metadata"+".meta"
-
-    
-    if not os.path.exists(filename):
-        print(f"El archivo '{filename}' no existe en {os.getcwd()}.")
-        return {}
-
-    with open(filename, "r", encoding="utf-8") as f:
-        try:
-            all_data = json.load(f)
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=500, detail="Error: No se pudo leer el archivo metadata.")
-
-    for item in all_data:
-        if name in item:
-            return item[name]
-
-    raise HTTPException(status_code=404, detail=f"No se encontró una entrada con el nombre '{name}'.")
+    """Busca y devuelve el diccionario correspondiente a 'name' en el catálogo (solo lectura)"""
+    data = get_catalog().get(name)
+    if data is None:
+        raise HTTPException(status_code=404, detail=f"No se encontró una entrada con el nombre '{name}'.")
+    return data
 
 def delete_meta(name: str) -> None:
-    """Elimina la entrada con clave 'name' de la lista en MetaData"""
-    filename = "Schema/metadata"+".meta"
-    all_data = []
-
-    # Si el archivo existe, cargar la lista existente
-    if os.path.exists(filename):
-        with open(filename, "r", encoding="utf-8") as f:
-            try:
-                all_data = json.load(f)
-            except json.JSONDecodeError:
-                print("Advertencia: El archivo estaba corrupto. Se sobrescribirá.")
-
-    # Eliminar entrada anterior
-    all_data = [item for item in all_data if name not in item]
-
-    # Se vuelve a escribir el diccionario de metadata
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(all_data, f, indent=4)
-
-    print(f"Se elimino la entrada '{name}' en '{filename}'.")
+    """Elimina la entrada con clave 'name' del catálogo"""
+    get_catalog().remove(name)
+    print(f"Se elimino la entrada '{name}' en '{CATALOG_DIR}'.")
 
 
 def get_info_from_meta() -> dict:
     print("Currently in:", os.getcwd())
     """Devuelve el diccionario"""
-    filename = "Schema/metadata"+".meta"
-
-    if not os.path.exists(filename):
-        print(f"El archivo '{filename}' no existe en {os.getcwd()}.")
-        return {}
-
-    with open(filename, "r", encoding="utf-8") as f:
-        try:
-            all_data = json.load(f)
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=500, detail="Error: No se pudo leer el archivo metadata.")
-
     info = {"name":"Schema 1", "tables":[]}
 
-    for table in all_data:
+    for name, table in get_catalog().items():
+        table = {name: table}
         new = {}
-        name = None
-        for attr in table.keys():
-            name = attr
-
         new["name"] = name
         new["indices"] = []
         for col in table[name]["columns"].keys():
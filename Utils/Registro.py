@@ -1,4 +1,154 @@
+import os
+import json
 import struct
+import threading
+
+
+def _identity(value):
+    return value
+
+
+def _string_encoder(width: int):
+    """
+    Codificador de un campo 'Ns': recorta a N bytes en un solo paso.
+    El relleno con '\\x00' hasta N lo hace struct.pack.
+    """
+    def encode(value):
+        return value.encode('utf-8')[:width]
+    return encode
+
+
+def _decode_string(value):
+    return value.decode('utf-8', errors='ignore').strip('\x00')
+
+
+# Conversión de cada tipo numérico de struct a su equivalente de python
+_ENCODERS = {
+    'i': int,
+    'q': int,
+    'Q': int,
+    'f': float,
+    'd': float,
+    '?': bool,
+}
+
+
+class StringDictionary:
+    """
+    Diccionario lateral de una columna codificada: asigna un código entero a cada string distinto.
+    Se guarda en disco como un string (en JSON) por línea, en orden de código, y solo se agrega al final.
+
+    Hay un solo diccionario por archivo en el proceso (`shared`), como el estado compartido
+    de los heaps: así dos esquemas de la misma tabla (p. ej. antes y después de invalidar el
+    catálogo en memoria) no reparten el mismo código a strings distintos. Antes de asignar
+    un código nuevo se lee lo que se haya agregado al archivo por fuera, con `lock` tomado.
+
+    Attributes:
+        filename (str): Archivo donde se guarda el diccionario.
+        values (list): Strings indexados por su código.
+        codes (dict): String -> código.
+        max_codes (int): Cantidad máxima de códigos distintos.
+    """
+
+    def __init__(self, filename: str, max_codes: int = 65536):
+        self.filename = filename
+        self.max_codes = max_codes
+        self.values = []
+        self.codes = {}
+        self.lock = threading.RLock()
+        self._inode = None  # archivo leído (para detectar si lo reemplazaron)
+        self._offset = 0    # bytes del archivo ya leídos
+        self._sync()
+
+    @classmethod
+    def shared(cls, filename: str, max_codes: int = 65536) -> 'StringDictionary':
+        """
+        Diccionario del archivo, compartido por todas las columnas que lo usan.
+        Si el archivo fue borrado o reemplazado desde la última vez, se vuelve a leer.
+        """
+        path = os.path.abspath(filename)
+        with _dictionaries_lock:
+            dictionary = _dictionaries.get(path)
+            if dictionary is None:
+                dictionary = _dictionaries[path] = cls(path, max_codes)
+                return dictionary
+        with dictionary.lock:
+            dictionary._sync()
+        return dictionary
+
+    def _sync(self):
+        """
+        Lee las líneas agregadas al archivo desde la última lectura. Si el archivo ya no existe
+        o es otro, el diccionario se vacía y se lee desde el inicio.
+        """
+        try:
+            st = os.stat(self.filename)
+        except FileNotFoundError:
+            st = None
+        if st is None or st.st_ino != self._inode or st.st_size < self._offset:
+            self.values = []
+            self.codes = {}
+            self._offset = 0
+            self._inode = None if st is None else st.st_ino
+        if st is None or st.st_size == self._offset:
+            return
+        with open(self.filename, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        data = data[:data.rfind(b'\n') + 1]  # solo líneas completas
+        for line in data.decode('utf-8').splitlines():
+            value = json.loads(line)
+            self.codes[value] = len(self.values)
+            self.values.append(value)
+        self._offset += len(data)
+
+    def encode(self, value: str) -> int:
+        """
+        Devuelve el código de `value`, agregándolo al diccionario si es nuevo.
+        """
+        code = self.codes.get(value)
+        if code is not None:
+            return code
+        with self.lock:
+            self._sync()
+            code = self.codes.get(value)
+            if code is not None:
+                return code
+            code = len(self.values)
+            if code >= self.max_codes:
+                raise ValueError(f"Dictionary '{self.filename}' is full ({self.max_codes} values).")
+            line = (json.dumps(value) + '\n').encode('utf-8')
+            with open(self.filename, 'ab') as f:
+                f.write(line)
+            if self._inode is None:
+                self._inode = os.stat(self.filename).st_ino
+            self._offset += len(line)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+    def decode(self, code: int) -> str:
+        if code >= len(self.values):
+            with self.lock:
+                self._sync()  # código asignado por otro proceso
+        return self.values[code]
+
+
+_dictionaries = {}                    # ruta absoluta -> StringDictionary
+_dictionaries_lock = threading.Lock()
+
+
+class DictColumn(str):
+    """
+    Tipo de columna codificada por diccionario. Se usa en el dict_format en lugar de 'Ns':
+    el registro guarda un código entero ('H' por defecto) y el string vive en un StringDictionary.
+    Pensado para columnas varchar con pocos valores distintos (categoría, país, ...).
+    """
+
+    def __new__(cls, filename: str, code: str = 'H'):
+        column = super().__new__(cls, code)
+        column.dictionary = StringDictionary.shared(filename, max_codes=1 << (8 * struct.calcsize(code)))
+        return column
 
 class RegistroType:
     """
@@ -9,6 +159,9 @@ class RegistroType:
         FORMAT (str): Una cadena que representa el formato struct de los datos
         size (int): El tamaño del registro en bytes.
         key (str): El nombre de la clave que se utilizará como índice.
+        record_struct (struct.Struct): El struct precompilado del registro.
+        encoders (tuple): Conversor python -> struct de cada columna.
+        decoders (tuple): Conversor struct -> python de cada columna (None si no hace falta).
     """
 
     def __init__(self, dict_format: dict, key_name = None, key_index: int = None, keys_list: list = []):
@@ -45,93 +198,94 @@ class RegistroType:
         else:
             raise ValueError("You must provide either key_name or key_index.")
 
+        self._compile()
+
+    def _compile(self):
+        """
+        Prepara, una sola vez por esquema, el struct del registro y los conversores de cada columna
+        para que to_bytes / from_bytes / get_key no tengan que revisar los tipos en cada llamada.
+        """
+        self.names = list(self.dict_format.keys())
+        self.types = list(self.dict_format.values())
+        self.record_struct = struct.Struct(self.FORMAT)
+
+        encoders = []
+        decoders = []
+        for t in self.types:
+            if isinstance(t, DictColumn):
+                encoders.append(t.dictionary.encode)
+                decoders.append(t.dictionary.decode)
+            elif t in _ENCODERS:
+                encoders.append(_ENCODERS[t])
+                decoders.append(None)
+            else:
+                encoders.append(_string_encoder(struct.calcsize(t)))
+                decoders.append(_decode_string)
+        # conversores de python -> valor que acepta struct.pack
+        self.encoders = tuple(encoders)
+        # conversores de valor desempaquetado -> python (None: el valor ya sirve tal cual)
+        self.decoders = tuple(decoders)
+        self._decoded_columns = tuple((i, d) for i, d in enumerate(decoders) if d is not None)
+        # conversores usados por get_key / correct_format (no decodifican strings)
+        self._casts = tuple(_identity if isinstance(t, DictColumn) else _ENCODERS.get(t, _identity)
+                            for t in self.types)
+
+        # un struct por columna que salta los bytes anteriores y lee solo ese campo
+        self._column_structs = []
+        offset = 0
+        for t in self.types:
+            self._column_structs.append(struct.Struct(f'={offset}x{t}'))
+            offset += struct.calcsize('=' + t)
+
     def to_bytes(self, register: list) -> bytes:
         """
         Convierte el registro (como lista de python) a bytes.
         """
-        types = list(self.dict_format.values())
-        args = register.copy()
-        for i in range(len(args)):
-            if types[i] == 'i':
-                args[i] = int(args[i])
-            elif types[i] == 'q':
-                args[i] = int(args[i])
-            elif types[i] == 'Q':
-                args[i] = int(args[i])
-            elif types[i] == 'f':
-                args[i] = float(args[i])
-            elif types[i] == 'd':
-                args[i] = float(args[i])
-            elif types[i] == '?':
-                args[i] = bool(args[i])
-            else:
-                args[i] = args[i].encode('utf-8').ljust(20, b'\x00')
+        return self.record_struct.pack(*self.to_values(register))
 
-        return struct.pack(self.FORMAT, *args)
+    def to_values(self, register: list) -> list:
+        """
+        Convierte el registro a los valores que espera struct.pack (en el orden de FORMAT).
+        """
+        return [encode(value) for encode, value in zip(self.encoders, register)]
 
     def from_bytes(self, data: bytes) -> list:
         """
         Convierte bytes a un registro (como lista de python).
         """
-        unpacked = list(struct.unpack(self.FORMAT, data))
-        types = list(self.dict_format.values())
-        for i in range(len(unpacked)):
-            unpacked[i] = self._decode_value(unpacked[i], types[i])
+        return self.from_values(self.record_struct.unpack(data))
+
+    def from_values(self, values) -> list:
+        """
+        Convierte los valores devueltos por struct.unpack a un registro (como lista de python).
+        """
+        unpacked = list(values)
+        for i, decode in self._decoded_columns:
+            unpacked[i] = decode(unpacked[i])
         return unpacked
-    
+
+    def decode_column(self, data, column, offset: int = 0):
+        """
+        Extrae un solo campo de un registro en bytes sin decodificar el resto.
+        `column` puede ser el nombre o el índice de la columna; `offset` es el inicio del registro en `data`.
+        """
+        if isinstance(column, str):
+            column = self.names.index(column)
+        value = self._column_structs[column].unpack_from(data, offset)[0]
+        decode = self.decoders[column]
+        return value if decode is None else decode(value)
+
     def correct_format(self, register: list) -> list:
-        types = list(self.dict_format.values())
         for i in range(len(register)):
-            register[i] = self._decode(register[i], types[i])
+            register[i] = self._casts[i](register[i])
         return register
 
     def get_key(self, lista: list) -> any:
-        types = list(self.dict_format.values())
         if isinstance(self.key_index, list):
-            return [self._decode(lista[i], types[i]) for i in self.key_index]
+            return [self._casts[i](lista[i]) for i in self.key_index]
         else:
-            return self._decode(lista[self.key_index], types[self.key_index])
+            return self._casts[self.key_index](lista[self.key_index])
         
-    def _decode(self, value, type):
-        """
-        Convierte el valor desempaquetado a su equivalente de python
-        """
-        if type == 'i':
-            value = int(value)
-        elif type == 'q':
-            value = int(value)
-        elif type == 'Q':
-            value = int(value)
-        elif type == 'f':
-            value = float(value)
-        elif type == 'd':
-            value = float(value)
-        elif type == '?':
-            value = bool(value)
-        else:
-            value = value  # no se puede decodificar un string
-        return value
-
-    def _decode_value(self, value, type):
-        """
-        Convierte el valor desempaquetado a su equivalente de python
-        """
-        if type == 'i':
-            value = int(value)
-        elif type == 'q':
-            value = int(value)
-        elif type == 'Q':
-            value = int(value)
-        elif type == 'f':
-            value = float(value)
-        elif type == 'd':
-            value = float(value)
-        elif type == '?':
-            value = bool(value)
-        else:
-            value = value.decode('utf-8',errors='ignore').strip('\x00')  # no se puede decodificar un string
-        return value
-    
     def _print(self , register: list):
         """
         Imprime el registro en un formato legible.
@@ -0,0 +1,72 @@
+import unittest
+import os
+import tempfile
+import shutil
+from buffer_pool import BufferPool
+
+
+class TestBufferPool(unittest.TestCase):
+    def setUp(self):
+        self.filename = "test_pool.bin"
+        with open(self.filename, 'wb') as f:
+            f.write(bytes(64))
+        self.pool = BufferPool(capacity=2)
+
+    def tearDown(self):
+        self.pool.discard(self.filename)
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def test_read_hits(self):
+        self.pool.read(self.filename, 0, 16)
+        self.pool.read(self.filename, 0, 16)
+        self.assertEqual(self.pool.stats()["misses"], 1)
+        self.assertEqual(self.pool.stats()["hits"], 1)
+
+    def test_write_back_on_flush(self):
+        self.pool.write(self.filename, 16, b'a' * 16)
+        self.assertEqual(self.pool.read(self.filename, 16, 16), b'a' * 16)
+        with open(self.filename, 'rb') as f:
+            f.seek(16)
+            self.assertEqual(f.read(16), bytes(16))
+        self.pool.flush()
+        with open(self.filename, 'rb') as f:
+            f.seek(16)
+            self.assertEqual(f.read(16), b'a' * 16)
+
+    def test_eviction_writes_dirty_pages(self):
+        self.pool.write(self.filename, 0, b'x' * 16)
+        self.pool.read(self.filename, 16, 16)
+        self.pool.read(self.filename, 32, 16)
+        self.assertEqual(self.pool.stats()["evictions"], 1)
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(16), b'x' * 16)
+
+    def test_pinned_pages_are_not_evicted(self):
+        self.pool.pin(self.filename, 0, 16)
+        self.pool.read(self.filename, 16, 16)
+        self.pool.read(self.filename, 32, 16)
+        self.pool.read(self.filename, 48, 16)
+        self.pool.read(self.filename, 0, 16)
+        self.assertEqual(self.pool.stats()["misses"], 4)
+        self.pool.unpin(self.filename, 0)
+
+    def test_relative_names_follow_working_directory(self):
+        cwd = os.getcwd()
+        directories = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        try:
+            for i, directory in enumerate(directories):
+                with open(os.path.join(directory, "index.bin"), 'wb') as f:
+                    f.write(bytes([i]) * 16)
+            for i, directory in enumerate(directories):
+                os.chdir(directory)
+                self.assertEqual(self.pool.read("index.bin", 0, 16), bytes([i]) * 16)
+                self.pool.discard("index.bin")
+        finally:
+            os.chdir(cwd)
+            for directory in directories:
+                shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
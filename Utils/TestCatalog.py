@@ -0,0 +1,59 @@
+import unittest
+import os
+import json
+import shutil
+from Format_Meta import Catalog
+
+
+class TestCatalog(unittest.TestCase):
+    def setUp(self):
+        self.directory = "test_catalog"
+        self.legacy = "test_metadata.meta"
+        self.data = {"columns": {"id": {"type": "int", "index": None}}, "key": "id"}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        if os.path.exists(self.legacy):
+            os.remove(self.legacy)
+
+    def test_put_get_remove(self):
+        catalog = Catalog(self.directory, self.legacy)
+        catalog.put("a", self.data)
+        catalog.put("b", self.data)
+        self.assertEqual(catalog.get("a"), self.data)
+        self.assertEqual(catalog.version, 2)
+
+        # put guarda una copia: modificar el diccionario original no altera el catálogo,
+        # y get devuelve siempre la misma entrada (de solo lectura), sin copiarla
+        self.data["key"] = "otro"
+        self.assertEqual(catalog.get("a")["key"], "id")
+        self.assertIs(catalog.get("a"), catalog.get("a"))
+        self.data["key"] = "id"
+
+        self.assertTrue(catalog.remove("a"))
+        self.assertIsNone(catalog.get("a"))
+        self.assertEqual(catalog.version, 3)
+        self.assertFalse(catalog.remove("a"))
+
+    def test_reload_keeps_entries_and_version(self):
+        catalog = Catalog(self.directory, self.legacy)
+        catalog.put("a", self.data)
+        catalog.put("b", self.data)
+        catalog.put("a", self.data)
+
+        reloaded = Catalog(self.directory, self.legacy)
+        self.assertEqual(reloaded.version, 3)
+        self.assertEqual(reloaded.table_version("a"), 3)
+        self.assertEqual([name for name, _ in reloaded.items()], ["b", "a"])
+        self.assertFalse(any(f.endswith(".tmp") for f in os.listdir(self.directory)))
+
+    def test_migrates_legacy_metadata(self):
+        with open(self.legacy, "w", encoding="utf-8") as f:
+            json.dump([{"a": self.data}, {"b": self.data}], f)
+        catalog = Catalog(self.directory, self.legacy)
+        self.assertEqual([name for name, _ in catalog.items()], ["a", "b"])
+        self.assertEqual(catalog.get("b"), self.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+import threading
+from compaction import Compactor
+
+
+class TestCompaction(unittest.TestCase):
+    def test_threshold(self):
+        compactor = Compactor(lambda name: None, ratio=0.5, min_deleted=10)
+        self.assertFalse(compactor.should_compact(0, 0))
+        self.assertFalse(compactor.should_compact(12, 8))    # pocos eliminados
+        self.assertFalse(compactor.should_compact(100, 40))  # proporción baja
+        self.assertTrue(compactor.should_compact(100, 50))
+
+    def test_runs_in_background_with_table_lock(self):
+        release = threading.Event()
+        calls = []
+
+        def compact(name):
+            release.wait()
+            calls.append((name, compactor.lock(name)._is_owned()))
+
+        compactor = Compactor(compact, ratio=0.5, min_deleted=1)
+        self.assertTrue(compactor.notify("t", 10, 6))
+        self.assertFalse(compactor.notify("u", 10, 2))
+        compactor.schedule("t")  # puede volver a encolarse apenas empieza la primera
+        release.set()
+        compactor.wait()
+
+        self.assertIn(calls.count(("t", True)), (1, 2))
+        self.assertEqual(len(calls), compactor.completed)
+        self.assertEqual(compactor.failed, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import os
+import sys
+import random
+import struct
+import tempfile
+import shutil
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+import Utils.external_sort as external_sort
+from Utils.external_sort import ExternalSort
+from Utils.Registro import RegistroType, DictColumn
+from Utils.scratch import ScratchSpace
+
+
+class TestExternalSort(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.space = ScratchSpace(self.directory)
+        random.seed(11)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _sort(self, sorter, pairs):
+        with self.space.session("index.bin") as scratch:
+            merged, total = sorter.sort(pairs, scratch)
+            result = list(merged)
+        self.assertEqual(total, len(pairs))
+        self.assertEqual(os.listdir(self.directory), [])
+        return result
+
+    def test_numeric_keys_in_runs(self):
+        rt = RegistroType({'id': 'i', 'score': 'd'}, key_name='score')
+        pairs = [(random.uniform(-50, 50), pos) for pos in range(5000)]
+        pairs += [(0.0, pos) for pos in range(5000, 5100)]  # repetidos
+        for workers in (1, 2):
+            sorter = ExternalSort(rt, max_records=700, workers=workers)
+            self.assertEqual(self._sort(sorter, pairs), sorted(pairs))
+            self.assertEqual(sorter.runs, 8)
+        sorter = ExternalSort(rt, max_records=10000)
+        self.assertEqual(sorter.workers, 1)  # el pool de procesos es opcional
+        self.assertEqual(self._sort(sorter, pairs), sorted(pairs))
+        self.assertEqual(sorter.runs, 0)  # cabe en memoria
+
+    def test_block_size_from_memory_budget(self):
+        rt = RegistroType({'id': 'i', 'score': 'd'}, key_name='score')
+        sorter = ExternalSort(rt, memory_budget=16 * 1000)  # pares '=dq' de 16 bytes
+        self.assertEqual((sorter.max_records, sorter.block_size), (1000, 16000))
+        sorter = ExternalSort(rt, memory_budget=16 * 1000, workers=3)  # 3 bloques en el pool + 1 leyendo
+        self.assertEqual((sorter.max_records, sorter.block_size), (250, 4000))
+
+        # cada bloque escrito ocupa a lo más el presupuesto por bloque
+        pairs = [(random.uniform(-50, 50), pos) for pos in range(2100)]
+        sorter = ExternalSort(rt, memory_budget=16 * 1000)
+        sizes = []
+        write_runs = sorter._write_runs
+
+        def spy(block, rest, scratch):
+            runs, total = write_runs(block, rest, scratch)
+            sizes.extend(os.path.getsize(run) for run in runs)
+            return runs, total
+        sorter._write_runs = spy
+        self.assertEqual(self._sort(sorter, pairs), sorted(pairs))
+        self.assertEqual(sizes, [16000, 16000, 1600])
+
+    def test_string_and_dictionary_keys(self):
+        names = [f"n{random.randint(0, 999)}" for _ in range(1200)]
+        rt = RegistroType({'name': '8s'}, key_name='name')
+        pairs = [(name, pos) for pos, name in enumerate(names)]
+        self.assertEqual(self._sort(ExternalSort(rt, max_records=100, workers=2), pairs), sorted(pairs))
+
+        # los códigos se asignan en orden de llegada; el orden debe ser el de los strings
+        column = DictColumn(os.path.join(self.directory, "names.dict"))
+        rt = RegistroType({'name': column}, key_name='name')
+        for name in reversed(names):
+            column.dictionary.encode(name)
+        sorter = ExternalSort(rt, max_records=100, workers=2)
+        with self.space.session("index.bin") as scratch:
+            merged, _ = sorter.sort(pairs, scratch)
+            self.assertEqual(list(merged), sorted(pairs))
+
+    def test_sort_to_file_with_intermediate_merges(self):
+        rt = RegistroType({'id': 'q', 'name': '10s'}, key_name='id')
+        pairs = [(random.randint(0, 10 ** 6), pos) for pos in range(3000)]
+        output = os.path.join(self.directory, "order.bin")
+        fan_in = external_sort.MAX_FAN_IN
+        external_sort.MAX_FAN_IN = 4
+        try:
+            sorter = ExternalSort(rt, pos_format='i', aligned=True, max_records=150)
+            with self.space.session("index.bin") as scratch:
+                self.assertEqual(sorter.sort_to_file(pairs, output, scratch), len(pairs))
+        finally:
+            external_sort.MAX_FAN_IN = fan_in
+        self.assertEqual(sorter.runs, 20)
+        with open(output, 'rb') as f:
+            data = f.read()
+        self.assertEqual(list(struct.iter_unpack('qi', data)), sorted(pairs))  # layout de Index_temp
+        self.assertEqual(os.listdir(self.directory), ["order.bin"])
+
+
+if __name__ == '__main__':
+    unittest.main()
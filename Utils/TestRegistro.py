@@ -1,5 +1,6 @@
 import unittest
-from Registro import RegistroType
+import os
+from Registro import RegistroType, DictColumn, StringDictionary
 
 class TestRegistroType(unittest.TestCase):
 
@@ -124,4 +125,60 @@ class TestRegistroType(unittest.TestCase):
 
     def test_no_key_name_or_index_raises(self):
         with self.assertRaises(ValueError):
-            RegistroType(self.dict_format)
\ No newline at end of file
+            RegistroType(self.dict_format)
+    def test_decode_column(self):
+        reg = RegistroType(self.dict_format, key_name='id')
+        data = b'xx' + reg.to_bytes([7, "Ana", 30])
+        self.assertEqual(reg.decode_column(data, 'name', offset=2), "Ana")
+        self.assertEqual(reg.decode_column(data, 2, offset=2), 30)
+        self.assertEqual(reg.get_key(["7", "Ana", "30"]), 7)
+
+    def test_string_truncated_to_declared_width(self):
+        reg = RegistroType({'code': '3s', 'n': 'i'}, key_index=1)
+        self.assertEqual(len(reg.to_bytes(["abcdef", 1])), reg.size)
+        self.assertEqual(reg.from_bytes(reg.to_bytes(["abcdef", 1])), ["abc", 1])
+
+    def test_dictionary_column(self):
+        filename = "test_dict.txt"
+        try:
+            reg = RegistroType({'id': 'i', 'pais': DictColumn(filename)}, key_name='id')
+            self.assertEqual(reg.size, 6)
+            data = reg.to_bytes([1, "Peru"])
+            reg.to_bytes([2, "Chile"])
+            self.assertEqual(reg.to_bytes([3, "Peru"])[4:], data[4:])
+            self.assertEqual(reg.from_bytes(data), [1, "Peru"])
+
+            reloaded = RegistroType({'id': 'i', 'pais': DictColumn(filename)}, key_name='id')
+            self.assertEqual(reloaded.from_bytes(data), [1, "Peru"])
+            self.assertEqual(reloaded.dict_format['pais'].dictionary.values, ["Peru", "Chile"])
+        finally:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_dictionary_shared_between_schemas(self):
+        filename = "test_dict_shared.txt"
+        try:
+            old = RegistroType({'id': 'i', 'pais': DictColumn(filename)}, key_name='id')
+            old.to_bytes([1, "Peru"])
+            new = RegistroType({'id': 'i', 'pais': DictColumn(filename)}, key_name='id')  # esquema reconstruido
+            self.assertIs(old.dict_format['pais'].dictionary, new.dict_format['pais'].dictionary)
+            chile = new.to_bytes([2, "Chile"])
+            bolivia = old.to_bytes([3, "Bolivia"])
+            self.assertEqual(old.from_bytes(chile), [2, "Chile"])
+            self.assertEqual(new.from_bytes(bolivia), [3, "Bolivia"])
+
+            # códigos agregados al archivo por fuera (otro proceso) se leen antes de asignar uno nuevo
+            StringDictionary(filename).encode("Ecuador")
+            dictionary = new.dict_format['pais'].dictionary
+            self.assertEqual(dictionary.encode("Chile"), 1)
+            self.assertEqual(dictionary.encode("Uruguay"), 4)
+            self.assertEqual(dictionary.decode(3), "Ecuador")
+
+            # si el archivo se borra (DROP TABLE), el diccionario vuelve a empezar
+            os.remove(filename)
+            again = DictColumn(filename).dictionary
+            self.assertEqual(again.values, [])
+            self.assertEqual(again.encode("Chile"), 0)
+        finally:
+            if os.path.exists(filename):
+                os.remove(filename)
@@ -0,0 +1,67 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+from scratch import ScratchSpace, SORT_WORKERS_ENV
+
+
+class TestScratch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.space = ScratchSpace(os.path.join(self.directory, "spill"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_files_are_unique_and_removed(self):
+        target = os.path.join(self.directory, "index.bin")
+        with self.space.session(target) as scratch:
+            paths = [scratch.path("run0") for _ in range(5)] + [scratch.sibling(target)]
+            self.assertEqual(len(set(paths)), 6)
+            self.assertTrue(all(os.path.exists(p) for p in paths))
+            self.assertEqual(os.path.dirname(paths[-1]), self.directory)  # junto al destino
+            scratch.remove(paths[0])
+        self.assertFalse(any(os.path.exists(p) for p in paths))
+        self.assertEqual(self.space.created, 6)
+
+    def test_cleanup_on_failure(self):
+        with self.assertRaises(RuntimeError):
+            with self.space.session("index.bin") as scratch:
+                path = scratch.path("part0")
+                raise RuntimeError("fallo a mitad de la reconstrucción")
+        self.assertFalse(os.path.exists(path))
+
+    def test_parallel_sessions_do_not_collide(self):
+        paths = []
+
+        def rebuild():
+            with self.space.session("index.bin") as scratch:  # mismo nombre de índice
+                path = scratch.path("order")
+                with open(path, "wb") as f:
+                    f.write(os.urandom(16))
+                paths.append(path)
+
+        threads = [threading.Thread(target=rebuild) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(paths)), 8)
+        self.assertEqual(os.listdir(self.space.spill_directory()), [])
+
+    def test_sort_workers_from_environment(self):
+        # el pool de procesos del merge sort externo es opcional: por defecto 1
+        with mock.patch.dict(os.environ, {}, clear=False):
+            os.environ.pop(SORT_WORKERS_ENV, None)
+            self.assertEqual(ScratchSpace(self.directory).sort_workers, 1)
+        with mock.patch.dict(os.environ, {SORT_WORKERS_ENV: "4"}):
+            self.assertEqual(ScratchSpace(self.directory).sort_workers, 4)
+            self.assertEqual(ScratchSpace(self.directory, sort_workers=2).sort_workers, 2)
+        with mock.patch.dict(os.environ, {SORT_WORKERS_ENV: "muchos"}):
+            self.assertEqual(ScratchSpace(self.directory).sort_workers, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
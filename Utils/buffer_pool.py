@@ -0,0 +1,217 @@
+import os
+import atexit
+import threading
+from collections import OrderedDict
+
+DEFAULT_CAPACITY = 4096  # Cantidad máxima de páginas en memoria
+
+
+class _Frame:
+    """
+    Marco del buffer: contiene los bytes de una página y su estado.
+    """
+    __slots__ = ('data', 'dirty', 'pin_count')
+
+    def __init__(self, data: bytes, dirty: bool = False):
+        self.data = data
+        self.dirty = dirty
+        self.pin_count = 0
+
+
+class BufferPool:
+    """
+    Buffer pool (caché de páginas) compartido por todas las estructuras de índice.
+
+    Las páginas se identifican por (archivo, offset). Las lecturas que aciertan
+    en el pool no tocan el sistema de archivos; las escrituras solo marcan la
+    página como sucia y se escriben en disco al hacer flush o al ser desalojadas
+    (write-back). El desalojo es LRU y respeta las páginas fijadas (pin).
+
+    Attributes:
+        capacity (int): cantidad máxima de páginas que se mantienen en memoria.
+        hits (int): lecturas resueltas desde memoria.
+        misses (int): lecturas que tuvieron que ir a disco.
+        evictions (int): páginas desalojadas por falta de espacio.
+        writebacks (int): páginas sucias escritas en disco.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._frames = OrderedDict()    # (path, offset) -> _Frame, en orden LRU
+        self._files = {}                # path -> archivo abierto en 'r+b'
+        self._lock = threading.RLock()
+        self.reset_stats()
+
+    ### UTILIDADES ###
+
+    def _path(self, filename: str) -> str:
+        # sin caché: un nombre relativo depende del directorio actual, que puede cambiar
+        return os.path.abspath(filename)
+
+    def _handle(self, path: str):
+        f = self._files.get(path)
+        if f is None:
+            f = open(path, 'r+b', buffering=0)  # sin buffer propio: el pool ya hace de caché
+            self._files[path] = f
+        return f
+
+    def _write_frame(self, path: str, offset: int, frame: _Frame):
+        f = self._handle(path)
+        f.seek(offset)
+        f.write(frame.data)
+        frame.dirty = False
+        self.writebacks += 1
+
+    def _evict(self):
+        """
+        Desaloja páginas LRU no fijadas hasta respetar la capacidad.
+        """
+        while len(self._frames) > self.capacity:
+            victim = None
+            for key, frame in self._frames.items():
+                if frame.pin_count == 0:
+                    victim = key
+                    break
+            if victim is None:
+                return  # todas las páginas están fijadas
+            frame = self._frames.pop(victim)
+            if frame.dirty:
+                self._write_frame(victim[0], victim[1], frame)
+            self.evictions += 1
+
+    ### LECTURA / ESCRITURA DE PÁGINAS ###
+
+    def read(self, filename: str, offset: int, size: int) -> bytes:
+        """
+        Devuelve los `size` bytes de la página ubicada en `offset`.
+        Si la lectura queda fuera del archivo se devuelven los bytes disponibles
+        (y la página no se guarda en el pool).
+        """
+        with self._lock:
+            path = self._path(filename)
+            key = (path, offset)
+            frame = self._frames.get(key)
+            if frame is not None and len(frame.data) == size:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return frame.data
+
+            self.misses += 1
+            if frame is not None and frame.dirty:
+                self._write_frame(path, offset, frame)
+            f = self._handle(path)
+            f.seek(offset)
+            data = f.read(size)
+            if len(data) != size:
+                self._frames.pop(key, None)
+                return data
+            self._frames[key] = _Frame(data)
+            self._frames.move_to_end(key)
+            self._evict()
+            return data
+
+    def write(self, filename: str, offset: int, data: bytes) -> None:
+        """
+        Reemplaza el contenido de la página en `offset` y la marca como sucia.
+        """
+        with self._lock:
+            key = (self._path(filename), offset)
+            frame = self._frames.get(key)
+            if frame is None:
+                frame = _Frame(bytes(data), dirty=True)
+                self._frames[key] = frame
+            else:
+                frame.data = bytes(data)
+                frame.dirty = True
+            self._frames.move_to_end(key)
+            self._evict()
+
+    def pin(self, filename: str, offset: int, size: int) -> bytes:
+        """
+        Lee la página y la fija en memoria: no será desalojada hasta hacer unpin.
+        """
+        with self._lock:
+            data = self.read(filename, offset, size)
+            frame = self._frames.get((self._path(filename), offset))
+            if frame is not None:
+                frame.pin_count += 1
+            return data
+
+    def unpin(self, filename: str, offset: int, data: bytes = None) -> None:
+        """
+        Libera una página fijada. Si se pasa `data`, la página se actualiza y queda sucia.
+        """
+        with self._lock:
+            if data is not None:
+                self.write(filename, offset, data)
+            frame = self._frames.get((self._path(filename), offset))
+            if frame is not None and frame.pin_count > 0:
+                frame.pin_count -= 1
+            self._evict()
+
+    ### MANTENIMIENTO ###
+
+    def flush(self, filename: str = None) -> None:
+        """
+        Escribe en disco las páginas sucias (de un archivo o de todos).
+        """
+        with self._lock:
+            path = self._path(filename) if filename is not None else None
+            dirty = sorted(key for key, frame in self._frames.items()
+                           if frame.dirty and (path is None or key[0] == path))
+            for key in dirty:
+                if not os.path.exists(key[0]):
+                    del self._frames[key]
+                    continue
+                self._write_frame(key[0], key[1], self._frames[key])
+            for p, f in self._files.items():
+                if path is None or p == path:
+                    f.flush()
+
+    def discard(self, filename: str) -> None:
+        """
+        Olvida todas las páginas de un archivo sin escribirlas y cierra su descriptor.
+        Se debe llamar antes de borrar, truncar o reemplazar el archivo por fuera del pool.
+        """
+        with self._lock:
+            path = self._path(filename)
+            for key in [k for k in self._frames if k[0] == path]:
+                del self._frames[key]
+            f = self._files.pop(path, None)
+            if f is not None:
+                f.close()
+
+    def close(self) -> None:
+        """
+        Escribe todas las páginas sucias y cierra los descriptores abiertos.
+        """
+        with self._lock:
+            self.flush()
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
+
+    def stats(self) -> dict:
+        """
+        Devuelve los contadores del pool.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "writebacks": self.writebacks,
+                "pages": len(self._frames),
+                "dirty": sum(1 for frame in self._frames.values() if frame.dirty),
+            }
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writebacks = 0
+
+
+# Pool único del proceso, compartido por todos los índices
+buffer_pool = BufferPool()
+atexit.register(buffer_pool.close)
@@ -0,0 +1,94 @@
+import atexit
+import queue
+import threading
+import traceback
+
+DEFAULT_RATIO = 0.3         # Proporción de registros eliminados que dispara la compactación
+DEFAULT_MIN_DELETED = 100   # Mínimo de eliminados para que valga la pena reescribir la tabla
+
+
+class Compactor:
+    """
+    Compactación de tablas en segundo plano.
+
+    Después de cada DELETE se llama a `notify` con los contadores del heap. Cuando la
+    proporción de eliminados supera `ratio` (y hay al menos `min_deleted`), la tabla se
+    encola y un hilo de fondo ejecuta `compact_fn(nombre_tabla)` con el lock de la tabla
+    tomado. Las consultas toman el mismo lock (`lock`), así que nunca ven una tabla a medio
+    reemplazar, y el DELETE que disparó la compactación no la espera.
+
+    Attributes:
+        ratio (float): proporción de eliminados a partir de la cual se compacta.
+        min_deleted (int): cantidad mínima de eliminados para compactar.
+        completed (int): compactaciones terminadas.
+        failed (int): compactaciones que lanzaron una excepción.
+    """
+
+    def __init__(self, compact_fn, ratio: float = DEFAULT_RATIO, min_deleted: int = DEFAULT_MIN_DELETED):
+        self.compact_fn = compact_fn
+        self.ratio = ratio
+        self.min_deleted = min_deleted
+        self.completed = 0
+        self.failed = 0
+        self._locks = {}                # tabla -> RLock
+        self._pending = set()           # tablas encoladas que aún no empiezan
+        self._mutex = threading.Lock()  # protege _locks, _pending y el hilo
+        self._queue = queue.Queue()
+        self._thread = None
+        atexit.register(self.wait)      # no terminar el proceso a mitad de un reemplazo
+
+    def lock(self, name) -> threading.RLock:
+        """
+        Lock de la tabla: lo toman las consultas y el hilo de compactación.
+        """
+        with self._mutex:
+            lock = self._locks.get(name)
+            if lock is None:
+                lock = self._locks[name] = threading.RLock()
+            return lock
+
+    def should_compact(self, count: int, deleted: int) -> bool:
+        return count > 0 and deleted >= self.min_deleted and deleted / count >= self.ratio
+
+    def notify(self, name, count: int, deleted: int) -> bool:
+        """
+        Encola la tabla si tiene suficientes eliminados. Retorna True si quedó encolada.
+        """
+        if not self.should_compact(count, deleted):
+            return False
+        return self.schedule(name)
+
+    def schedule(self, name) -> bool:
+        """
+        Encola la tabla para compactarla (una sola vez aunque se pida varias).
+        """
+        with self._mutex:
+            if name in self._pending:
+                return False
+            self._pending.add(name)
+            self._queue.put(name)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name="compactor", daemon=True)
+                self._thread.start()
+        return True
+
+    def wait(self):
+        """
+        Espera a que terminen las compactaciones encoladas.
+        """
+        self._queue.join()
+
+    def _worker(self):
+        while True:
+            name = self._queue.get()
+            try:
+                with self.lock(name):
+                    with self._mutex:
+                        self._pending.discard(name)
+                    self.compact_fn(name)
+                self.completed += 1
+            except Exception:
+                self.failed += 1
+                traceback.print_exc()
+            finally:
+                self._queue.task_done()
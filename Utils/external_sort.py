@@ -0,0 +1,275 @@
+import os
+import sys
+import heapq
+import struct
+import multiprocessing
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+from Utils.Registro import DictColumn
+
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional: sin él los bloques se ordenan con sort de python
+    np = None
+
+MEMORY_BUDGET = 64 << 20   # Bytes de pares empaquetados que se mantienen en memoria al generar bloques
+READ_BUFFER = 1 << 20      # Bytes que se leen de una vez de cada bloque durante la mezcla
+MAX_FAN_IN = 128           # Máximo de bloques que se mezclan a la vez (archivos abiertos)
+
+# Tipos struct de llave que numpy ordena igual que python
+NUMPY_TYPES = {'b': 'i1', 'B': 'u1', 'h': 'i2', 'H': 'u2', 'i': 'i4', 'I': 'u4',
+               'q': 'i8', 'Q': 'u8', 'f': 'f4', 'd': 'f8', '?': '?'}
+
+
+def _numpy_dtype(record_format: str, key_format: str, pos_format: str):
+    """
+    dtype estructurado (k, p) con el mismo layout que `record_format`, o None si la llave
+    no es numérica o no hay numpy.
+    """
+    if np is None or key_format not in NUMPY_TYPES or pos_format not in NUMPY_TYPES:
+        return None
+    prefix = record_format[0] if record_format[0] in '@=<>!' else ''
+    return np.dtype({'names': ['k', 'p'],
+                     'formats': [NUMPY_TYPES[key_format], NUMPY_TYPES[pos_format]],
+                     'offsets': [0, struct.calcsize(prefix + key_format + '0' + pos_format)],
+                     'itemsize': struct.calcsize(record_format)})
+
+
+def _sort_packed(data, record_format: str, dtype) -> bytes:
+    """
+    Ordena un bloque de pares empaquetados por (llave, posición) y lo devuelve empaquetado.
+    """
+    if dtype is not None:
+        records = np.frombuffer(data, dtype=dtype)
+        return records[np.lexsort((records['p'], records['k']))].tobytes()
+    record_struct = struct.Struct(record_format)
+    return b''.join(record_struct.pack(*record) for record in sorted(record_struct.iter_unpack(data)))
+
+
+def _sort_run(data, record_format: str, dtype, path: str) -> int:
+    """
+    Ordena un bloque de pares empaquetados y lo escribe en `path`. Retorna la cantidad de pares.
+    Se ejecuta en los procesos del pool, por eso recibe y devuelve solo valores simples.
+    """
+    data = _sort_packed(data, record_format, dtype)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return len(data) // struct.calcsize(record_format)
+
+
+class ExternalSort:
+    """
+    Merge sort externo de pares (llave, posición), compartido por los índices que se
+    construyen a partir de datos ordenados (ISAM, bulk load del B+ Tree).
+
+    1. Generación de bloques: los pares se empaquetan a medida que se leen en un buffer de
+       bytes hasta llenar el presupuesto de memoria, y cada bloque se ordena y escribe en un
+       archivo temporal. Con `workers` > 1
+       los bloques se reparten entre un pool de procesos mientras se sigue leyendo la entrada;
+       con llaves numéricas de ancho fijo el bloque se ordena con numpy.
+    2. Mezcla: k-vías con un heap, leyendo cada bloque en trozos grandes. Si hay más de
+       MAX_FAN_IN bloques se mezclan por grupos en pasadas intermedias.
+
+    Si todos los pares caben en memoria no se escribe ningún archivo.
+    Las llaves de columnas con diccionario (DictColumn) se ordenan por su string y no por su
+    código, así que esos bloques se ordenan en el proceso principal.
+
+    Attributes:
+        record_format (str): formato struct de un par (llave, posición) en los archivos.
+        max_records (int): pares por bloque.
+        block_size (int): bytes de un bloque en memoria (max_records pares empaquetados).
+        workers (int): procesos que ordenan bloques (1, por defecto: todo en el proceso principal).
+        read_buffer (int): bytes leídos de una vez de cada bloque al mezclar.
+        runs (int): bloques escritos en el último ordenamiento.
+    """
+
+    def __init__(self, record_type, pos_format: str = 'q', aligned: bool = False,
+                 max_records: int = None, memory_budget: int = MEMORY_BUDGET,
+                 workers: int = 1, read_buffer: int = READ_BUFFER):
+        """
+        `record_type` es el RegistroType de la tabla; la llave es su columna clave.
+        Con `aligned` los pares usan la alineación nativa de struct (como Index_temp del ISAM);
+        si no, van empaquetados sin relleno.
+        El pool (`workers` > 1) se crea con el método "spawn": los índices se construyen desde
+        hilos de la API y del compactador, y un fork copiaría locks tomados por otros hilos.
+        """
+        key_type = record_type.types[record_type.key_index]
+        key_format = str(key_type)
+        self.record_format = ('' if aligned else '=') + key_format + pos_format
+        self.record_struct = struct.Struct(self.record_format)
+        self.encode = record_type.encoders[record_type.key_index] or (lambda key: key)
+        self.decode = record_type.decoders[record_type.key_index]
+        # el orden de los valores empaquetados coincide con el de python salvo en los códigos de diccionario
+        self.encoded_order = not isinstance(key_type, DictColumn)
+        self.dtype = _numpy_dtype(self.record_format, key_format, pos_format) if self.encoded_order else None
+
+        self.workers = max(1, workers)
+        if max_records is None:
+            # con pool, los bloques en vuelo hacia los procesos también ocupan memoria
+            blocks = self.workers + 1 if self.workers > 1 else 1
+            max_records = memory_budget // (self.record_struct.size * blocks)
+        self.max_records = max(1, max_records)
+        self.block_size = self.max_records * self.record_struct.size
+        self.read_buffer = read_buffer
+        self.runs = 0
+
+    ## ORDENAMIENTO ##
+
+    def sort(self, pairs, scratch):
+        """
+        Ordena los pares (llave, posición). Retorna (iterador de pares ordenados, total).
+        Los archivos temporales se piden a la sesión `scratch` y deben seguir existiendo
+        mientras se consume el iterador.
+        """
+        pairs = iter(pairs)
+        block = self._read_block(pairs)
+        self.runs = 0
+        if len(block) < self.block_size:  # todo cabe en memoria
+            if self.encoded_order:
+                records = list(self.record_struct.iter_unpack(_sort_packed(block, self.record_format, self.dtype)))
+                if self.decode is not None:
+                    decode = self.decode
+                    records = [(decode(key), pos) for key, pos in records]
+            else:
+                decode = self.decode
+                records = sorted((decode(key), pos) for key, pos in self.record_struct.iter_unpack(block))
+            return iter(records), len(records)
+        runs, total = self._write_runs(block, pairs, scratch)
+        return self._merge(self._reduce(runs, scratch), decoded=True), total
+
+    def sort_to_file(self, pairs, output_file: str, scratch) -> int:
+        """
+        Ordena los pares y los escribe empaquetados con `record_format` en `output_file`.
+        Retorna la cantidad de pares.
+        """
+        pairs = iter(pairs)
+        block = self._read_block(pairs)
+        self.runs = 0
+        if len(block) < self.block_size:  # todo cabe en memoria
+            return self._sort_block(block, output_file)
+        runs, total = self._write_runs(block, pairs, scratch)
+        self._write_merged(self._merge(self._reduce(runs, scratch), decoded=False), output_file)
+        return total
+
+    ## GENERACION DE BLOQUES ##
+
+    def _write_runs(self, block, pairs, scratch):
+        """
+        Ordena `block` y el resto de la entrada por bloques de max_records pares y los escribe
+        en archivos temporales. Retorna (lista de archivos, total de pares).
+        """
+        runs = []
+        total = 0
+        pool = None
+        if self.workers > 1 and self.encoded_order:
+            pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            futures = []
+            while block:
+                path = scratch.path(f"run{len(runs)}")
+                runs.append(path)
+                if pool is None:
+                    total += self._sort_block(block, path)
+                else:
+                    futures.append(pool.submit(_sort_run, block, self.record_format, self.dtype, path))
+                    if len(futures) >= self.workers:
+                        total += futures.pop(0).result()
+                block = self._read_block(pairs)
+            for future in futures:
+                total += future.result()
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.runs = len(runs)
+        return runs, total
+
+    def _read_block(self, pairs) -> bytearray:
+        """
+        Lee hasta max_records pares de la entrada empaquetándolos en un buffer de bytes,
+        así el bloque en memoria ocupa a lo más `block_size` bytes.
+        """
+        block = bytearray()
+        pack = self.record_struct.pack
+        encode = self.encode
+        for key, pos in pairs:
+            block += pack(encode(key), pos)
+            if len(block) >= self.block_size:
+                break
+        return block
+
+    def _sort_block(self, block, path: str) -> int:
+        if self.encoded_order:
+            return _sort_run(block, self.record_format, self.dtype, path)
+        # códigos de diccionario: se ordenan por el string que representan
+        decode = self.decode
+        records = sorted(self.record_struct.iter_unpack(block), key=lambda record: (decode(record[0]), record[1]))
+        pack = self.record_struct.pack
+        with open(path, 'wb') as f:
+            f.write(b''.join(pack(*record) for record in records))
+        return len(records)
+
+    ## MEZCLA ##
+
+    def _read_run(self, path: str, decode=None):
+        """
+        Genera los pares de un bloque leyendo `read_buffer` bytes por vez.
+        Si se pasa `decode`, las llaves salen convertidas a python.
+        """
+        chunk_size = max(1, self.read_buffer // self.record_struct.size) * self.record_struct.size
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                if decode is None:
+                    yield from self.record_struct.iter_unpack(chunk)
+                else:
+                    for key, pos in self.record_struct.iter_unpack(chunk):
+                        yield decode(key), pos
+
+    def _merge(self, runs, decoded: bool):
+        """
+        Mezcla k-vías de los bloques. Si el orden de los valores empaquetados es el de python,
+        se mezclan sin decodificar y las llaves se decodifican a la salida.
+        """
+        if not self.encoded_order:
+            merged = heapq.merge(*(self._read_run(run, self.decode) for run in runs))
+            if decoded:
+                return merged
+            encode = self.encode
+            return ((encode(key), pos) for key, pos in merged)
+        merged = heapq.merge(*(self._read_run(run) for run in runs))
+        if decoded and self.decode is not None:
+            decode = self.decode
+            return ((decode(key), pos) for key, pos in merged)
+        return merged
+
+    def _write_merged(self, records, path: str) -> None:
+        """
+        Escribe en `path` pares con la llave ya codificada, en escrituras de `read_buffer` bytes.
+        """
+        pack = self.record_struct.pack
+        per_write = max(1, self.read_buffer // self.record_struct.size)
+        with open(path, 'wb') as f:
+            while True:
+                chunk = list(islice(records, per_write))
+                if not chunk:
+                    return
+                f.write(b''.join(pack(*record) for record in chunk))
+
+    def _reduce(self, runs, scratch) -> list:
+        """
+        Mezcla los bloques por grupos de MAX_FAN_IN hasta que queden a lo más MAX_FAN_IN.
+        """
+        while len(runs) > MAX_FAN_IN:
+            merged_runs = []
+            for i in range(0, len(runs), MAX_FAN_IN):
+                group = runs[i:i + MAX_FAN_IN]
+                path = scratch.path(f"merge{len(merged_runs)}")
+                self._write_merged(self._merge(group, decoded=False), path)
+                for run in group:
+                    scratch.remove(run)
+                merged_runs.append(path)
+            runs = merged_runs
+        return runs
@@ -18,4 +18,13 @@ def table_filename(name: str) -> str:
     """
     filename = "table_" + name + ".bin"
     filepath = os.path.join(ROOT, filename)
-    return filepath
\ No newline at end of file
+    return filepath
+
+def dictionary_filename(table: str, column: str) -> str:
+    """
+    Crea un archivo con nombre 'dict_<table>_<column>.txt' para el diccionario
+    de una columna codificada por diccionario.
+    """
+    filename = "dict_" + table + "_" + column + ".txt"
+    filepath = os.path.join(ROOT, filename)
+    return filepath
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+SPILL_DIR_ENV = "DB_SPILL_DIR"  # variable de entorno con el directorio de archivos temporales
+SORT_WORKERS_ENV = "DB_SORT_WORKERS"  # procesos que ordenan bloques del merge sort externo (1: ninguno)
+
+
+class ScratchSpace:
+    """
+    Administrador de archivos temporales para las reconstrucciones de índices.
+
+    Cada archivo se crea con un nombre único (tempfile.mkstemp), así que dos índices o
+    dos tablas que se reconstruyen a la vez, en hilos o en procesos distintos, nunca
+    comparten un archivo. Los archivos se piden dentro de una sesión (`session`) y todos
+    los que sigan existiendo al salir de ella se eliminan, también si hubo un error.
+
+    Hay dos tipos de archivo:
+        - `path`: archivo intermedio (bloques ordenados, particiones) en el directorio
+          de spill, configurable con `directory` o la variable de entorno DB_SPILL_DIR.
+        - `sibling`: archivo que al final reemplaza a otro con os.replace; se crea en el
+          mismo directorio que el destino para que el reemplazo sea atómico.
+
+    También guarda cuántos procesos usan los índices para ordenar los bloques que escriben
+    aquí (`sort_workers`, o la variable de entorno DB_SORT_WORKERS); por defecto 1, sin pool.
+
+    Attributes:
+        directory (str): directorio de spill (None: el temporal del sistema).
+        sort_workers (int): `workers` del ExternalSort de ISAM y del bulk load del B+ Tree.
+        created (int): archivos temporales creados.
+    """
+
+    def __init__(self, directory: str = None, sort_workers: int = None):
+        self.directory = directory or os.environ.get(SPILL_DIR_ENV)
+        if sort_workers is None:
+            try:
+                sort_workers = int(os.environ.get(SORT_WORKERS_ENV, 1))
+            except ValueError:
+                sort_workers = 1
+        self.sort_workers = max(1, sort_workers)
+        self.created = 0
+        self._lock = threading.Lock()
+
+    def spill_directory(self) -> str:
+        directory = self.directory or tempfile.gettempdir()
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def _create(self, directory: str, prefix: str, suffix: str) -> str:
+        fd, path = tempfile.mkstemp(prefix=prefix, suffix=suffix, dir=directory)
+        os.close(fd)
+        with self._lock:
+            self.created += 1
+        return path
+
+    @contextmanager
+    def session(self, owner: str):
+        """
+        Sesión de archivos temporales de un índice. `owner` (normalmente la ruta del índice)
+        solo se usa para que los nombres sean reconocibles.
+        """
+        session = _ScratchSession(self, os.path.basename(owner))
+        try:
+            yield session
+        finally:
+            session.cleanup()
+
+
+class _ScratchSession:
+    def __init__(self, space: ScratchSpace, owner: str):
+        self.space = space
+        self.owner = owner
+        self.files = []
+
+    def path(self, name: str = "") -> str:
+        """
+        Archivo intermedio nuevo (vacío) en el directorio de spill.
+        """
+        path = self.space._create(self.space.spill_directory(), f"{self.owner}.{name}.", ".tmp")
+        self.files.append(path)
+        return path
+
+    def sibling(self, target: str) -> str:
+        """
+        Archivo nuevo (vacío) junto a `target`, para escribirlo y luego hacer os.replace.
+        """
+        directory = os.path.dirname(os.path.abspath(target))
+        path = self.space._create(directory, os.path.basename(target) + ".", ".tmp")
+        self.files.append(path)
+        return path
+
+    def remove(self, path: str) -> None:
+        """
+        Elimina un archivo de la sesión antes de que termine.
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        self.files.remove(path)
+
+    def cleanup(self) -> None:
+        for path in self.files:
+            if os.path.exists(path):
+                os.remove(path)
+        self.files = []
+
+
+# Instancia compartida por todas las estructuras
+scratch_space = ScratchSpace()